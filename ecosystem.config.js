@@ -0,0 +1,20 @@
+/**
+ * @summary pm2 configuration for running the API in cluster mode. Workers share the API and admin
+ * ports, crashed workers are restarted and stopping a worker gives it time to finish its in-flight
+ * requests.
+ */
+module.exports = {
+  apps: [{
+    name: 'notes-api',
+    script: 'dist/app.js',
+    exec_mode: 'cluster',
+    // One worker per core unless WEB_CONCURRENCY is set
+    instances: process.env.WEB_CONCURRENCY || 'max',
+    // Restart crashed workers, backing off if they keep crashing
+    autorestart: true,
+    exp_backoff_restart_delay: 100,
+    // Milliseconds a worker is given to shut down gracefully before it is killed. Longer than
+    // server.shutdownTimeout so that workers can exit on their own.
+    kill_timeout: 15000,
+  }],
+};
@@ -1,12 +1,69 @@
+import http from 'http';
+import https from 'https';
+import { promisify } from 'util';
+import zlib from 'zlib';
+
 import AWS from 'aws-sdk';
 import config from 'config';
 import _ from 'lodash';
 
+import { createLimiter } from 'utils/concurrency';
+import { createLruCache } from 'utils/lru-cache';
+import { createCounter, createHistogram } from 'utils/metrics';
+
 const awsConfig = config.get('dataSources.awsS3');
+// Maximum number of objects processed at once when iterating through a listing
+const fetchConcurrency = awsConfig.fetchConcurrency || 16;
+// Whether JSON objects are stored compressed with gzip
+const { gzipObjects = false } = awsConfig;
+
+const gzip = promisify(zlib.gzip);
+const gunzip = promisify(zlib.gunzip);
+
+
+/**
+ * Create the S3 client. Connections are kept alive and pooled so that fetching many objects does
+ * not pay for a TCP and TLS handshake per object. Retries and timeouts default to values suited to
+ * small JSON objects and can be overridden with the SDK options of the same name.
+ *
+ * @returns {object} The S3 client
+ */
+const createS3Client = () => {
+  const { endpoint, connectionPool, httpOptions } = awsConfig;
+  // A local or proxy S3 instance may be served over plain HTTP
+  const Agent = _.startsWith(endpoint, 'http:') ? http.Agent : https.Agent;
+  const agent = new Agent({ keepAlive: true, maxSockets: 64, ...connectionPool });
+  return new AWS.S3({
+    maxRetries: 3,
+    retryDelayOptions: { base: 50 },
+    ...awsConfig,
+    httpOptions: {
+      connectTimeout: 1000,
+      timeout: 10000,
+      ...httpOptions,
+      agent,
+    },
+  });
+};
 
-const s3 = new AWS.S3(awsConfig);
+const s3 = createS3Client();
 let thisBucket = null;
 
+// Cache of parsed JSON objects keyed by bucket and key
+const jsonCache = createLruCache({ maxEntries: 1000, maxAge: 5000, ...awsConfig.cache });
+const jsonCacheStats = { hits: 0, misses: 0, revalidations: 0 };
+
+const s3RequestsTotal = createCounter({
+  name: 's3_requests_total',
+  help: 'Number of requests made to S3 by operation and outcome',
+  labelNames: ['operation', 'outcome'],
+});
+const s3RequestDuration = createHistogram({
+  name: 's3_request_duration_seconds',
+  help: 'Duration of requests made to S3 in seconds by operation',
+  labelNames: ['operation'],
+});
+
 /**
  * Set the bucket to be used for subsequent function calls.
  *
@@ -17,6 +74,29 @@ const setBucket = (bucket) => {
   thisBucket = bucket;
 };
 
+/**
+ * Make a request to S3 and record its outcome and duration. The outcome is 'success' or the error
+ * code returned by S3, such as 'NotModified' or 'NoSuchKey'.
+ *
+ * @private
+ * @param {string} operation Name of the S3 client method, such as 'getObject'
+ * @param {object} params Params of the request
+ * @returns {Promise} Promise object represents the response
+ */
+const sendRequest = async (operation, params) => {
+  const endTimer = s3RequestDuration.startTimer({ operation });
+  try {
+    const response = await s3[operation](params).promise();
+    s3RequestsTotal.inc({ operation, outcome: 'success' });
+    return response;
+  } catch (err) {
+    s3RequestsTotal.inc({ operation, outcome: err.code || 'error' });
+    throw err;
+  } finally {
+    endTimer();
+  }
+};
+
 /**
  * Executes closure. If closure rejects, alternative values are returned depending on the error code
  *
@@ -47,7 +127,7 @@ const withErrorHandler = async (closure, errorResponses) => {
 const bucketExists = async (bucket = thisBucket) => {
   const params = { Bucket: bucket };
   return withErrorHandler(async () => {
-    await s3.headBucket(params).promise();
+    await sendRequest('headBucket', params);
     return true;
   }, { NotFound: false });
 };
@@ -72,7 +152,7 @@ const validateAwsS3 = async () => {
 const objectExists = async (key, bucket = thisBucket) => {
   const params = { Bucket: bucket, Key: key };
   return withErrorHandler(async () => {
-    await s3.headObject(params).promise();
+    await sendRequest('headObject', params);
     return true;
   }, { NotFound: false });
 };
@@ -86,7 +166,7 @@ const objectExists = async (key, bucket = thisBucket) => {
  */
 const headObject = async (key, bucket = thisBucket) => {
   const params = { Bucket: bucket, Key: key };
-  return s3.headObject(params).promise();
+  return sendRequest('headObject', params);
 };
 
 /**
@@ -98,7 +178,69 @@ const headObject = async (key, bucket = thisBucket) => {
  */
 const listObjects = async (params = {}, bucket = thisBucket) => {
   const newParams = { Bucket: bucket, ...params };
-  return s3.listObjectsV2(newParams).promise();
+  return sendRequest('listObjectsV2', newParams);
+};
+
+/**
+ * List every page of objects in a bucket by following continuation tokens. The next page is listed
+ * while the current page is being processed, so at most two pages are held in memory at once.
+ *
+ * @param {object} params Additional params to be used in the search
+ * @param {Function} onPage Function called with each page. May return a promise
+ * @param {string} bucket The bucket to search for objects
+ * @returns {Promise} Promise that resolves when every page has been processed
+ */
+const forEachPage = async (params, onPage, bucket = thisBucket) => {
+  const processPage = async (pageParams, previousProcessing) => {
+    const page = await listObjects(pageParams, bucket);
+    await previousProcessing;
+
+    const processing = Promise.resolve(onPage(page));
+    if (!page.IsTruncated) {
+      return processing;
+    }
+    // Rejections are handled when the processing is awaited after the next page has been listed
+    processing.catch(_.noop);
+    const nextParams = { ...pageParams, ContinuationToken: page.NextContinuationToken };
+    return processPage(nextParams, processing);
+  };
+  return processPage(params, Promise.resolve());
+};
+
+/**
+ * Call iteratee on every object of a listing that has already been fetched. At most `concurrency`
+ * calls of iteratee run at once.
+ *
+ * @param {object[]} objects Objects of the listing
+ * @param {Function} iteratee Function called with each object. May return a promise
+ * @param {number} concurrency Maximum number of iteratee calls running at once
+ * @returns {Promise} Promise that resolves when iteratee has completed for every object
+ */
+const forEachListedObject = async (objects, iteratee, concurrency = fetchConcurrency) => {
+  const limit = createLimiter(concurrency);
+  return Promise.all(_.map(objects, (object) => limit(() => iteratee(object))));
+};
+
+/**
+ * Call iteratee on every object in a bucket, following continuation tokens. At most
+ * `concurrency` calls of iteratee run at once.
+ *
+ * @param {object} params Additional params to be used in the search
+ * @param {Function} iteratee Function called with each object of the listing. May return a promise
+ * @param {number} concurrency Maximum number of iteratee calls running at once
+ * @param {string} bucket The bucket to search for objects
+ * @returns {Promise} Promise that resolves when iteratee has completed for every object
+ */
+const forEachObject = async (
+  params,
+  iteratee,
+  concurrency = fetchConcurrency,
+  bucket = thisBucket,
+) => {
+  // Pages are processed one after another, so each page can be given its own limiter
+  return forEachPage(params, (page) => (
+    forEachListedObject(page.Contents, iteratee, concurrency)
+  ), bucket);
 };
 
 /**
@@ -111,9 +253,141 @@ const listObjects = async (params = {}, bucket = thisBucket) => {
  */
 const getObject = async (key, bucket = thisBucket) => {
   const params = { Bucket: bucket, Key: key };
-  return withErrorHandler(async () => s3.getObject(params).promise(), { NoSuchKey: undefined });
+  return withErrorHandler(async () => sendRequest('getObject', params), { NoSuchKey: undefined });
+};
+
+/**
+ * Parse the body of a JSON object. Bodies stored with gzip content encoding are decompressed
+ * first. Both minified and pretty-printed JSON can be parsed.
+ *
+ * @param {object} object Object returned by getObject()
+ * @returns {Promise<object>} Promise object represents the parsed body
+ */
+const parseJsonBody = async (object) => {
+  const body = object.ContentEncoding === 'gzip' ? await gunzip(object.Body) : object.Body;
+  return JSON.parse(body.toString('utf8'));
+};
+
+/**
+ * Get the key of an object in the JSON cache
+ *
+ * @private
+ * @param {string} key The key of the object
+ * @param {string} bucket The bucket where the object exists
+ * @returns {string} The cache key
+ */
+const getCacheKey = (key, bucket) => `${bucket}/${key}`;
+
+/**
+ * Copy a cached JSON object so that callers cannot modify the cached value
+ *
+ * @private
+ * @param {object} cachedObject The cached JSON object
+ * @returns {object} The copied JSON object
+ */
+const copyJsonObject = (cachedObject) => ({
+  ...cachedObject,
+  body: _.cloneDeep(cachedObject.body),
+});
+
+/**
+ * Gets a JSON object from a bucket and parses its body. Parsed objects are cached. A cached object
+ * is returned without a request while it is fresh. Otherwise, it is revalidated with a conditional
+ * request on its ETag and only downloaded again if it changed.
+ *
+ * @param {string} key The key of the object
+ * @param {object} options Additional options
+ * @param {boolean} options.revalidate If true, a cached object is revalidated even if it is fresh
+ * @param {object} options.serverTiming If given, the time spent parsing the body is recorded in
+ *                                      this Server-Timing recorder as 'parse'
+ * @param {string} bucket The bucket where the object exists
+ * @returns {Promise} Promise object represents the parsed body, ETag and last modified date of the
+ *                    object. undefined if the object does not exist
+ */
+const getJsonObject = async (key, options = {}, bucket = thisBucket) => {
+  const cacheKey = getCacheKey(key, bucket);
+  const cacheEntry = jsonCache.get(cacheKey);
+  if (cacheEntry && !options.revalidate && jsonCache.isFresh(cacheEntry)) {
+    jsonCacheStats.hits += 1;
+    return copyJsonObject(cacheEntry.value);
+  }
+
+  const params = { Bucket: bucket, Key: key };
+  if (cacheEntry) {
+    params.IfNoneMatch = cacheEntry.value.eTag;
+  }
+  try {
+    const object = await sendRequest('getObject', params);
+    const parseBody = () => parseJsonBody(object);
+    const jsonObject = {
+      body: await (options.serverTiming
+        ? options.serverTiming.time('parse', parseBody)
+        : parseBody()),
+      eTag: object.ETag,
+      lastModified: object.LastModified,
+    };
+    jsonCacheStats.misses += 1;
+    jsonCache.set(cacheKey, jsonObject);
+    return copyJsonObject(jsonObject);
+  } catch (err) {
+    if (err.code === 'NotModified') {
+      jsonCacheStats.revalidations += 1;
+      jsonCache.set(cacheKey, cacheEntry.value);
+      return copyJsonObject(cacheEntry.value);
+    }
+    if (err.code === 'NoSuchKey') {
+      jsonCache.remove(cacheKey);
+      return undefined;
+    }
+    throw err;
+  }
 };
 
+/**
+ * Get the ETag of a JSON object without downloading it. The ETag of a fresh cached object is
+ * returned without a request. Otherwise, the metadata of the object is requested, which also
+ * revalidates the cached object if its ETag is unchanged.
+ *
+ * @param {string} key The key of the object
+ * @param {object} options Additional options
+ * @param {boolean} options.revalidate If true, the metadata is requested even if the cached object
+ *                                     is fresh
+ * @param {string} bucket The bucket where the object exists
+ * @returns {Promise<string>} Promise object represents the ETag of the object. undefined if the
+ *                            object does not exist
+ */
+const getJsonObjectETag = async (key, options = {}, bucket = thisBucket) => {
+  const cacheKey = getCacheKey(key, bucket);
+  const cacheEntry = jsonCache.get(cacheKey);
+  if (cacheEntry && !options.revalidate && jsonCache.isFresh(cacheEntry)) {
+    jsonCacheStats.hits += 1;
+    return cacheEntry.value.eTag;
+  }
+
+  const params = { Bucket: bucket, Key: key };
+  const object = await withErrorHandler(
+    async () => sendRequest('headObject', params),
+    { NotFound: undefined },
+  );
+  if (object === undefined) {
+    jsonCache.remove(cacheKey);
+    return undefined;
+  }
+  if (cacheEntry && cacheEntry.value.eTag === object.ETag) {
+    jsonCacheStats.revalidations += 1;
+    jsonCache.set(cacheKey, cacheEntry.value);
+  }
+  return object.ETag;
+};
+
+/**
+ * Get statistics of the JSON object cache
+ *
+ * @returns {object} Counts of fresh hits, misses and revalidated hits along with the size and
+ *                   number of evictions of the cache
+ */
+const getCacheStats = () => ({ ...jsonCacheStats, ...jsonCache.getStats() });
+
 /**
  * Uploads a new directory object to a bucket
  *
@@ -132,11 +406,12 @@ const putDir = async (key, params = {}, bucket = thisBucket) => {
     ContentType: 'application/x-directory',
     ...params,
   };
-  return s3.putObject(newParams).promise();
+  return sendRequest('putObject', newParams);
 };
 
 /**
- * Uploads an object to a bucket as JSON
+ * Uploads an object to a bucket as minified JSON, compressed with gzip if `gzipObjects` is set.
+ * The uploaded object is added to the JSON object cache.
  *
  * @param {object} object The object to be uploaded
  * @param {string} key The desired key name of the object
@@ -145,14 +420,23 @@ const putDir = async (key, params = {}, bucket = thisBucket) => {
  * @returns {Promise} Promise object representing the response
  */
 const putObject = async (object, key, params = {}, bucket = thisBucket) => {
+  const json = JSON.stringify(object);
   const newParams = {
-    Body: JSON.stringify(object, null, 2),
+    ...(gzipObjects ? { Body: await gzip(json), ContentEncoding: 'gzip' } : { Body: json }),
     Key: key,
     Bucket: bucket,
     ContentType: 'application/json',
     ...params,
   };
-  return s3.putObject(newParams).promise();
+  const response = await sendRequest('putObject', newParams);
+  if (response && response.ETag) {
+    jsonCache.set(getCacheKey(newParams.Key, newParams.Bucket), {
+      body: _.cloneDeep(object),
+      eTag: response.ETag,
+      lastModified: new Date(),
+    });
+  }
+  return response;
 };
 
 /**
@@ -171,10 +455,13 @@ const updateMetadata = async (metadata, key, bucket = thisBucket) => {
     Key: key,
     CopySource: `${bucket}/${key}`,
     ContentType: currentHead.ContentType,
+    ContentEncoding: currentHead.ContentEncoding,
     Metadata: newMetadata,
     MetadataDirective: 'REPLACE',
   };
-  return s3.copyObject(params).promise();
+  const response = await sendRequest('copyObject', params);
+  jsonCache.remove(getCacheKey(key, bucket));
+  return response;
 };
 
 /**
@@ -186,7 +473,12 @@ const updateMetadata = async (metadata, key, bucket = thisBucket) => {
  */
 const deleteObject = async (key, bucket = thisBucket) => {
   const params = { Bucket: bucket, Key: key };
-  return withErrorHandler(async () => s3.deleteObject(params).promise(), { NotFound: undefined });
+  const response = await withErrorHandler(
+    async () => sendRequest('deleteObject', params),
+    { NotFound: undefined },
+  );
+  jsonCache.remove(getCacheKey(key, bucket));
+  return response;
 };
 
 export {
@@ -195,7 +487,14 @@ export {
   objectExists,
   headObject,
   listObjects,
+  forEachPage,
+  forEachListedObject,
+  forEachObject,
   getObject,
+  parseJsonBody,
+  getJsonObject,
+  getJsonObjectETag,
+  getCacheStats,
   putDir,
   putObject,
   updateMetadata,
@@ -1,12 +1,46 @@
+import crypto from 'crypto';
+
 import _ from 'lodash';
 import moment from 'moment';
 import uuidv4 from 'uuid/v4';
 
+import { createKeyedQueue, createLimiter } from 'utils/concurrency';
+import { matchesIfMatch } from 'utils/conditional-requests';
+import { logger } from 'utils/logger';
+import { createHistogram } from 'utils/metrics';
+import { createServerTiming } from 'utils/server-timing';
+import { singleFlight } from 'utils/single-flight';
+
 import * as awsOps from './aws-operations';
 import { serializeNote, serializeNotes } from '../../serializers/notes-serializer';
 
 // This is the value of the 'source' field that will be set for all notes fetched from the local DB.
 const localSourceName = 'advisorPortal';
+// Prefix of the per-student manifest objects. Kept outside of the student prefixes so that listing
+// a student's notes never returns the manifest itself.
+const manifestPrefix = 'manifests/';
+// Queues of manifest updates per student. Used to apply updates from this process one at a time.
+const enqueueManifestUpdate = createKeyedQueue();
+// Queues of note updates per note. Used to apply updates from this process one at a time.
+const enqueueNoteUpdate = createKeyedQueue();
+// Students whose directory marker is known to exist
+const knownStudentDirs = new Set();
+// Options of reads whose result is returned to clients. Under pm2 cluster mode every worker has its
+// own object cache, so a fresh cached object may predate a write made through another worker. Such
+// reads are always revalidated with the ETag of the cached object, which costs a request but not a
+// download, so a client never reads a note older than its own last write.
+const consistentRead = { revalidate: true };
+// Maximum number of notes fetched or written at once by the batch operations
+const batchConcurrency = 16;
+// Versions of the listings of note objects that have been hashed, keyed by the listing
+const listingVersions = new WeakMap();
+// Shows how the number of notes loaded by a list request grows with the size of the student
+const notesPerListRequest = createHistogram({
+  name: 'notes_loaded_per_list_request',
+  help: 'Number of notes loaded to answer a request for a list of notes, before filtering',
+  labelNames: ['lookup'],
+  buckets: [0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000],
+});
 
 /**
  * Parses studentId from noteId
@@ -17,29 +51,241 @@ const localSourceName = 'advisorPortal';
 const parseStudentId = (noteId) => noteId.split('-')[0];
 
 /**
- * Fetch a note from the database by its noteId
+ * Get the key of the object that stores a note
  *
  * @param {string} noteId Note ID
- * @returns {object} The raw note from the DB
+ * @returns {string} Key of the note object
  */
-const fetchNote = async (noteId) => {
-  const studentId = parseStudentId(noteId);
-  const key = `${studentId}/${noteId}.json`;
+const getNoteKey = (noteId) => `${parseStudentId(noteId)}/${noteId}.json`;
 
-  const object = await awsOps.getObject(key);
-  return object === undefined ? undefined : JSON.parse(object.Body.toString('utf8'));
-};
+/**
+ * Parses noteId from the key of a note object
+ *
+ * @param {string} key Key of the note object
+ * @returns {string} Note ID
+ */
+const parseNoteId = (key) => _.last(key.split('/')).replace(/\.json$/, '');
+
+/**
+ * Get the key of the manifest object of a student
+ *
+ * @param {string} studentId Student ID
+ * @returns {string} Key of the manifest object
+ */
+const getManifestKey = (studentId) => `${manifestPrefix}${studentId}.json`;
+
+/**
+ * Fetch a note from the database by its noteId
+ *
+ * @param {string} noteId Note ID
+ * @param {object} options Options passed to getJsonObject
+ * @returns {Promise<object>} The raw note from the DB as the body of its object, along with the
+ *                            ETag of the object. undefined if the note was not found
+ */
+const fetchNote = async (noteId, options) => awsOps.getJsonObject(getNoteKey(noteId), options);
 
 /**
  * Write newContents to the note with id noteId
  *
  * @param {string} noteId Note ID
  * @param {object} newContents New contents of note
+ * @returns {Promise} Promise object representing the put-object response
+ */
+const writeNote = async (noteId, newContents) => awsOps.putObject(newContents, getNoteKey(noteId));
+
+/**
+ * Fetch the manifest of a student. The manifest maps the noteId of every note of the student to the
+ * ETag and body of its note object.
+ *
+ * @param {string} studentId Student ID
+ * @param {object} options Options passed to getJsonObject
+ * @returns {Promise} Promise object represents the manifest. An empty manifest is returned if the
+ *                    student does not have one yet
+ */
+const fetchManifest = async (studentId, options) => {
+  const object = await awsOps.getJsonObject(getManifestKey(studentId), options);
+  return object === undefined ? { studentId, notes: {} } : object.body;
+};
+
+/**
+ * Update the manifest of a student. Updates made by this process are applied one at a time so that
+ * they do not overwrite each other.
+ *
+ * @param {string} studentId Student ID
+ * @param {Function} updater Function that receives the current manifest entries and returns the
+ *                           new entries, or a promise of them
+ * @returns {Promise} Promise that resolves when the manifest has been written
+ */
+const updateManifest = (studentId, updater) => enqueueManifestUpdate(studentId, async () => {
+  const manifest = await fetchManifest(studentId, { revalidate: true });
+  const notes = await updater(manifest.notes);
+  // Only the entries are written back, which also drops the n-gram index older manifests held
+  await awsOps.putObject({ studentId, notes }, getManifestKey(studentId));
+});
+
+/**
+ * Update the manifest of a student in the background. The note objects remain the source of truth
+ * and stale manifests are repaired on read, so a failed update is logged rather than thrown.
+ *
+ * @param {string} studentId Student ID
+ * @param {Function} updater Function that receives the current manifest entries and returns the
+ *                           new entries, or a promise of them
+ */
+const updateManifestInBackground = (studentId, updater) => {
+  updateManifest(studentId, updater).catch((err) => {
+    logger.error(`Failed to update manifest of student ${studentId}: ${err.stack || err}`);
+  });
+};
+
+/**
+ * List the note objects of a student
+ *
+ * @param {string} studentId Student ID
+ * @returns {Promise<object[]>} Promise object represents the listed note objects
+ */
+const listNoteObjects = async (studentId) => {
+  const noteObjects = [];
+  await awsOps.forEachPage({ Prefix: `${studentId}/` }, (page) => {
+    noteObjects.push(..._.reject(page.Contents, ({ Key: key }) => _.last(key) === '/'));
+  });
+  return noteObjects;
+};
+
+/**
+ * Get the version of a listing of note objects. The version is a hash of the key and ETag of every
+ * listed object, so it changes whenever a note is added, modified or deleted. Each listing is only
+ * hashed once.
+ *
+ * @param {object[]} noteObjects Listing of the student's note objects
+ * @returns {string} Version of the listing
+ */
+const getListingVersion = (noteObjects) => {
+  if (!listingVersions.has(noteObjects)) {
+    const hash = crypto.createHash('sha1');
+    _.forEach(_.sortBy(noteObjects, 'Key'), ({ Key: key, ETag: eTag }) => {
+      hash.update(`${key} ${eTag}\n`);
+    });
+    listingVersions.set(noteObjects, hash.digest('hex'));
+  }
+  return listingVersions.get(noteObjects);
+};
+
+/**
+ * Reconcile manifest entries with the note objects that currently exist. Unless a listing is given,
+ * the note objects of the student are listed page by page. Notes whose ETag does not match their
+ * manifest entry are fetched and parsed as the listing arrives, and entries of deleted notes are
+ * dropped.
+ *
+ * @param {string} studentId Student ID
+ * @param {object|Promise} manifestEntries Manifest entries keyed by noteId, or a promise of them
+ * @param {object[]} noteObjects Listing of the student's note objects. Listed if not given
+ * @param {object} serverTiming Server-Timing recorder that parsing time is recorded in
+ * @returns {Promise} Promise object represents the reconciled entries and a boolean indicating if
+ *                    the original entries were stale
+ */
+const reconcileManifest = async (studentId, manifestEntries, noteObjects, serverTiming) => {
+  const reconciledEntries = {};
+  let isStale = false;
+  // Rejections are handled when the entries are awaited, which may not happen if listing fails
+  Promise.resolve(manifestEntries).catch(_.noop);
+
+  const reconcileEntry = async ({ Key: key, ETag: eTag }) => {
+    if (_.last(key) === '/') {
+      return;
+    }
+    const noteId = parseNoteId(key);
+    const entry = (await manifestEntries)[noteId];
+    if (entry && entry.eTag === eTag) {
+      reconciledEntries[noteId] = entry;
+    } else {
+      isStale = true;
+      const object = await awsOps.getJsonObject(key, { revalidate: true, serverTiming });
+      // The note may have been deleted after it was listed
+      if (object !== undefined) {
+        reconciledEntries[noteId] = { eTag: object.eTag, body: object.body };
+      }
+    }
+  };
+  await (noteObjects
+    ? awsOps.forEachListedObject(noteObjects, reconcileEntry)
+    : awsOps.forEachObject({ Prefix: `${studentId}/` }, reconcileEntry));
+
+  const hasDeletedEntries = _.size(reconciledEntries) !== _.size(await manifestEntries);
+  return { entries: reconciledEntries, isStale: isStale || hasDeletedEntries };
+};
+
+/**
+ * Create a manifest updater that writes repaired entries without losing the updates that were
+ * queued while they were being repaired. The repaired entries take precedence over the current
+ * ones and the result is reconciled once more with the note objects, so any note that was added,
+ * modified or deleted in the meantime is picked up again.
+ *
+ * @param {string} studentId Student ID
+ * @param {object} repairedEntries Reconciled manifest entries keyed by noteId
+ * @returns {Function} Updater to be passed to updateManifest
  */
-const writeNote = async (noteId, newContents) => {
-  const studentId = parseStudentId(noteId);
-  const key = `${studentId}/${noteId}.json`;
-  await awsOps.putObject(newContents, key);
+const mergeRepairedEntries = (studentId, repairedEntries) => async (currentEntries) => {
+  const { entries } = await reconcileManifest(
+    studentId,
+    { ...currentEntries, ...repairedEntries },
+  );
+  return entries;
+};
+
+/**
+ * Fetch the manifest entries of a student. Entries are read from the manifest,
+ * which is checked against a listing of the note objects so that only notes missing from or
+ * outdated in the manifest are fetched individually. Concurrent calls for the same student and the
+ * same version of the listing share a single fetch, so the entries always match the listing that a
+ * caller derived its ETag from. Parsing time is only recorded for the call that made the fetch.
+ *
+ * @param {string} studentId Student ID
+ * @param {object[]} noteObjects Listing of the student's note objects. Listed if not given
+ * @param {object} serverTiming Server-Timing recorder that parsing time is recorded in
+ * @returns {Promise} Promise object represents the manifest entries keyed by noteId
+ */
+const fetchStudentEntries = singleFlight(async (studentId, noteObjects, serverTiming) => {
+  const { entries, isStale } = await reconcileManifest(
+    studentId,
+    fetchManifest(studentId, { serverTiming }).then(({ notes }) => notes),
+    noteObjects,
+    serverTiming,
+  );
+  if (isStale) {
+    updateManifestInBackground(studentId, mergeRepairedEntries(studentId, entries));
+  }
+  return entries;
+}, (studentId, noteObjects) => (
+  noteObjects ? `${studentId} ${getListingVersion(noteObjects)}` : studentId
+));
+
+/**
+ * Load the raw notes of a student. Each call receives its own copies of the notes, so they can be
+ * filtered and sorted independently of concurrent calls sharing the same fetch.
+ *
+ * @param {string} studentId Student ID
+ * @param {object[]} noteObjects Listing of the student's note objects. Listed if not given
+ * @param {object} serverTiming Server-Timing recorder that parsing time is recorded in
+ * @returns {Promise<object[]>} Promise object represents the raw notes
+ */
+const loadStudentNotes = async (studentId, noteObjects, serverTiming) => {
+  const entries = await fetchStudentEntries(studentId, noteObjects, serverTiming);
+  return _.map(entries, ({ body }) => ({ ...body, source: localSourceName }));
+};
+
+/**
+ * Load the raw notes with the given IDs. Notes that do not exist are skipped.
+ *
+ * @param {string[]} noteIds Note IDs
+ * @param {object} serverTiming Server-Timing recorder that parsing time is recorded in
+ * @returns {Promise<object[]>} Promise object represents the raw notes
+ */
+const loadNotesByIds = async (noteIds, serverTiming) => {
+  const limit = createLimiter(batchConcurrency);
+  const objects = await Promise.all(_.map(_.uniq(noteIds), (noteId) => (
+    limit(() => fetchNote(noteId, { ...consistentRead, serverTiming }))
+  )));
+  return _.map(_.compact(objects), ({ body }) => ({ ...body, source: localSourceName }));
 };
 
 /**
@@ -57,10 +303,12 @@ const filterNotes = (rawNotes, queryParams) => {
     'filter[note][fuzzy]': noteQuery,
     'filter[source][oneOf]': sources,
     'filter[contextType][oneOf]': contextTypes,
+    'filter[id][oneOf]': noteIds,
     sort,
   } = queryParams;
 
   const filterPredicates = {
+    noteIds: (note) => !noteIds || _.includes(noteIds, note.id),
     creatorId: (note) => !creatorId || note.creatorId === creatorId,
     contextTypes: (note) => !contextTypes || _.includes(contextTypes, getContextType(note)),
     noteQuery: (note) => !noteQuery || _.includes(note.note, noteQuery),
@@ -84,57 +332,120 @@ const filterNotes = (rawNotes, queryParams) => {
   return rawNotes;
 };
 
+/**
+ * Get the version of the notes that a query would return, without fetching any note. The version
+ * is a strong ETag derived from the query and from the key and ETag of every note object of the
+ * student, so it changes whenever a note is added, modified or deleted.
+ *
+ * @param {object} query Query parameters
+ * @returns {Promise} Promise object represents the ETag and the listing of the student's note
+ *                    objects, which can be passed to getNotes. Both are undefined if the query
+ *                    has no student ID, since notes fetched by ID are not listed
+ */
+const getNotesVersion = async (query) => {
+  const { 'filter[studentId]': studentId } = query;
+  if (studentId === undefined) {
+    return {};
+  }
+  const noteObjects = await listNoteObjects(studentId);
+
+  const hash = crypto.createHash('sha1');
+  hash.update(JSON.stringify(_.sortBy(_.toPairs(query), 0)));
+  hash.update(`\n${getListingVersion(noteObjects)}`);
+  return { eTag: `"${hash.digest('hex')}"`, noteObjects };
+};
+
 /**
  * Return a list of notes filtered/sorted by query parameters
  *
  * @param {object} query Query parameters
+ * @param {object[]} noteObjects Listing of the student's note objects from getNotesVersion. Listed
+ *                               if not given
+ * @param {object} serverTiming Server-Timing recorder that the time spent fetching, parsing,
+ *                              filtering and serializing notes is recorded in
  * @returns {Promise} Promise object represents a list of notes
  */
-const getNotes = async (query) => {
-  const { 'filter[studentId]': studentId } = query;
-  const prefix = `${studentId}/`;
-  const objects = await awsOps.listObjects({ Prefix: prefix });
-
-  const objectKeys = _.map(objects.Contents, (it) => it.Key);
-  _.remove(objectKeys, (it) => _.last(it) === '/');
-
-  let rawNotes = [];
-  await Promise.all(_.map(objectKeys, async (it) => {
-    const object = await awsOps.getObject(it);
-    const noteBody = JSON.parse(object.Body.toString('utf8'));
-    noteBody.source = localSourceName;
-    rawNotes.push(noteBody);
-  }));
+const getNotes = async (query, noteObjects, serverTiming = createServerTiming()) => {
+  const { 'filter[studentId]': studentId, 'filter[id][oneOf]': noteIds } = query;
+  let rawNotes = await serverTiming.time('fetch', () => (studentId === undefined
+    ? loadNotesByIds(noteIds, serverTiming)
+    : loadStudentNotes(studentId, noteObjects, serverTiming)));
+  notesPerListRequest.observe(
+    { lookup: studentId === undefined ? 'ids' : 'student' },
+    rawNotes.length,
+  );
 
-  rawNotes = filterNotes(rawNotes, query);
+  rawNotes = serverTiming.time('filter', () => filterNotes(rawNotes, query));
 
-  const serializedNotes = serializeNotes(rawNotes, query);
+  const serializedNotes = serverTiming.time('serialize', () => serializeNotes(rawNotes, query));
   return serializedNotes;
 };
 
+/**
+ * Serialize a note along with the ETag of its object
+ *
+ * @param {object} rawNote Raw note
+ * @param {string} eTag ETag of the note object
+ * @returns {object} The serialized note and its ETag
+ */
+const serializeNoteWithETag = (rawNote, eTag) => ({
+  eTag,
+  serializedNote: serializeNote({ ...rawNote, source: localSourceName }),
+});
+
+/**
+ * Get the ETag of a note's object without downloading the note
+ *
+ * @param {string} noteId Note ID
+ * @returns {Promise<string>} Promise object represents the ETag. undefined if the note was not
+ *                            found
+ */
+const getNoteETag = async (noteId) => awsOps.getJsonObjectETag(getNoteKey(noteId), consistentRead);
+
 /**
  * Return a specific note by noteId
  *
  * @param {string} noteId id of the note in the form: '{studentId}-{number}'
- * @returns {Promise} Promise object represents a specific note
+ * @param {object} serverTiming Server-Timing recorder that the time spent fetching, parsing and
+ *                              serializing the note is recorded in
+ * @returns {Promise} Promise object represents the serialized note and the ETag of its object.
+ *                    undefined if the note was not found
  */
-const getNoteById = async (noteId) => {
-  const rawNote = await fetchNote(noteId);
-  if (rawNote === undefined) {
+const getNoteById = async (noteId, serverTiming = createServerTiming()) => {
+  const object = await serverTiming.time('fetch', () => (
+    fetchNote(noteId, { ...consistentRead, serverTiming })
+  ));
+  if (object === undefined) {
     return undefined;
   }
-  rawNote.source = localSourceName;
-  const serializedNote = serializeNote(rawNote);
-  return serializedNote;
+  return serverTiming.time('serialize', () => serializeNoteWithETag(object.body, object.eTag));
 };
 
 /**
- * Create a new note
+ * Create the directory marker of a student if it doesn't exist. Markers that are known to exist
+ * are not checked again, and concurrent calls for the same student share a single check.
+ *
+ * @param {string} studentId Student ID
+ * @returns {Promise} Promise that resolves when the directory marker exists
+ */
+const ensureStudentDir = singleFlight(async (studentId) => {
+  if (knownStudentDirs.has(studentId)) {
+    return;
+  }
+  const studentDirKey = `${studentId}/`;
+  if (!await awsOps.objectExists(studentDirKey)) {
+    await awsOps.putDir(studentDirKey);
+  }
+  knownStudentDirs.add(studentId);
+});
+
+/**
+ * Write a new note without updating the manifest of its student
  *
  * @param {object} body New note body
- * @returns {Promise} Promise object representing the new note
+ * @returns {Promise} Promise object represents the new raw note and the ETag of its object
  */
-const postNote = async (body) => {
+const createNote = async (body) => {
   const { attributes } = body.data;
   const { note, studentId, creatorId } = attributes;
 
@@ -146,11 +457,7 @@ const postNote = async (body) => {
     contextId: attributes.context.contextId,
   } : null;
 
-  const studentDirKey = `${studentId}/`;
-  // Create student ID directory if it doesn't exist
-  if (!await awsOps.objectExists(studentDirKey)) {
-    await awsOps.putDir(studentDirKey);
-  }
+  await ensureStudentDir(studentId);
 
   const noteId = `${studentId}-${uuidv4()}`;
 
@@ -165,30 +472,96 @@ const postNote = async (body) => {
   newNote.dateCreated = moment().toISOString();
   newNote.lastModified = newNote.dateCreated;
 
-  await writeNote(noteId, newNote);
-  return getNoteById(noteId);
+  const { ETag: eTag } = await writeNote(noteId, newNote);
+  return { rawNote: newNote, eTag };
 };
 
 /**
- * Patch a note by noteId
+ * Add new notes to the manifests of their students in the background
+ *
+ * @param {object[]} createdNotes New raw notes along with the ETags of their objects
+ */
+const addToManifestsInBackground = (createdNotes) => {
+  _.forEach(_.groupBy(createdNotes, 'rawNote.studentId'), (studentNotes, studentId) => {
+    updateManifestInBackground(studentId, (entries) => ({
+      ...entries,
+      ..._.fromPairs(_.map(studentNotes, ({ rawNote, eTag }) => (
+        [rawNote.id, { eTag, body: rawNote }]
+      ))),
+    }));
+  });
+};
+
+/**
+ * Create a new note
+ *
+ * @param {object} body New note body
+ * @returns {Promise} Promise object represents the serialized new note and the ETag of its object
+ */
+const postNote = async (body) => {
+  const createdNote = await createNote(body);
+  addToManifestsInBackground([createdNote]);
+  return serializeNoteWithETag(createdNote.rawNote, createdNote.eTag);
+};
+
+/**
+ * Create many notes. Notes are written a few at a time and each student's manifest is updated once
+ * for all of their new notes. A note that fails to be written does not stop the others.
+ *
+ * @param {object[]} bodies New note bodies
+ * @returns {Promise<object[]>} Promise object represents the result of each note, in the order of
+ *                              the bodies: the serialized new note and the ETag of its object, or
+ *                              the error that occurred while writing it
+ */
+const postNotes = async (bodies) => {
+  const limit = createLimiter(batchConcurrency);
+  const results = await Promise.all(_.map(bodies, (body) => limit(async () => {
+    try {
+      return await createNote(body);
+    } catch (error) {
+      return { error };
+    }
+  })));
+
+  addToManifestsInBackground(_.reject(results, 'error'));
+  return _.map(results, (result) => (
+    result.error ? result : serializeNoteWithETag(result.rawNote, result.eTag)
+  ));
+};
+
+/**
+ * Patch a note by noteId. Patches of the same note made by this process are applied one at a time,
+ * so a patch that checks the ETag of the note cannot be overwritten by another patch in between.
  *
  * @param {string} noteId Note ID
  * @param {object} body PATCH body
- * @returns {Promise} Promise object that represents the patched note
+ * @param {string} ifMatch Value of the If-Match header. If given, the note is only patched if the
+ *                         ETag of its object matches
+ * @returns {Promise} Promise object represents the serialized patched note and the ETag of its
+ *                    object. undefined if the note was not found and false if the ETag did not
+ *                    match
  */
-const patchNoteById = async (noteId, body) => {
-  const rawNote = await fetchNote(noteId);
-  if (rawNote === undefined) {
+const patchNoteById = async (noteId, body, ifMatch) => enqueueNoteUpdate(noteId, async () => {
+  const object = await fetchNote(noteId, { revalidate: true });
+  if (object === undefined) {
     return undefined;
   }
+  if (ifMatch !== undefined && !matchesIfMatch(ifMatch, object.eTag)) {
+    return false;
+  }
 
+  const rawNote = object.body;
   const { note, permissions } = body;
   rawNote.note = note || rawNote.note;
   rawNote.permissions = permissions || rawNote.permissions;
 
-  await writeNote(noteId, rawNote);
-  return getNoteById(noteId);
-};
+  const { ETag: eTag } = await writeNote(noteId, rawNote);
+  updateManifestInBackground(parseStudentId(noteId), (entries) => ({
+    ...entries,
+    [noteId]: { eTag, body: rawNote },
+  }));
+  return serializeNoteWithETag(rawNote, eTag);
+});
 
 /**
  * Delete a note by noteId
@@ -197,20 +570,110 @@ const patchNoteById = async (noteId, body) => {
  * @returns {undefined} if object was not found
  */
 const deleteNoteById = async (noteId) => {
-  const studentId = parseStudentId(noteId);
-  const key = `${studentId}/${noteId}.json`;
+  const key = getNoteKey(noteId);
   if (!await awsOps.objectExists(key)) {
     return undefined;
   }
   await awsOps.deleteObject(key);
+  updateManifestInBackground(parseStudentId(noteId), (entries) => _.omit(entries, noteId));
+  return true;
+};
+
+/**
+ * Repair the manifest of a student so that it matches the note objects of the student
+ *
+ * @param {string} studentId Student ID
+ * @param {boolean} rebuild If true, the manifest is rebuilt from scratch instead of being repaired
+ * @returns {Promise<boolean>} Promise object represents a boolean indicating if the manifest was
+ *                             rewritten
+ */
+const repairManifest = async (studentId, rebuild = false) => {
+  const manifestEntries = rebuild
+    ? {}
+    : fetchManifest(studentId).then((manifest) => manifest.notes);
+  const { entries, isStale } = await reconcileManifest(studentId, manifestEntries);
+  if (!isStale && !rebuild) {
+    return false;
+  }
+  await updateManifest(studentId, mergeRepairedEntries(studentId, entries));
   return true;
 };
 
+/**
+ * List the IDs of all students that have a note prefix in the bucket
+ *
+ * @returns {Promise<string[]>} Promise object represents the student IDs
+ */
+const listStudentIds = async () => {
+  const studentIds = [];
+  await awsOps.forEachPage({ Delimiter: '/' }, (page) => {
+    _.forEach(page.CommonPrefixes, ({ Prefix: prefix }) => {
+      const studentId = _.trimEnd(prefix, '/');
+      if (/^\d{9}$/.test(studentId)) {
+        studentIds.push(studentId);
+      }
+    });
+  });
+  return studentIds;
+};
+
+/**
+ * Repair the manifests of every student in the bucket. Students are processed one at a time to
+ * limit the load put on the bucket.
+ *
+ * @param {boolean} rebuild If true, manifests are rebuilt from scratch instead of being repaired
+ * @returns {Promise<string[]>} Promise object represents the IDs of students whose manifest was
+ *                              rewritten
+ */
+const repairManifests = async (rebuild = false) => {
+  const studentIds = await listStudentIds();
+  const rewrittenStudentIds = [];
+  await _.reduce(studentIds, async (previousRepair, studentId) => {
+    await previousRepair;
+    if (await repairManifest(studentId, rebuild)) {
+      rewrittenStudentIds.push(studentId);
+    }
+  }, Promise.resolve());
+  return rewrittenStudentIds;
+};
+
+/**
+ * Call onNote with every note in the bucket. The bucket is listed page by page and a limited number
+ * of notes are fetched at once. Fetching waits for the promises returned by onNote, so a slow
+ * consumer holds back the export instead of notes piling up in memory. Notes are fetched without
+ * going through the object cache, so an export does not evict the notes that are being served.
+ *
+ * @param {Function} onNote Function called with each raw note. May return a promise
+ * @param {Date} modifiedSince If given, only notes whose object was last modified at or after this
+ *                             time are exported
+ * @returns {Promise} Promise that resolves when every note has been passed to onNote
+ */
+const exportNotes = async (onNote, modifiedSince) => awsOps.forEachObject({}, async (object) => {
+  const { Key: key, LastModified: lastModified } = object;
+  if (_.startsWith(key, manifestPrefix) || _.last(key) === '/') {
+    return;
+  }
+  if (modifiedSince && lastModified < modifiedSince) {
+    return;
+  }
+  const noteObject = await awsOps.getObject(key);
+  // The note may have been deleted since the bucket was listed
+  if (noteObject !== undefined) {
+    await onNote({ ...await awsOps.parseJsonBody(noteObject), source: localSourceName });
+  }
+});
+
 export {
+  getNotesVersion,
   getNotes,
   postNote,
+  postNotes,
+  getNoteETag,
   getNoteById,
   patchNoteById,
   filterNotes,
   deleteNoteById,
+  repairManifest,
+  repairManifests,
+  exportNotes,
 };
@@ -0,0 +1,24 @@
+import 'source-map-support/register';
+
+import { logger } from 'utils/logger';
+
+import { validateAwsS3 } from './aws-operations';
+import { repairManifests } from './notes-dao';
+
+/**
+ * Repair the note manifests of every student in the bucket. Pass "--rebuild" to rebuild every
+ * manifest from scratch, which is needed for buckets that predate manifests.
+ *
+ * @returns {Promise} Promise that resolves when all manifests have been processed
+ */
+const main = async () => {
+  const rebuild = process.argv.includes('--rebuild');
+  await validateAwsS3();
+  const rewrittenStudentIds = await repairManifests(rebuild);
+  logger.info(`Rewrote ${rewrittenStudentIds.length} manifest(s)`);
+};
+
+main().catch((err) => {
+  logger.error(err.stack || err);
+  process.exit(1);
+});
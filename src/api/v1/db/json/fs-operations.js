@@ -1,21 +1,56 @@
 import fs from 'fs';
+import path from 'path';
+import { promisify } from 'util';
 
 import config from 'config';
 
 const { dbPath } = config.get('dataSources.json');
 
+const access = promisify(fs.access);
+const link = promisify(fs.link);
+const mkdir = promisify(fs.mkdir);
+const readdir = promisify(fs.readdir);
+const readFile = promisify(fs.readFile);
+const rename = promisify(fs.rename);
+const stat = promisify(fs.stat);
+const unlink = promisify(fs.unlink);
+const writeFile = promisify(fs.writeFile);
+
+// Number of temporary files created by this process, used to give each one a unique name
+let tempFileCount = 0;
+
+/**
+ * Executes closure. If closure rejects because a file does not exist, alternative is returned
+ *
+ * @private
+ * @param {Function<Promise>} closure Closure to be executed
+ * @param {*} alternative Value to be returned if the file does not exist
+ * @returns {Promise} The result of the closure or alternative
+ */
+const withNotFoundHandler = async (closure, alternative) => {
+  try {
+    return await closure();
+  } catch (err) {
+    if (err.code === 'ENOENT') {
+      return alternative;
+    }
+    throw err;
+  }
+};
+
 /**
  * Validate a file path and throw an error if invalid
  *
  * @throws Throws an error if the file path is not valid
- * @param {string} path Path to file
+ * @param {string} filePath Path to file
+ * @returns {Promise} Promise that resolves when the path is valid and rejects when invalid
  */
-const validateFilePath = async (path) => {
-  fs.access(path, (err) => {
-    if (err) {
-      throw new Error(`Path: '${path}' is invalid: ${err}`);
-    }
-  });
+const validateFilePath = async (filePath) => {
+  try {
+    await access(filePath);
+  } catch (err) {
+    throw new Error(`Path: '${filePath}' is invalid: ${err}`);
+  }
 };
 
 /**
@@ -25,41 +60,141 @@ const validateFilePath = async (path) => {
  */
 const validateJsonDb = () => validateFilePath(dbPath);
 
+/**
+ * Get the last time a file or directory was modified
+ *
+ * @param {string} filePath Path to file or directory
+ * @returns {Promise<number>} Promise object represents the modification time in milliseconds or
+ *                            undefined if the path doesn't exist
+ */
+const getModifiedTime = async (filePath) => withNotFoundHandler(async () => {
+  const stats = await stat(filePath);
+  return stats.mtimeMs;
+}, undefined);
+
+/**
+ * List the names of the files in a directory
+ *
+ * @param {string} dirPath Path to directory
+ * @returns {Promise<string[]>} Promise object represents the file names. Empty if the directory
+ *                              doesn't exist
+ */
+const listFiles = async (dirPath) => withNotFoundHandler(async () => readdir(dirPath), []);
+
 /**
  * Read a JSON file and return the contents as an object
  *
  * @param {string} filePath Path to file
- * @returns {object} Contents of JSON file or undefined if the file doesn't exist
+ * @returns {Promise<object>} Contents of JSON file or undefined if the file doesn't exist
  */
-const readJsonFile = (filePath) => {
-  if (fs.existsSync(filePath)) {
-    return JSON.parse(fs.readFileSync(filePath, 'utf8'));
-  }
-  return undefined;
+const readJsonFile = async (filePath) => withNotFoundHandler(async () => (
+  JSON.parse(await readFile(filePath, 'utf8'))
+), undefined);
+
+/**
+ * Write contents to a new temporary file in a directory. Temporary files are hidden and do not end
+ * in '.json', so they are never mistaken for notes.
+ *
+ * @param {string} dirPath Path to the directory
+ * @param {string} fileName Name of the file that the temporary file will replace
+ * @param {string} contents Contents of the file
+ * @returns {Promise<string>} Promise object represents the path to the temporary file
+ */
+const writeTempFile = async (dirPath, fileName, contents) => {
+  tempFileCount += 1;
+  const tempFilePath = path.join(dirPath, `.${fileName}.${process.pid}.${tempFileCount}.tmp`);
+  await writeFile(tempFilePath, contents, { flag: 'wx' });
+  return tempFilePath;
+};
+
+/**
+ * Replace the contents of a file. The contents are written to a temporary file that then replaces
+ * the file, so readers never see a partially written file.
+ *
+ * @param {string} filePath Path to file
+ * @param {string} contents New contents of the file
+ * @returns {Promise} Promise that resolves when the file has been replaced
+ */
+const replaceFile = async (filePath, contents) => {
+  const tempFilePath = await writeTempFile(
+    path.dirname(filePath), path.basename(filePath), contents,
+  );
+  return rename(tempFilePath, filePath);
 };
 
 /**
- * Write an object to a JSON file with formatting
+ * Write an object to a minified JSON file. Unless the file is exclusively created, the file
+ * is replaced through a temporary file.
  *
  * @param {string} filePath Path to file
  * @param {object} data JSON object to write
- * @param {object} options Additional options to pass to fs.writeFileSync()
+ * @param {object} options Additional options to pass to fs.writeFile()
+ * @returns {Promise} Promise that resolves when the file has been written
  */
-const writeJsonFile = (filePath, data, options = {}) => {
-  fs.writeFileSync(filePath, JSON.stringify(data, null, 2), options);
+const writeJsonFile = async (filePath, data, options = {}) => {
+  const contents = JSON.stringify(data);
+  if (options.flag === 'wx') {
+    return writeFile(filePath, contents, options);
+  }
+  return replaceFile(filePath, contents);
+};
+
+/**
+ * Create a file only if no file exists at its path yet. The file is fully written before it appears
+ * at its path, so readers never see a partially written file.
+ *
+ * @param {string} filePath Path to file
+ * @param {string} contents Contents of the file
+ * @returns {Promise<boolean>} Promise object represents whether the file was created. false if a
+ *                             file already exists at the path
+ */
+const createFile = async (filePath, contents) => {
+  const tempFilePath = await writeTempFile(
+    path.dirname(filePath), path.basename(filePath), contents,
+  );
+  try {
+    // Unlike rename, link fails instead of replacing a file that already exists
+    await link(tempFilePath, filePath);
+    return true;
+  } catch (err) {
+    if (err.code === 'EEXIST') {
+      return false;
+    }
+    throw err;
+  } finally {
+    await unlink(tempFilePath);
+  }
 };
 
 /**
- * Initialize a student directory with a counter starting at '1'
+ * Create a JSON file only if no file exists at its path yet. The file is fully written before it
+ * appears at its path, so readers never see a partially written file.
+ *
+ * @param {string} filePath Path to file
+ * @param {object} data JSON object to write
+ * @returns {Promise<boolean>} Promise object represents whether the file was created. false if a
+ *                             file already exists at the path
+ */
+const createJsonFile = async (filePath, data) => createFile(filePath, JSON.stringify(data));
+
+/**
+ * Initialize a student directory with a counter starting at '1'. Another process that finds the
+ * directory before the counter exists reads no counter rather than an empty one.
  *
  * @param {string} studentDirPath Path to directory
  * @param {string} counterFilePath Path to counter file
+ * @returns {Promise} Promise that resolves when the directory exists
  */
-const initStudentDir = (studentDirPath, counterFilePath) => {
-  if (!fs.existsSync(studentDirPath)) {
-    fs.mkdirSync(studentDirPath);
-    fs.writeFileSync(counterFilePath, '1\n', { flag: 'wx' });
+const initStudentDir = async (studentDirPath, counterFilePath) => {
+  try {
+    await mkdir(studentDirPath);
+  } catch (err) {
+    if (err.code === 'EEXIST') {
+      return;
+    }
+    throw err;
   }
+  await createFile(counterFilePath, '1\n');
 };
 
 /**
@@ -67,12 +202,12 @@ const initStudentDir = (studentDirPath, counterFilePath) => {
  *
  * @throws Error if the counter file is invalid
  * @param {string} counterFilePath The path to the counter file
- * @returns {string} The value of the counter
+ * @returns {Promise<string>} The value of the counter
  */
-const getCounter = (counterFilePath) => {
+const getCounter = async (counterFilePath) => {
   // contents of counter file should be only digits followed by a newline
   const counterRegExp = /^(\d+)\n$/;
-  const contents = fs.readFileSync(counterFilePath).toString();
+  const contents = (await readFile(counterFilePath)).toString();
   const match = counterRegExp.exec(contents);
   if (!match) {
     throw new Error(`Counter file: ${counterFilePath} contents: ${contents} are invalid`);
@@ -82,37 +217,35 @@ const getCounter = (counterFilePath) => {
 };
 
 /**
- * Increment the value of a counter
+ * Set the value of a counter
  *
  * @param {string} counterFilePath Path to counter file
+ * @param {number} counter New value of the counter
+ * @returns {Promise} Promise that resolves when the counter has been written
  */
-const incrementCounter = (counterFilePath) => {
-  const counter = getCounter(counterFilePath);
-  const newCounter = `${(parseInt(counter, 10) + 1).toString()}\n`;
-  fs.writeFileSync(counterFilePath, newCounter);
-};
+const setCounter = async (counterFilePath, counter) => replaceFile(counterFilePath, `${counter}\n`);
 
 /**
  * Delete a file
  *
  * @param {string} filePath Path to file
- * @returns {boolean} True if file was deleted and undefined if file was not found
+ * @returns {Promise<boolean>} True if file was deleted and undefined if file was not found
  */
-const deleteFile = (filePath) => {
-  if (fs.existsSync(filePath)) {
-    fs.unlinkSync(filePath);
-    return true;
-  }
-  return undefined;
-};
+const deleteFile = async (filePath) => withNotFoundHandler(async () => {
+  await unlink(filePath);
+  return true;
+}, undefined);
 
 export {
   validateFilePath,
   validateJsonDb,
+  getModifiedTime,
+  listFiles,
   readJsonFile,
   writeJsonFile,
+  createJsonFile,
   initStudentDir,
   getCounter,
-  incrementCounter,
+  setCounter,
   deleteFile,
 };
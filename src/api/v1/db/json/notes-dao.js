@@ -1,15 +1,31 @@
 import config from 'config';
-import fs from 'fs';
+import crypto from 'crypto';
 import _ from 'lodash';
 import moment from 'moment';
 import path from 'path';
 
+import { createKeyedQueue, createLimiter } from 'utils/concurrency';
+import { matchesIfMatch } from 'utils/conditional-requests';
+import { buildNgramIndex, searchNgramIndex } from 'utils/ngram-index';
+import { createServerTiming } from 'utils/server-timing';
+import { singleFlight } from 'utils/single-flight';
+
 import * as fsOps from './fs-operations';
 import { serializeNotes, serializeNote } from '../../serializers/notes-serializer';
 
 const { dbPath } = config.get('dataSources.json');
 // This is the value of the 'source' field that will be set for all notes fetched from the local DB.
 const localSourceName = 'advisorPortal';
+// Limits the number of note files that are open at once
+const limitFileOperations = createLimiter(64);
+// In-memory copies of the notes of each student, keyed by student ID
+const studentIndexes = new Map();
+// The next note number that this process would try for each student, keyed by student ID
+const nextCounters = new Map();
+// Queues of counter updates per student. Used to apply updates from this process one at a time.
+const enqueueCounterUpdate = createKeyedQueue();
+// Queues of note updates per note. Used to apply updates from this process one at a time.
+const enqueueNoteUpdate = createKeyedQueue();
 
 /**
  * Parses studentId from noteId
@@ -19,6 +35,73 @@ const localSourceName = 'advisorPortal';
  */
 const parseStudentId = (noteId) => noteId.split('-')[0];
 
+/**
+ * Get the path of a student's directory
+ *
+ * @param {string} studentId Student ID
+ * @returns {string} Path to the directory that holds the student's notes
+ */
+const getStudentDirPath = (studentId) => `${dbPath}/${studentId}`;
+
+/**
+ * Get the path of a note's file
+ *
+ * @param {string} noteId Note ID
+ * @returns {string} Path to the note file
+ */
+const getNoteFilePath = (noteId) => `${getStudentDirPath(parseStudentId(noteId))}/${noteId}.json`;
+
+/**
+ * Drop the in-memory notes of a student so that the next request reads them from disk again
+ *
+ * @param {string} studentId Student ID
+ */
+const invalidateStudentIndex = (studentId) => {
+  studentIndexes.delete(studentId);
+};
+
+/**
+ * Get the in-memory notes of a student. The notes are read from disk when the student's directory
+ * has been modified since they were last loaded. Adding, replacing or removing a note file changes
+ * the modification time of the directory.
+ *
+ * @param {string} studentId Student ID
+ * @returns {Promise<object>} Promise object represents the student's notes keyed by note ID and a
+ *                            trigram index of their note attribute
+ */
+const loadStudentIndex = singleFlight(async (studentId) => {
+  const studentDirPath = getStudentDirPath(studentId);
+  // The modification time is read before the directory so that changes made while loading are
+  // picked up by the next request
+  const modifiedTime = await fsOps.getModifiedTime(studentDirPath);
+  if (modifiedTime === undefined) {
+    invalidateStudentIndex(studentId);
+    return { notes: {}, ngramIndex: {} };
+  }
+
+  const cachedIndex = studentIndexes.get(studentId);
+  if (cachedIndex && cachedIndex.modifiedTime === modifiedTime) {
+    return cachedIndex;
+  }
+
+  const noteFiles = _.filter(
+    await fsOps.listFiles(studentDirPath),
+    (it) => path.extname(it).toLowerCase() === '.json',
+  );
+  const rawNotes = await Promise.all(_.map(noteFiles, (file) => limitFileOperations(
+    () => fsOps.readJsonFile(`${studentDirPath}/${file}`),
+  )));
+  // A note that was deleted after the directory was listed is skipped
+  const notes = _.keyBy(_.compact(rawNotes), 'id');
+  const studentIndex = {
+    modifiedTime,
+    notes,
+    ngramIndex: buildNgramIndex(_.mapValues(notes, 'note')),
+  };
+  studentIndexes.set(studentId, studentIndex);
+  return studentIndex;
+});
+
 /**
  * Filter notes using parameters
  *
@@ -31,9 +114,10 @@ const filterNotes = (rawNotes, queryParams) => {
   const getContextType = (rawNote) => (rawNote.context ? rawNote.context.contextType : null);
 
   const {
-    creatorId, q, sources, sortKey, contextTypes,
+    ids, creatorId, q, sources, sortKey, contextTypes,
   } = queryParams;
 
+  rawNotes = ids ? _.filter(rawNotes, (it) => _.includes(ids, it.id)) : rawNotes;
   rawNotes = creatorId ? _.filter(rawNotes, (it) => it.creatorId === creatorId) : rawNotes;
 
   rawNotes = contextTypes
@@ -54,151 +138,256 @@ const filterNotes = (rawNotes, queryParams) => {
  * Return a list of notes filtered/sorted by query parameters
  *
  * @param {object} query Query parameters
+ * @param {object} serverTiming Server-Timing recorder that the time spent fetching, filtering and
+ *                              serializing notes is recorded in
  * @returns {Promise} Promise object represents a list of notes
  */
-const getNotes = (query) => new Promise((resolve, reject) => {
-  try {
-    const { studentId } = query;
-    const studentDirPath = `${dbPath}/${studentId}`;
-    let noteFiles = fs.existsSync(studentDirPath) ? fs.readdirSync(studentDirPath) : [];
-    noteFiles = _.filter(noteFiles, (it) => path.extname(it).toLowerCase() === '.json');
-
-    let rawNotes = [];
-    _.forEach(noteFiles, (file) => {
-      const rawNote = fsOps.readJsonFile(`${studentDirPath}/${file}`);
-      rawNote.source = localSourceName;
-      rawNotes.push(rawNote);
-    });
-    rawNotes = filterNotes(rawNotes, query);
-
-    const serializedNotes = serializeNotes(rawNotes, query);
-    resolve(serializedNotes);
-  } catch (err) {
-    reject(err);
-  }
-});
+const getNotes = async (query, serverTiming = createServerTiming()) => {
+  const { studentId, ids, q } = query;
+  const candidateNotes = await serverTiming.time('fetch', async () => {
+    if (studentId === undefined) {
+      return _.compact(await Promise.all(_.map(_.uniq(ids), (noteId) => (
+        limitFileOperations(() => fetchNote(noteId))
+      ))));
+    }
+    const { notes, ngramIndex } = await loadStudentIndex(studentId);
+    const candidateNoteIds = q ? searchNgramIndex(ngramIndex, q) : undefined;
+    return candidateNoteIds ? _.pick(notes, candidateNoteIds) : notes;
+  });
+
+  let rawNotes = _.map(candidateNotes, (note) => ({ ...note, source: localSourceName }));
+  rawNotes = serverTiming.time('filter', () => filterNotes(rawNotes, query));
+
+  const serializedNotes = serverTiming.time('serialize', () => serializeNotes(rawNotes, query));
+  return serializedNotes;
+};
 
 /**
  * Fetch a note from the database by its noteId
  *
  * @param {string} noteId Note ID
- * @returns {object} The raw note from the DB
+ * @returns {Promise<object>} The raw note from the DB or undefined if it doesn't exist
  */
-const fetchNote = (noteId) => {
-  try {
-    const studentId = parseStudentId(noteId);
-    const studentDirPath = `${dbPath}/${studentId}`;
-    return fsOps.readJsonFile(`${studentDirPath}/${noteId}.json`);
-  } catch (err) {
-    return undefined;
-  }
-};
+const fetchNote = async (noteId) => fsOps.readJsonFile(getNoteFilePath(noteId));
 
 /**
  * Write newContents to the note with id noteId
  *
  * @param {string} noteId Note ID
  * @param {string} newContents New contents
- * @param {boolean} failIfExists If true, the method will throw an error if the file already exists
+ * @returns {Promise} Promise that resolves when the note has been written
  */
-const writeNote = (noteId, newContents, failIfExists = false) => {
-  const options = failIfExists ? { flag: 'wx' } : { flag: 'w' };
-  const studentId = parseStudentId(noteId);
-  const noteFilePath = `${dbPath}/${studentId}/${noteId}.json`;
-  fsOps.writeJsonFile(noteFilePath, newContents, options);
+const writeNote = async (noteId, newContents) => {
+  await fsOps.writeJsonFile(getNoteFilePath(noteId), newContents);
+  invalidateStudentIndex(parseStudentId(noteId));
 };
 
 /**
- * Return a specific note by noteId
+ * Read the counter of a student. The counter is only a hint of the next free note number, since
+ * other processes may have created notes since it was written.
  *
- * @param {string} noteId id of the note in the form: '{studentId}-{number}'
- * @returns {Promise} Promise object represents a specific note
+ * @param {string} counterFilePath Path to counter file
+ * @returns {Promise<number>} Promise object represents the value of the counter. 1 if the counter
+ *                            has not been written yet
  */
-const getNoteById = (noteId) => new Promise((resolve, reject) => {
+const readCounterHint = async (counterFilePath) => {
   try {
-    const rawNote = fetchNote(noteId);
-    if (!rawNote) {
-      resolve(undefined);
+    return parseInt(await fsOps.getCounter(counterFilePath), 10);
+  } catch (err) {
+    if (err.code === 'ENOENT') {
+      return 1;
     }
-    rawNote.source = localSourceName;
+    throw err;
+  }
+};
 
-    const serializedNote = serializeNote(rawNote);
-    resolve(serializedNote);
-  } catch (err) {
-    reject(err);
+/**
+ * Reserve a note number for a student. Numbers are handed out in order within this process, so
+ * concurrent requests never try the same number. The counter is read on every reservation, so
+ * numbers used by other processes are skipped, even those of notes that were deleted since.
+ *
+ * @param {string} studentId Student ID
+ * @param {string} counterFilePath Path to counter file
+ * @returns {Promise<number>} Promise object represents the reserved number
+ */
+const reserveCounter = async (studentId, counterFilePath) => {
+  const counterHint = await readCounterHint(counterFilePath);
+  // Other requests of this process may have reserved numbers beyond the counter
+  const counter = Math.max(counterHint, nextCounters.get(studentId) || 1);
+  nextCounters.set(studentId, counter + 1);
+  return counter;
+};
+
+/**
+ * Raise the counter of a student to a value. The counter is left as is if it is already higher.
+ *
+ * @param {string} studentId Student ID
+ * @param {string} counterFilePath Path to counter file
+ * @param {number} counter New value of the counter
+ * @returns {Promise} Promise that resolves when the counter has been updated
+ */
+const raiseCounter = (studentId, counterFilePath, counter) => (
+  enqueueCounterUpdate(studentId, async () => {
+    if (await readCounterHint(counterFilePath) < counter) {
+      await fsOps.setCounter(counterFilePath, counter);
+    }
+  })
+);
+
+/**
+ * Create the file of a new note under the next free note ID. A number that is already taken by
+ * another process is skipped and the next one is tried.
+ *
+ * @param {object} newNote New note without its ID
+ * @param {string} counterFilePath Path to counter file
+ * @returns {Promise<object>} Promise object represents the created note
+ */
+const createNote = async (newNote, counterFilePath) => {
+  const { studentId } = newNote;
+  const counter = await reserveCounter(studentId, counterFilePath);
+  const noteId = `${studentId}-${counter}`;
+  const note = { id: noteId, ...newNote };
+
+  if (!await fsOps.createJsonFile(getNoteFilePath(noteId), note)) {
+    return createNote(newNote, counterFilePath);
   }
+  invalidateStudentIndex(studentId);
+
+  await raiseCounter(studentId, counterFilePath, counter + 1);
+  return note;
+};
+
+/**
+ * Compute the ETag of a note. Note files have no ETag of their own, so it is derived from the
+ * contents of the note.
+ *
+ * @param {object} rawNote Raw note as it is stored in its file
+ * @returns {string} Strong ETag of the note
+ */
+const computeNoteETag = (rawNote) => (
+  `"${crypto.createHash('sha1').update(JSON.stringify(rawNote)).digest('hex')}"`
+);
+
+/**
+ * Serialize a note along with its ETag
+ *
+ * @param {object} rawNote Raw note as it is stored in its file
+ * @returns {object} The serialized note and its ETag
+ */
+const serializeNoteWithETag = (rawNote) => ({
+  eTag: computeNoteETag(rawNote),
+  serializedNote: serializeNote({ ...rawNote, source: localSourceName }),
 });
 
+/**
+ * Get the ETag of a note
+ *
+ * @param {string} noteId Note ID
+ * @returns {Promise<string>} Promise object represents the ETag. undefined if the note was not
+ *                            found
+ */
+const getNoteETag = async (noteId) => {
+  const rawNote = await fetchNote(noteId);
+  return rawNote ? computeNoteETag(rawNote) : undefined;
+};
+
+/**
+ * Return a specific note by noteId
+ *
+ * @param {string} noteId id of the note in the form: '{studentId}-{number}'
+ * @param {object} serverTiming Server-Timing recorder that the time spent fetching and serializing
+ *                              the note is recorded in
+ * @returns {Promise} Promise object represents the serialized note and its ETag. undefined if the
+ *                    note was not found
+ */
+const getNoteById = async (noteId, serverTiming = createServerTiming()) => {
+  const rawNote = await serverTiming.time('fetch', () => fetchNote(noteId));
+  if (!rawNote) {
+    return undefined;
+  }
+  return serverTiming.time('serialize', () => serializeNoteWithETag(rawNote));
+};
+
 /**
  * Create a new note
  *
  * @param {object} body New note
- * @returns {Promise} Promise object representing the new note
+ * @returns {Promise} Promise object represents the serialized new note and its ETag
  */
-const postNote = (body) => new Promise((resolve, reject) => {
-  try {
-    const { attributes } = body.data;
-    const {
-      note, studentId, creatorId,
-    } = attributes;
-
-    // express-openapi does not correctly handle this default value so it must be specified manually
-    const permissions = attributes.permissions || 'advisor';
-    // ignore additional fields in context
-    const context = attributes.context ? {
-      contextType: attributes.context.contextType, contextId: attributes.context.contextId,
-    } : null;
-
-    const studentDir = `${dbPath}/${studentId}`;
-    const counterFilePath = `${studentDir}/counter.txt`;
-    fsOps.initStudentDir(studentDir, counterFilePath);
-
-    const counter = fsOps.getCounter(counterFilePath);
-    const noteId = `${studentId}-${counter}`;
-
-    const newNote = {
-      id: noteId,
-      note,
-      studentId,
-      creatorId,
-      permissions,
-      context,
-    };
-    newNote.dateCreated = moment().toISOString();
-    newNote.lastModified = newNote.dateCreated;
-
-    writeNote(noteId, newNote, true);
-    fsOps.incrementCounter(counterFilePath);
-
-    resolve(getNoteById(noteId));
-  } catch (err) {
-    reject(err);
-  }
-});
+const postNote = async (body) => {
+  const { attributes } = body.data;
+  const {
+    note, studentId, creatorId,
+  } = attributes;
+
+  // express-openapi does not correctly handle this default value so it must be specified manually
+  const permissions = attributes.permissions || 'advisor';
+  // ignore additional fields in context
+  const context = attributes.context ? {
+    contextType: attributes.context.contextType, contextId: attributes.context.contextId,
+  } : null;
+
+  const studentDir = getStudentDirPath(studentId);
+  const counterFilePath = `${studentDir}/counter.txt`;
+  await fsOps.initStudentDir(studentDir, counterFilePath);
+
+  const dateCreated = moment().toISOString();
+  const newNote = await createNote({
+    note,
+    studentId,
+    creatorId,
+    permissions,
+    context,
+    dateCreated,
+    lastModified: dateCreated,
+  }, counterFilePath);
+
+  return serializeNoteWithETag(newNote);
+};
+
+/**
+ * Create many notes. A note that fails to be written does not stop the others.
+ *
+ * @param {object[]} bodies New note bodies
+ * @returns {Promise<object[]>} Promise object represents the result of each note, in the order of
+ *                              the bodies: the serialized new note and its ETag, or the error
+ *                              that occurred while writing it
+ */
+const postNotes = async (bodies) => Promise.all(_.map(bodies, (body) => (
+  limitFileOperations(async () => {
+    try {
+      return await postNote(body);
+    } catch (error) {
+      return { error };
+    }
+  })
+)));
 
 /**
  * Patch a note by noteId
  *
  * @param {string} noteId Note ID
  * @param {object} body PATCH body
- * @returns {Promise} Promise object that represents the patched note
+ * @param {string} ifMatch Value of the If-Match header. If given, the note is only patched if its
+ *                         ETag matches
+ * @returns {Promise} Promise object represents the serialized patched note and its ETag. undefined
+ *                    if the note was not found and false if the ETag did not match
  */
-const patchNoteById = (noteId, body) => new Promise((resolve, reject) => {
-  try {
-    const rawNote = fetchNote(noteId);
-    if (!rawNote) {
-      resolve(undefined);
-    }
+const patchNoteById = async (noteId, body, ifMatch) => enqueueNoteUpdate(noteId, async () => {
+  const rawNote = await fetchNote(noteId);
+  if (!rawNote) {
+    return undefined;
+  }
+  if (ifMatch !== undefined && !matchesIfMatch(ifMatch, computeNoteETag(rawNote))) {
+    return false;
+  }
 
-    const { note, permissions } = body;
-    rawNote.note = note || rawNote.note;
-    rawNote.permissions = permissions || rawNote.permissions;
+  const { note, permissions } = body;
+  rawNote.note = note || rawNote.note;
+  rawNote.permissions = permissions || rawNote.permissions;
 
-    writeNote(noteId, rawNote);
-    resolve(getNoteById(noteId));
-  } catch (err) {
-    reject(err);
-  }
+  await writeNote(noteId, rawNote);
+  return serializeNoteWithETag(rawNote);
 });
 
 /**
@@ -207,21 +396,61 @@ const patchNoteById = (noteId, body) => new Promise((resolve, reject) => {
  * @param {string} noteId Note ID
  * @returns {Promise} Deletion promise
  */
-const deleteNoteById = (noteId) => new Promise((resolve, reject) => {
-  try {
-    const studentId = parseStudentId(noteId);
-    const noteFilePath = `${dbPath}/${studentId}/${noteId}.json`;
-    resolve(fsOps.deleteFile(noteFilePath));
-  } catch (err) {
-    reject(err);
-  }
-});
+const deleteNoteById = async (noteId) => {
+  const isDeleted = await fsOps.deleteFile(getNoteFilePath(noteId));
+  invalidateStudentIndex(parseStudentId(noteId));
+  return isDeleted;
+};
+
+/**
+ * Call onNote with every note in the database. Students are exported one at a time and a limited
+ * number of their note files are read at once. Reading waits for the promises returned by onNote,
+ * so a slow consumer holds back the export instead of notes piling up in memory.
+ *
+ * @param {Function} onNote Function called with each raw note. May return a promise
+ * @param {Date} modifiedSince If given, only notes whose file was last modified at or after this
+ *                             time are exported
+ * @returns {Promise} Promise that resolves when every note has been passed to onNote
+ */
+const exportNotes = async (onNote, modifiedSince) => {
+  const limitExport = createLimiter(16);
+  const studentIds = _.filter(await fsOps.listFiles(dbPath), (it) => /^\d{9}$/.test(it));
+
+  const exportNoteFile = async (noteFilePath) => {
+    if (modifiedSince) {
+      const modifiedTime = await fsOps.getModifiedTime(noteFilePath);
+      if (modifiedTime === undefined || modifiedTime < modifiedSince.getTime()) {
+        return;
+      }
+    }
+    const rawNote = await limitFileOperations(() => fsOps.readJsonFile(noteFilePath));
+    // The note may have been deleted since the directory was listed
+    if (rawNote !== undefined) {
+      await onNote({ ...rawNote, source: localSourceName });
+    }
+  };
+
+  return _.reduce(studentIds, async (previousExport, studentId) => {
+    await previousExport;
+    const studentDirPath = getStudentDirPath(studentId);
+    const noteFiles = _.filter(
+      await fsOps.listFiles(studentDirPath),
+      (it) => path.extname(it).toLowerCase() === '.json',
+    );
+    await Promise.all(_.map(noteFiles, (file) => limitExport(
+      () => exportNoteFile(`${studentDirPath}/${file}`),
+    )));
+  }, Promise.resolve());
+};
 
 export {
   getNotes,
   postNote,
+  postNotes,
+  getNoteETag,
   getNoteById,
   patchNoteById,
   filterNotes,
   deleteNoteById,
+  exportNotes,
 };
@@ -1,5 +1,7 @@
-import { errorHandler } from 'errors/errors';
+import { errorBuilder, errorHandler } from 'errors/errors';
+import { isFresh } from 'utils/conditional-requests';
 import { openapi } from 'utils/load-openapi';
+import { createServerTiming, setServerTimingHeader } from 'utils/server-timing';
 
 import * as notesDAO from '../db/awsS3/notes-dao';
 
@@ -12,7 +14,24 @@ const { paths } = openapi;
  */
 const get = async (req, res) => {
   try {
-    const result = await notesDAO.getNotes(req.query);
+    const { 'filter[studentId]': studentId, 'filter[id][oneOf]': noteIds } = req.query;
+    if (studentId === undefined && noteIds === undefined) {
+      return errorBuilder(res, 400, ['filter[studentId] or filter[id][oneOf] must be given.']);
+    }
+
+    const serverTiming = createServerTiming();
+    const { eTag, noteObjects } = await serverTiming.time(
+      'list', () => notesDAO.getNotesVersion(req.query),
+    );
+    if (eTag !== undefined) {
+      res.set('ETag', eTag);
+      if (isFresh(req, eTag)) {
+        setServerTimingHeader(res, serverTiming);
+        return res.status(304).end();
+      }
+    }
+    const result = await notesDAO.getNotes(req.query, noteObjects, serverTiming);
+    setServerTimingHeader(res, serverTiming);
     return res.send(result);
   } catch (err) {
     return errorHandler(res, err);
@@ -26,9 +45,9 @@ const get = async (req, res) => {
  */
 const post = async (req, res) => {
   try {
-    const result = await notesDAO.postNote(req.body);
-    res.set('Location', result.data.links.self);
-    return res.status(201).send(result);
+    const { eTag, serializedNote } = await notesDAO.postNote(req.body);
+    res.set({ Location: serializedNote.data.links.self, ETag: eTag });
+    return res.status(201).send(serializedNote);
   } catch (err) {
     return errorHandler(res, err);
   }
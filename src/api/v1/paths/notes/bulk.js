@@ -0,0 +1,36 @@
+import _ from 'lodash';
+
+import { errorHandler, internalServerError } from 'errors/errors';
+import { openapi } from 'utils/load-openapi';
+import { logger } from 'utils/logger';
+
+import * as notesDAO from '../../db/awsS3/notes-dao';
+
+const { paths } = openapi;
+
+/**
+ * POST many notes
+ *
+ * @type {RequestHandler}
+ */
+const post = async (req, res) => {
+  try {
+    const results = await notesDAO.postNotes(_.map(req.body.data, (data) => ({ data })));
+    const data = _.map(results, ({ error, serializedNote }) => {
+      if (error) {
+        logger.error(error.stack || error);
+        return { status: '500', ...internalServerError('The note could not be created.') };
+      }
+      return { status: '201', ...serializedNote };
+    });
+    const failed = _.filter(results, 'error').length;
+    const meta = { created: results.length - failed, failed };
+    return res.send({ meta, data });
+  } catch (err) {
+    return errorHandler(res, err);
+  }
+};
+
+post.apiDoc = paths['/notes/bulk'].post;
+
+export { post };
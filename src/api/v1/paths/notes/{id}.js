@@ -1,5 +1,7 @@
 import { errorBuilder, errorHandler } from 'errors/errors';
+import { isFresh } from 'utils/conditional-requests';
 import { openapi } from 'utils/load-openapi';
+import { createServerTiming, setServerTimingHeader } from 'utils/server-timing';
 
 import * as notesDAO from '../../db/awsS3/notes-dao';
 
@@ -15,11 +17,28 @@ const notFoundMessage = 'A note with the specified noteId was not found.';
 const get = async (req, res) => {
   try {
     const { id } = req.params;
-    const result = await notesDAO.getNoteById(id);
+    const serverTiming = createServerTiming();
+    // Revalidations are answered from the ETag alone, without downloading the note
+    if (req.get('If-None-Match')) {
+      const eTag = await serverTiming.time('head', () => notesDAO.getNoteETag(id));
+      if (eTag === undefined) {
+        errorBuilder(res, 404, notFoundMessage);
+        return;
+      }
+      res.set('ETag', eTag);
+      if (isFresh(req, eTag)) {
+        setServerTimingHeader(res, serverTiming);
+        res.status(304).end();
+        return;
+      }
+    }
+
+    const result = await notesDAO.getNoteById(id, serverTiming);
+    setServerTimingHeader(res, serverTiming);
     if (result === undefined) {
       errorBuilder(res, 404, notFoundMessage);
     } else {
-      res.send(result);
+      res.set('ETag', result.eTag).send(result.serializedNote);
     }
   } catch (err) {
     errorHandler(res, err);
@@ -35,11 +54,13 @@ const patch = async (req, res) => {
   try {
     const { id } = req.params;
     const { body } = req;
-    const result = await notesDAO.patchNoteById(id, body);
+    const result = await notesDAO.patchNoteById(id, body, req.get('If-Match'));
     if (result === undefined) {
-      errorBuilder(res, 404, 'A note with the specified noteId was not found.');
+      errorBuilder(res, 404, notFoundMessage);
+    } else if (result === false) {
+      errorBuilder(res, 412, 'The note has been modified since the given ETag was fetched.');
     } else {
-      res.send(result);
+      res.set('ETag', result.eTag).send(result.serializedNote);
     }
   } catch (err) {
     errorHandler(res, err);
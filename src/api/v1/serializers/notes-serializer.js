@@ -1,8 +1,8 @@
 import _ from 'lodash';
-import { Serializer as JsonApiSerializer } from 'jsonapi-serializer';
 
 import { serializerOptions } from 'utils/jsonapi';
 import { openapi } from 'utils/load-openapi';
+import { getPageQuery, paginate } from 'utils/paginator';
 import { apiBaseUrl, resourcePathLink, paramsLink } from 'utils/uri-builder';
 
 const noteResourceProp = openapi.definitions.NoteResource.properties;
@@ -10,13 +10,15 @@ const noteResourceType = noteResourceProp.type.enum[0];
 const noteResourceKeys = _.keys(noteResourceProp.attributes.properties);
 const noteResourcePath = 'notes';
 const noteResourceUrl = resourcePathLink(apiBaseUrl, noteResourcePath);
+// Equal to resourcePathLink(noteResourceUrl, '') so that self links are built by concatenation
+const noteSelfLinkPrefix = resourcePathLink(noteResourceUrl, '');
 
 // Preserve the string format between the database and the serialized object during serialization
 const keyForAttribute = _.identity;
 const enableDataLinks = true;
 
 /**
- * Get serializer args for JsonApiSerializer
+ * Get serializer args for serializerOptions
  *
  * @param {String} topLevelSelfLink Top-level self link
  * @returns {object} Serializer args
@@ -33,21 +35,68 @@ const getSerializerArgs = (topLevelSelfLink) => (
 );
 
 /**
- * Creates a new JsonApiSerializer
+ * Copy an attribute value. Plain objects and arrays are copied deeply, like jsonapi-serializer does
+ * for nested attributes, so that the document never shares objects with the raw data.
+ *
+ * @param {*} value Attribute value
+ * @returns {*} Copy of the value
+ */
+const copyAttributeValue = (value) => {
+  if (_.isArray(value)) {
+    return _.map(value, copyAttributeValue);
+  }
+  return _.isPlainObject(value) ? _.mapValues(value, copyAttributeValue) : value;
+};
+
+/**
+ * Build the resource object of a note. Produces the same resource object as jsonapi-serializer with
+ * the options from getSerializerArgs: an attribute is only included if the raw note has it and the
+ * attributes object is left out if the raw note has none.
+ *
+ * @param {object} rawNote Raw data row from data source
+ * @returns {object} Note resource object
+ */
+const buildNoteResource = (rawNote) => {
+  const resource = {
+    type: noteResourceType,
+    id: String(rawNote.id),
+    links: { self: `${noteSelfLinkPrefix}${rawNote.id}` },
+  };
+  let attributes;
+  _.forEach(noteResourceKeys, (key) => {
+    if (key in rawNote) {
+      attributes = attributes || {};
+      attributes[key] = copyAttributeValue(rawNote[key]);
+    }
+  });
+  if (attributes) {
+    resource.attributes = attributes;
+  }
+  return resource;
+};
+
+/**
+ * Serialize note data to a JSON API document. The top-level links and meta come from
+ * serializerOptions while the resource objects are built directly, which avoids walking the
+ * generic serializer options for every note.
  *
  * @param {object} serializerArgs The serializer args
- * @param {object} data Raw data to be serialized
- * @returns {object} Serializer
+ * @param {object|object[]} data Raw data to be serialized
+ * @returns {object} Serialized document
  */
-const getJsonApiSerializer = (serializerArgs, data) => (
-  new JsonApiSerializer(
-    noteResourceType,
-    serializerOptions(serializerArgs),
-  ).serialize(data)
-);
+const serializeNoteDocument = (serializerArgs, data) => {
+  const { topLevelLinks, meta } = serializerOptions(serializerArgs);
+  const document = { links: { ...topLevelLinks } };
+  if (meta) {
+    document.meta = { ...meta };
+  }
+  document.data = _.isArray(data) ? _.map(data, buildNoteResource) : buildNoteResource(data);
+  return document;
+};
 
 /**
- * Serialize noteResources to JSON API
+ * Serialize noteResources to JSON API. Only the requested page is serialized if the query contains
+ * pagination parameters.
  *
  * @param {object[]} rawNotes Raw data rows from data source
  * @param {object} query Query parameters
@@ -56,7 +105,16 @@ const getJsonApiSerializer = (serializerArgs, data) => (
 const serializeNotes = (rawNotes, query) => {
   const topLevelSelfLink = paramsLink(noteResourceUrl, query);
   const serializerArgs = getSerializerArgs(topLevelSelfLink);
-  return getJsonApiSerializer(serializerArgs, rawNotes);
+
+  const pageQuery = getPageQuery(query);
+  if (pageQuery) {
+    const pagination = paginate(rawNotes, pageQuery);
+    pagination.totalResults = rawNotes.length;
+    rawNotes = pagination.paginatedRows;
+    serializerArgs.pagination = pagination;
+    serializerArgs.query = query;
+  }
+  return serializeNoteDocument(serializerArgs, rawNotes);
 };
 
 /**
@@ -68,6 +126,6 @@ const serializeNotes = (rawNotes, query) => {
 const serializeNote = (rawNote) => {
   const topLevelSelfLink = resourcePathLink(noteResourceUrl, rawNote.id);
   const serializerArgs = getSerializerArgs(topLevelSelfLink);
-  return getJsonApiSerializer(serializerArgs, rawNote);
+  return serializeNoteDocument(serializerArgs, rawNote);
 };
 export { serializeNotes, serializeNote };
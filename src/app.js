@@ -10,13 +10,21 @@ import moment from 'moment';
 import git from 'simple-git/promise';
 import 'source-map-support/register';
 
+import { getCacheStats } from 'api/v1/db/awsS3/aws-operations';
+import { exportNotes } from 'api/v1/db/awsS3/notes-dao';
 import { errorBuilder, errorHandler } from 'errors/errors';
 import { authentication } from 'middlewares/authentication';
 import { bodyParserError } from 'middlewares/body-parser-error';
+import { compression } from 'middlewares/compression';
 import { loggerMiddleware } from 'middlewares/logger';
+import { metricsMiddleware } from 'middlewares/metrics';
 import { removeUnknownParams } from 'middlewares/remove-unknown-params';
 import { runtimeErrors } from 'middlewares/runtime-errors';
+import { closeConnectionsOnShutdown, shutDownGracefully } from 'utils/graceful-shutdown';
 import { openapi } from 'utils/load-openapi';
+import { logger } from 'utils/logger';
+import { getMetricsText } from 'utils/metrics';
+import { createNdjsonWriter } from 'utils/ndjson';
 import { validateDataSource } from 'utils/validate-data-source';
 
 const serverConfig = config.get('server');
@@ -46,9 +54,13 @@ const adminHttpsServer = https.createServer(httpsOptions, adminApp);
 
 // Middlewares for routers, logger and authentication
 const baseEndpoint = `${serverConfig.basePathPrefix}`;
+app.use(closeConnectionsOnShutdown);
+adminApp.use(closeConnectionsOnShutdown);
+app.use(compression);
 app.use(baseEndpoint, appRouter);
 adminApp.use(baseEndpoint, adminAppRouter);
 
+appRouter.use(metricsMiddleware);
 appRouter.use(loggerMiddleware);
 appRouter.use(authentication);
 adminAppRouter.use(authentication);
@@ -97,6 +109,41 @@ adminAppRouter.get(`${openapi.basePath}`, async (req, res) => {
   }
 });
 
+// Return statistics of the S3 object cache at admin endpoint
+adminAppRouter.get(`${openapi.basePath}/cache`, (req, res) => {
+  res.send({ meta: getCacheStats() });
+});
+
+// Return metrics in the Prometheus text format at admin endpoint
+adminAppRouter.get(`${openapi.basePath}/metrics`, (req, res) => {
+  res.type('text/plain; version=0.0.4').send(getMetricsText());
+});
+
+// Stream every note as newline-delimited JSON at admin endpoint
+adminAppRouter.get(`${openapi.basePath}/notes/export`, async (req, res) => {
+  const { lastModified } = req.query;
+  const modifiedSince = lastModified && moment(lastModified, moment.ISO_8601, true);
+  if (modifiedSince && !modifiedSince.isValid()) {
+    errorBuilder(res, 400, ['lastModified must be an ISO 8601 date-time.']);
+    return;
+  }
+
+  try {
+    res.type('application/x-ndjson');
+    await exportNotes(createNdjsonWriter(res), modifiedSince ? modifiedSince.toDate() : undefined);
+    res.end();
+  } catch (err) {
+    if (!res.headersSent) {
+      res.type('json');
+      errorHandler(res, err);
+      return;
+    }
+    // The status has already been sent, so the client is told by cutting the response short
+    logger.error(`Note export failed: ${err.stack}`);
+    res.destroy();
+  }
+});
+
 // Initialize API with OpenAPI specification
 initialize({
   app: appRouter,
@@ -119,3 +166,6 @@ appRouter.use((req, res) => errorBuilder(res, 404, 'Resource not found.'));
 // Start servers and listen on ports
 httpsServer.listen(serverConfig.port);
 adminHttpsServer.listen(serverConfig.adminPort);
+
+// Finish in-flight requests before exiting when the process is stopped
+shutDownGracefully([httpsServer, adminHttpsServer], serverConfig.shutdownTimeout || 10000);
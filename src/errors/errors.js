@@ -88,6 +88,19 @@ const conflict = (detail) => new JsonApiError(error(
   detail,
 ));
 
+/**
+ * [412] Return a Precondition Failed error object
+ *
+ * @param {string} detail A human-readable explanation
+ * @returns {object} Precondition Failed error object
+ */
+const preconditionFailed = (detail) => new JsonApiError(error(
+  '412',
+  'Precondition Failed',
+  '1412',
+  detail,
+));
+
 /**
  * [500] Return a Internal Server Error error object
  *
@@ -115,6 +128,7 @@ const errorBuilder = (res, status, detail) => {
     403: forbidden(detail),
     404: notFound(detail),
     409: conflict(detail),
+    412: preconditionFailed(detail),
   };
   res.status(status).send(errorDictionary[status]);
 };
@@ -142,6 +156,7 @@ const errorHandler = (res, err) => {
 
 export {
   unauthorized,
+  internalServerError,
   errorBuilder,
   errorHandler,
 };
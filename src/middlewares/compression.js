@@ -0,0 +1,127 @@
+import { promisify } from 'util';
+import zlib from 'zlib';
+
+import config from 'config';
+import _ from 'lodash';
+
+import { addContentCoding, isFresh } from 'utils/conditional-requests';
+import { logger } from 'utils/logger';
+
+const { compressionThreshold = 1024 } = config.get('server');
+
+const brotliCompress = zlib.brotliCompress && promisify(zlib.brotliCompress);
+
+// Compression functions by content coding, in order of preference. Brotli needs Node.js 10.16.
+const compressors = {
+  ...(brotliCompress ? {
+    br: (body) => brotliCompress(body, {
+      // The default quality is meant for static files and is too slow for dynamic responses
+      params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 4 },
+    }),
+  } : {}),
+  gzip: promisify(zlib.gzip),
+};
+const compressibleTypes = /^(application\/([\w.+-]*\+)?json|text\/)/;
+
+/**
+ * Check if a response body may be compressed
+ *
+ * @param {Request} req Request
+ * @param {Response} res Response
+ * @param {Buffer} body Response body
+ * @returns {boolean} Whether the body is large enough and of a type that is worth compressing
+ */
+const isCompressible = (req, res, body) => req.method !== 'HEAD'
+  && !res.headersSent
+  && !res.get('Content-Encoding')
+  && !/\bno-transform\b/.test(res.get('Cache-Control'))
+  && compressibleTypes.test(res.get('Content-Type'))
+  && body.length >= compressionThreshold;
+
+/**
+ * Negotiate the content coding of a response body. Sets Vary: Accept-Encoding on compressible
+ * responses, as they differ by Accept-Encoding even when this request accepts no content coding.
+ *
+ * @param {Request} req Request
+ * @param {Response} res Response
+ * @param {Buffer} body Response body, or undefined if the response has none
+ * @returns {string} The content coding to compress the body with, or undefined if it is sent as
+ *                   is
+ */
+const negotiateContentCoding = (req, res, body) => {
+  if (body === undefined || !isCompressible(req, res, body)) {
+    return undefined;
+  }
+  res.vary('Accept-Encoding');
+  const contentEncoding = req.acceptsEncodings([..._.keys(compressors), 'identity']);
+  return _.has(compressors, contentEncoding) ? contentEncoding : undefined;
+};
+
+/**
+ * Check if a response can be replaced with 304 Not Modified. res.send() only recognizes the ETag
+ * of the uncompressed representation in If-None-Match, so this also catches the ETags of
+ * compressed representations.
+ *
+ * @param {Request} req Request
+ * @param {Response} res Response
+ * @param {string} eTag ETag of the uncompressed representation, or undefined if it has none
+ * @returns {boolean} Whether the client already has the current representation
+ */
+const isNotModified = (req, res, eTag) => _.includes(['GET', 'HEAD'], req.method)
+  && !res.headersSent
+  && res.statusCode >= 200 && res.statusCode < 300
+  && eTag !== undefined
+  && isFresh(req, eTag);
+
+/**
+ * Middleware that compresses response bodies with brotli or gzip, depending on the Accept-Encoding
+ * header of the request. Only bodies of at least `server.compressionThreshold` bytes that are sent
+ * in one piece, as res.send() does, are compressed. The content coding is appended to the ETag of
+ * a compressed response, as a compressed representation must not share the strong ETag of the
+ * uncompressed one. The helpers in utils/conditional-requests accept both forms, and conditional
+ * GETs of every route are checked with them before the response is sent.
+ *
+ * @type {RequestHandler}
+ */
+const compression = (req, res, next) => {
+  const { end } = res;
+
+  res.end = (chunk, encoding, callback) => {
+    res.end = end;
+    let body;
+    if (chunk && !_.isFunction(chunk)) {
+      body = Buffer.isBuffer(chunk) ? chunk : Buffer.from(chunk, encoding);
+    }
+    const contentEncoding = negotiateContentCoding(req, res, body);
+    const eTag = res.get('ETag');
+    if (contentEncoding && eTag) {
+      res.set('ETag', addContentCoding(eTag, contentEncoding));
+    }
+
+    if (isNotModified(req, res, eTag)) {
+      res.status(304);
+      _.forEach(['Content-Type', 'Content-Length', 'Transfer-Encoding'], (name) => {
+        res.removeHeader(name);
+      });
+      return res.end(_.isFunction(chunk) ? chunk : callback);
+    }
+    if (!contentEncoding) {
+      return res.end(chunk, encoding, callback);
+    }
+
+    compressors[contentEncoding](body).then((compressedBody) => {
+      res.set({ 'Content-Encoding': contentEncoding, 'Content-Length': compressedBody.length });
+      res.end(compressedBody, callback);
+    }, (err) => {
+      logger.error(`Failed to compress response: ${err.stack}`);
+      if (eTag) {
+        res.set('ETag', eTag);
+      }
+      res.end(body, callback);
+    });
+    return res;
+  };
+  next();
+};
+
+export { compression };
@@ -0,0 +1,27 @@
+import { createHistogram } from 'utils/metrics';
+
+const httpRequestDuration = createHistogram({
+  name: 'http_request_duration_seconds',
+  help: 'Duration of API requests in seconds by method, route and status code',
+  labelNames: ['method', 'route', 'status'],
+});
+
+/**
+ * Middleware that records the duration of each request once its response has been sent. Requests
+ * are labeled with the path of the route that handled them rather than the requested URL, so that
+ * note IDs do not create a series each. Requests that no route handled are labeled 'unmatched'.
+ *
+ * @type {RequestHandler}
+ */
+const metricsMiddleware = (req, res, next) => {
+  const endTimer = httpRequestDuration.startTimer({ method: req.method });
+  res.on('finish', () => {
+    endTimer({
+      route: req.route ? req.route.path : 'unmatched',
+      status: res.statusCode,
+    });
+  });
+  next();
+};
+
+export { metricsMiddleware };
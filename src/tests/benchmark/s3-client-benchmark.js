@@ -0,0 +1,135 @@
+import 'source-map-support/register';
+
+import fs from 'fs';
+import https from 'https';
+
+import AWS from 'aws-sdk';
+import config from 'config';
+import _ from 'lodash';
+
+import { createLimiter } from 'utils/concurrency';
+
+const { keyPath, certPath } = config.get('server');
+const noteCount = 500;
+// Matches the default fetchConcurrency of aws-operations
+const fetchConcurrency = 16;
+const runs = 5;
+
+/**
+ * Start an HTTPS stand-in for S3 that answers every GET with a note object
+ *
+ * @returns {Promise} Promise object represents the server and a function that returns the number
+ *                    of TLS connections it has accepted
+ */
+const startS3StandIn = () => new Promise((resolve) => {
+  let connectionCount = 0;
+  const server = https.createServer({
+    key: fs.readFileSync(keyPath),
+    cert: fs.readFileSync(certPath),
+  }, (req, res) => {
+    const noteId = _.last(req.url.split('/')).replace(/\.json$/, '');
+    const body = JSON.stringify({
+      id: noteId,
+      note: `Benchmark note ${noteId}`,
+      studentId: '111111111',
+      creatorId: '987654321',
+      permissions: 'advisor',
+      context: null,
+      dateCreated: '2017-07-21T17:32:28Z',
+      lastModified: '2017-07-21T17:32:28Z',
+    });
+    res.writeHead(200, {
+      'Content-Type': 'application/json',
+      'Content-Length': Buffer.byteLength(body),
+      ETag: `"${noteId}"`,
+      'Last-Modified': new Date(0).toUTCString(),
+    });
+    res.end(body);
+  });
+  server.on('secureConnection', () => { connectionCount += 1; });
+  server.listen(0, 'localhost', () => resolve({
+    server,
+    getConnectionCount: () => connectionCount,
+  }));
+});
+
+/**
+ * Create an S3 client for the stand-in
+ *
+ * @param {number} port Port of the stand-in
+ * @param {boolean} keepAlive Whether connections are kept alive and reused
+ * @returns {object} S3 client
+ */
+const createS3Client = (port, keepAlive) => new AWS.S3({
+  endpoint: `https://localhost:${port}`,
+  s3ForcePathStyle: true,
+  region: 'us-west-2',
+  accessKeyId: 'benchmark',
+  secretAccessKey: 'benchmark',
+  httpOptions: {
+    agent: new https.Agent({ keepAlive, maxSockets: 64, rejectUnauthorized: false }),
+  },
+});
+
+/**
+ * Fetch every note of a student at once, as listing a student without a manifest does
+ *
+ * @param {object} s3 S3 client
+ * @returns {Promise<number>} Promise object represents the elapsed milliseconds
+ */
+const fanOut = async (s3) => {
+  const limit = createLimiter(fetchConcurrency);
+  const start = process.hrtime();
+  await Promise.all(_.times(noteCount, (index) => limit(async () => {
+    const object = await s3.getObject({
+      Bucket: 'benchmark',
+      Key: `111111111/111111111-${index + 1}.json`,
+    }).promise();
+    JSON.parse(object.Body.toString('utf8'));
+  })));
+  const [seconds, nanoseconds] = process.hrtime(start);
+  return seconds * 1e3 + nanoseconds / 1e6;
+};
+
+/**
+ * Compare fetching 500 notes from a local S3 stand-in with and without keep-alive connections and
+ * print the results
+ */
+const main = async () => {
+  const { server, getConnectionCount } = await startS3StandIn();
+  const { port } = server.address();
+
+  const rows = await _.reduce([false, true], async (previousRows, keepAlive) => {
+    const completedRows = await previousRows;
+    const s3 = createS3Client(port, keepAlive);
+    // Warm up
+    await fanOut(s3);
+
+    const connectionCountBefore = getConnectionCount();
+    const times = await _.reduce(_.range(runs), async (previousTimes) => (
+      [...await previousTimes, await fanOut(s3)]
+    ), Promise.resolve([]));
+    s3.config.httpOptions.agent.destroy();
+    return [...completedRows, [
+      keepAlive ? 'keep-alive' : 'no keep-alive',
+      _.mean(times).toFixed(1),
+      _.min(times).toFixed(1),
+      String((getConnectionCount() - connectionCountBefore) / runs),
+    ]];
+  }, Promise.resolve([]));
+  server.close();
+
+  const header = ['agent', `${noteCount} notes (ms)`, 'best (ms)', 'connections per fan-out'];
+  const widths = _.map(header, (column, index) => (
+    _.max(_.map([header, ...rows], (row) => String(row[index]).length))
+  ));
+  _.forEach([header, ...rows], (row) => {
+    const cells = _.map(row, (cell, index) => _.padStart(cell, widths[index]));
+    process.stdout.write(`${cells.join('  ')}\n`);
+  });
+};
+
+main().catch((err) => {
+  process.stderr.write(`${err.stack}\n`);
+  process.exitCode = 1;
+});
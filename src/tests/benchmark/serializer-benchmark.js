@@ -0,0 +1,105 @@
+import 'source-map-support/register';
+
+import { Serializer as JsonApiSerializer } from 'jsonapi-serializer';
+import _ from 'lodash';
+
+import { serializeNotes } from 'api/v1/serializers/notes-serializer';
+import { serializerOptions } from 'utils/jsonapi';
+import { openapi } from 'utils/load-openapi';
+import { apiBaseUrl, paramsLink, resourcePathLink } from 'utils/uri-builder';
+
+const noteResourceKeys = _.keys(openapi.definitions.NoteResource.properties.attributes.properties);
+const noteCounts = [10, 1000, 10000];
+// Each case runs for at least this many milliseconds after being warmed up
+const minDuration = 1000;
+
+/**
+ * Create raw notes for a student
+ *
+ * @param {number} count Number of notes
+ * @returns {object[]} Raw notes
+ */
+const createRawNotes = (count) => _.times(count, (index) => ({
+  id: `111111111-${index + 1}`,
+  note: `Benchmark note ${index + 1}`,
+  studentId: '111111111',
+  creatorId: '987654321',
+  source: 'advisorPortal',
+  permissions: 'advisor',
+  context: { contextType: 'course', contextId: 'CS-101' },
+  dateCreated: '2017-07-21T17:32:28Z',
+  lastModified: '2017-07-21T17:32:28Z',
+}));
+
+/**
+ * Serialize notes with a jsonapi-serializer built on every call, which is what notes-serializer
+ * did before it built documents directly
+ *
+ * @param {object[]} rawNotes Raw notes
+ * @param {object} query Query parameters
+ * @returns {object} Serialized notes
+ */
+const serializeNotesWithJsonApiSerializer = (rawNotes, query) => new JsonApiSerializer(
+  'note',
+  serializerOptions({
+    identifierField: 'id',
+    resourceKeys: noteResourceKeys,
+    resourcePath: 'notes',
+    topLevelSelfLink: paramsLink(resourcePathLink(apiBaseUrl, 'notes'), query),
+    keyForAttribute: _.identity,
+    enableDataLinks: true,
+  }),
+).serialize(rawNotes);
+
+/**
+ * Measure how long it takes to serialize notes and stringify the document, as a response would
+ *
+ * @param {Function} serialize Serializer
+ * @param {object[]} rawNotes Raw notes
+ * @param {object} query Query parameters
+ * @returns {number} Mean milliseconds per call
+ */
+const measure = (serialize, rawNotes, query) => {
+  const run = () => JSON.stringify(serialize(rawNotes, query));
+  _.times(5, run);
+
+  const start = process.hrtime();
+  let calls = 0;
+  let elapsed = 0;
+  while (elapsed < minDuration) {
+    run();
+    calls += 1;
+    const [seconds, nanoseconds] = process.hrtime(start);
+    elapsed = seconds * 1e3 + nanoseconds / 1e6;
+  }
+  return elapsed / calls;
+};
+
+/**
+ * Compare the serializers on lists of 10, 1,000 and 10,000 notes and print the results
+ */
+const main = () => {
+  const query = { 'filter[studentId]': '111111111' };
+  const rows = _.map(noteCounts, (count) => {
+    const rawNotes = createRawNotes(count);
+    const jsonApiSerializerTime = measure(serializeNotesWithJsonApiSerializer, rawNotes, query);
+    const serializeNotesTime = measure(serializeNotes, rawNotes, query);
+    return [
+      count,
+      jsonApiSerializerTime.toFixed(3),
+      serializeNotesTime.toFixed(3),
+      `${(jsonApiSerializerTime / serializeNotesTime).toFixed(2)}x`,
+    ];
+  });
+
+  const header = ['notes', 'jsonapi-serializer (ms)', 'serializeNotes (ms)', 'speedup'];
+  const widths = _.map(header, (column, index) => (
+    _.max(_.map([header, ...rows], (row) => String(row[index]).length))
+  ));
+  _.forEach([header, ...rows], (row) => {
+    const cells = _.map(row, (cell, index) => _.padStart(cell, widths[index]));
+    process.stdout.write(`${cells.join('  ')}\n`);
+  });
+};
+
+main();
@@ -0,0 +1,329 @@
+"""HTTP clients and OAuth2 token management for integration testing"""
+import asyncio
+import logging
+import threading
+import time
+
+import requests
+
+# httpx is only needed for the asyncio client backend selected with
+# --client async
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class OAuth2Error(Exception):
+    """Raised when an OAuth2 access token cannot be obtained"""
+
+
+class OAuth2TokenManager:
+    """Client credentials access token that is cached until it expires and
+    refreshed when it is about to expire or is rejected. Safe to share
+    between threads, and between coroutines of one event loop through
+    async_get_token()."""
+
+    def __init__(self, token_api_url, client_id, client_secret,
+                 refresh_margin_seconds=60, timeout=10):
+        """
+        :param token_api_url: URL of the token API
+        :param client_id: client ID of the application
+        :param client_secret: client secret of the application
+        :param refresh_margin_seconds: tokens are refreshed this many seconds
+                                       before they expire (default: 60)
+        :param timeout: seconds to wait for the token API (default: 10)
+        """
+
+        self.token_api_url = token_api_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.timeout = timeout
+        self.token = None
+        # Monotonic time after which the token is refreshed, or None if the
+        # token API did not say when it expires
+        self.refresh_at = None
+        self.lock = threading.Lock()
+        # Created on the event loop that uses it, the first time it is needed
+        self.async_lock = None
+
+    def get_token_request_data(self):
+        """Get the form data of a request to the token API"""
+
+        return {
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+            'grant_type': 'client_credentials'
+        }
+
+    def set_token(self, content, requested_at):
+        """Store the access token of a response of the token API
+
+        :param content: decoded content of the response
+        :param requested_at: monotonic time at which the token was requested
+        """
+
+        self.token = content['access_token']
+        expires_in = content.get('expires_in')
+        self.refresh_at = (
+            None if expires_in is None
+            else requested_at + int(expires_in) - self.refresh_margin_seconds
+        )
+        logging.debug(f'Fetched access token that expires in {expires_in} '
+                      f'second(s)')
+
+    def needs_token(self, rejected_token=None):
+        """Check if a new access token has to be fetched
+
+        :param rejected_token: token that the API rejected (default: None)
+        :returns: Whether there is no token yet, or the token was rejected or
+                  is about to expire
+        """
+
+        is_rejected = (
+            rejected_token is not None and self.token == rejected_token
+        )
+        is_expiring = (
+            self.refresh_at is not None
+            and time.monotonic() >= self.refresh_at
+        )
+        return self.token is None or is_rejected or is_expiring
+
+    def fetch_token(self):
+        """Request a new access token from the token API"""
+
+        requested_at = time.monotonic()
+        try:
+            res = requests.post(
+                url=self.token_api_url,
+                data=self.get_token_request_data(),
+                timeout=self.timeout
+            )
+            self.set_token(res.json(), requested_at)
+        except (requests.RequestException, ValueError, KeyError) as error:
+            raise OAuth2Error(f'Could not get access token: {error}')
+
+    async def async_fetch_token(self):
+        """Request a new access token from the token API without blocking
+        the event loop"""
+
+        requested_at = time.monotonic()
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                res = await client.post(
+                    self.token_api_url,
+                    data=self.get_token_request_data()
+                )
+            self.set_token(res.json(), requested_at)
+        except (httpx.HTTPError, ValueError, KeyError) as error:
+            raise OAuth2Error(f'Could not get access token: {error}')
+
+    def get_token(self, rejected_token=None):
+        """Get a valid access token
+
+        :param rejected_token: token that the API rejected. It is refreshed
+                               unless another thread already has (default:
+                               None)
+        :returns: The access token
+        """
+
+        with self.lock:
+            if self.needs_token(rejected_token):
+                self.fetch_token()
+            return self.token
+
+    async def async_get_token(self, rejected_token=None):
+        """Get a valid access token from a coroutine. Coroutines that need a
+        new token at the same time wait for a single request to the token
+        API.
+
+        :param rejected_token: token that the API rejected. It is refreshed
+                               unless another coroutine already has
+                               (default: None)
+        :returns: The access token
+        """
+
+        if self.async_lock is None:
+            self.async_lock = asyncio.Lock()
+        async with self.async_lock:
+            if self.needs_token(rejected_token):
+                await self.async_fetch_token()
+            return self.token
+
+
+class OAuth2Auth(requests.auth.AuthBase):
+    """Authentication of a requests session with a managed access token.
+    A request that is rejected with 401 is sent once more with a refreshed
+    token."""
+
+    def __init__(self, token_manager):
+        self.token_manager = token_manager
+
+    def __call__(self, request):
+        token = self.token_manager.get_token()
+        request.headers['Authorization'] = f'Bearer {token}'
+        request.register_hook('response', self.handle_401)
+        return request
+
+    def handle_401(self, response, **kwargs):
+        """Send a rejected request again with a refreshed token"""
+
+        if response.status_code != 401 or response.history:
+            return response
+
+        rejected_token = (
+            response.request.headers['Authorization'][len('Bearer '):]
+        )
+
+        # Release the connection before it is used again
+        response.content
+        response.close()
+        request = response.request.copy()
+        token = self.token_manager.get_token(rejected_token)
+        request.headers['Authorization'] = f'Bearer {token}'
+        retried_response = response.connection.send(request, **kwargs)
+        retried_response.history.append(response)
+        retried_response.request = request
+        return retried_response
+
+
+if httpx is not None:
+    class HttpxOAuth2Auth(httpx.Auth):
+        """Authentication of an httpx client with a managed access token.
+        A request that is rejected with 401 is sent once more with a
+        refreshed token. With an AsyncClient, tokens are fetched with an
+        async request, so refreshing never blocks the event loop."""
+
+        def __init__(self, token_manager):
+            self.token_manager = token_manager
+
+        def auth_flow(self, request):
+            token = self.token_manager.get_token()
+            request.headers['Authorization'] = f'Bearer {token}'
+            response = yield request
+            if response.status_code == 401:
+                token = self.token_manager.get_token(token)
+                request.headers['Authorization'] = f'Bearer {token}'
+                yield request
+
+        async def async_auth_flow(self, request):
+            token = await self.token_manager.async_get_token()
+            request.headers['Authorization'] = f'Bearer {token}'
+            response = yield request
+            if response.status_code == 401:
+                token = await self.token_manager.async_get_token(token)
+                request.headers['Authorization'] = f'Bearer {token}'
+                yield request
+
+
+class AsyncSession:
+    """Session that sends requests with an httpx.AsyncClient on an event loop
+    of its own. get() can be called from any number of threads, as the
+    synchronous tests do, and requests from all of them are multiplexed over
+    the pooled connections of the client. Coroutines that use the client
+    directly, such as an asyncio load test, can be run with run()."""
+
+    def __init__(self, auth=None, token_manager=None, verify=True,
+                 max_connections=10, http2=False):
+        """
+        :param auth: username and password for basic authentication
+                     (default: None)
+        :param token_manager: OAuth2TokenManager to authenticate with instead
+                              (default: None)
+        :param verify: whether TLS certificates are verified (default: True)
+        :param max_connections: maximum number of open connections
+                                (default: 10)
+        :param http2: whether HTTP/2 is negotiated. Requires the h2 package,
+                      e.g. pip install httpx[http2] (default: False)
+        """
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+        self.thread.start()
+
+        async def create_client():
+            # The client is created on the event loop that it is used from
+            return httpx.AsyncClient(
+                auth=(
+                    HttpxOAuth2Auth(token_manager) if token_manager else auth
+                ),
+                verify=verify,
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=30
+                ),
+                timeout=httpx.Timeout(30, connect=5)
+            )
+
+        try:
+            self.client = self.run(create_client())
+        except BaseException:
+            self.stop_loop()
+            raise
+
+    def run(self, coroutine):
+        """Run a coroutine on the event loop of the session and wait for it
+
+        :param coroutine: coroutine to run
+        :returns: The result of the coroutine
+        """
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def get(self, url, params=None, stream=False):
+        """Send a GET request
+
+        :param url: URL to request
+        :param params: query parameters (default: None)
+        :param stream: if True, the response is returned as soon as its
+                       headers arrive and its body is read with iter_bytes()
+                       (default: False)
+        :returns: The httpx response
+        """
+
+        if stream:
+            request = self.client.build_request('GET', url, params=params)
+            return self.run(self.client.send(request, stream=True))
+        return self.run(self.client.get(url, params=params))
+
+    def iter_bytes(self, response):
+        """Iterate over the body of a response that was requested with
+        stream=True, as it is received. The response is closed once its body
+        has been read.
+
+        :param response: streamed httpx response
+        :returns: An iterator of byte chunks
+        """
+
+        chunks = response.aiter_bytes()
+
+        async def next_chunk():
+            try:
+                return await chunks.__anext__()
+            except StopAsyncIteration:
+                return None
+
+        try:
+            chunk = self.run(next_chunk())
+            while chunk is not None:
+                yield chunk
+                chunk = self.run(next_chunk())
+        finally:
+            self.run(response.aclose())
+
+    def stop_loop(self):
+        """Stop the event loop of the session and wait for its thread"""
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def close(self):
+        """Close the connections of the session and stop its event loop"""
+
+        self.run(self.client.aclose())
+        self.stop_loop()
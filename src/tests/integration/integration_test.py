@@ -1,15 +1,16 @@
 """Integration tests"""
+from functools import partial
 from itertools import chain, combinations
 import json
 import logging
 import random
 import re
+import sys
 import unittest
-import yaml
 
 from datetime import datetime
-from prance import ResolvingParser
 
+import load_test
 import utils
 
 
@@ -17,27 +18,21 @@ class IntegrationTests(utils.UtilsTestCase):
     """Integration tests class"""
 
     @classmethod
-    def setup(cls, config_path, openapi_path):
+    def setup(cls, config_path, openapi_path, workers=1,
+              openapi_cache_dir=None, stream_json=False, client='sync',
+              http2=False):
         """Performs basic setup"""
 
+        cls.workers = workers
+        cls.stream_json = stream_json
         with open(config_path) as config_file:
             config = json.load(config_file)
             cls.base_url = utils.setup_base_url(config)
-            cls.session = utils.setup_session(config)
+            cls.session = utils.setup_session(config, workers, client, http2)
             cls.test_cases = config['test_cases']
             cls.local_test = config['local_test']
 
-        with open(openapi_path) as openapi_file:
-            openapi = yaml.load(openapi_file, Loader=yaml.SafeLoader)
-            if 'swagger' in openapi:
-                backend = 'flex'
-            elif 'openapi' in openapi:
-                backend = 'openapi-spec-validator'
-            else:
-                exit('Error: could not determine openapi document version')
-
-        parser = ResolvingParser(openapi_path, backend=backend)
-        cls.openapi = parser.specification
+        cls.openapi = utils.load_openapi(openapi_path, openapi_cache_dir)
 
     @classmethod
     def tearDownClass(cls):
@@ -60,142 +55,280 @@ class IntegrationTests(utils.UtilsTestCase):
 
     # Test case: GET /notes/{id}
     def test_get_note_by_id(self):
-        for note_id in self.test_cases['valid_note_ids']:
-            with self.subTest('Test valid note IDs', note_id=note_id):
-                response = self.get_response(endpoint=f'/{note_id}')
-                # Validate that the note id requested is the same note id
-                # received
-                response_data = response.json()['data']
-                actual_note_id = response_data['id']
-                self.assertEqual(actual_note_id, note_id)
-                # Validate that the noteId contains the correct studentId
-                match_student_id = re.match(r'^(\d{9})-.+', note_id)
-                self.assertIsNotNone(
-                    match_student_id,
-                    f'noteId {note_id} did not include a 9-digit student ID'
-                )
-                actual_student_id = response_data['attributes']['studentId']
-                self.assertEqual(actual_student_id, match_student_id.group(1))
-
-        for note_id in self.test_cases['invalid_note_ids']:
-            with self.subTest('Test invalid note IDs', note_id=note_id):
-                self.get_response(
-                    status=404,
-                    resource='ErrorObject',
-                    endpoint=f'/{note_id}'
-                )
+        def check_valid_note_id(note_id):
+            response = self.get_response(endpoint=f'/{note_id}')
+            # Validate that the note id requested is the same note id
+            # received
+            response_data = self.get_json_content(response)['data']
+            actual_note_id = response_data['id']
+            self.assertEqual(actual_note_id, note_id)
+            # Validate that the noteId contains the correct studentId
+            match_student_id = re.match(r'^(\d{9})-.+', note_id)
+            self.assertIsNotNone(
+                match_student_id,
+                f'noteId {note_id} did not include a 9-digit student ID'
+            )
+            actual_student_id = response_data['attributes']['studentId']
+            self.assertEqual(actual_student_id, match_student_id.group(1))
+
+        def check_invalid_note_id(note_id):
+            self.get_response(
+                status=404,
+                resource='ErrorObject',
+                endpoint=f'/{note_id}'
+            )
+
+        self.run_subtests(chain(
+            (
+                ('Test valid note IDs', {'note_id': note_id},
+                 partial(check_valid_note_id, note_id))
+                for note_id in self.test_cases['valid_note_ids']
+            ),
+            (
+                ('Test invalid note IDs', {'note_id': note_id},
+                 partial(check_invalid_note_id, note_id))
+                for note_id in self.test_cases['invalid_note_ids']
+            )
+        ))
 
     # Test case: GET /notes?filter[studentId]
     def test_get_notes(self):
-        for student_id in self.test_cases['valid_student_ids']:
-            params = {'filter[studentId]': student_id}
-            response = self.get_response(params)
+        student_ids = self.test_cases['valid_student_ids']
+        # The notes of every student are fetched first, since the filters
+        # that are tested depend on the values found in them
+        found_values = self.run_subtests(
+            ('Test valid student IDs', {'student_id': student_id},
+             partial(self.get_student_values, student_id))
+            for student_id in student_ids
+        )
+
+        query_subtests = []
+        for student_id, values in zip(student_ids, found_values):
+            # Failures have already been reported
+            if values is None:
+                continue
+            if not values['notes']:
+                logging.warning(f'No notes found for studentId {student_id}')
+                continue
+
+            # Every request of every filter is a subtest of its own, so that
+            # they are all spread over the workers
+            query_subtests.extend(chain(
+                self.query_creator_id(student_id, values['creator_ids']),
+                self.query_source(student_id, values['sources']),
+                self.query_context_type(student_id, values['context_types']),
+                self.query_string_search(student_id, values['notes']),
+                self.query_sort_fields(student_id)
+            ))
+        self.run_subtests(query_subtests)
+
+    def get_student_values(self, student_id):
+        """Get the notes of a student and validate their student ID
+
+        :param student_id: student ID
+        :returns: A dictionary of the sets of creator IDs, context types,
+                  notes and sources found in the student's notes
+        """
+
+        params = {'filter[studentId]': student_id}
+        response = self.get_response(params)
+
+        values = {
+            'creator_ids': set(),
+            'context_types': set(),
+            'notes': set(),
+            'sources': set()
+        }
+        # Validating the studentId requested is the same studentId received
+        for resource in self.iter_resources(response):
+            attributes = resource['attributes']
+            actual_student_id = attributes['studentId']
+            self.assertEqual(actual_student_id, student_id)
+
+            note_id = resource['id']
+            match_student_id = re.match(r'^(\d{9})-.+', note_id)
+            self.assertIsNotNone(
+                match_student_id,
+                f'noteId {note_id} did not match expected format'
+            )
+            self.assertEqual(match_student_id.group(1), student_id)
 
-            creator_ids = set()
-            context_types = set()
-            notes = set()
-            sources = set()
-            # Validating the studentId requested is the same studentId received
-            for resource in response.json()['data']:
-                attributes = resource['attributes']
-                actual_student_id = attributes['studentId']
-                self.assertEqual(actual_student_id, student_id)
-
-                note_id = resource['id']
-                match_student_id = re.match(r'^(\d{9})-.+', note_id)
-                self.assertIsNotNone(
-                    match_student_id,
-                    f'noteId {note_id} did not match expected format'
+            values['creator_ids'].add(attributes['creatorId'])
+            if attributes['context']:
+                values['context_types'].add(
+                    attributes['context']['contextType']
                 )
-                self.assertEqual(match_student_id.group(1), student_id)
-
-                creator_ids.add(attributes['creatorId'])
-                if attributes['context']:
-                    context_types.add(attributes['context']['contextType'])
-                notes.add(attributes['note'])
-                sources.add(attributes['source'])
-
-            if response.json()['data']:
-                with self.subTest(
-                    'filter by creatorId',
-                    student_id=student_id
-                ):
-                    self.query_creator_id(student_id, creator_ids)
-
-                with self.subTest('filter by source', student_id=student_id):
-                    self.query_source(student_id, sources)
-
-                with self.subTest(
-                    'filter by contextType',
-                    student_id=student_id
-                ):
-                    self.query_context_type(student_id, context_types)
-
-                with self.subTest('filter by q', student_id=student_id):
-                    self.query_string_search(student_id, notes)
-
-                with self.subTest('test sort fields', student_id=student_id):
-                    self.query_sort_fields(student_id)
+            values['notes'].add(attributes['note'])
+            values['sources'].add(attributes['source'])
+        return values
+
+    # Test case: GET /notes?filter[studentId]&page[number]&page[size]
+    def test_get_notes_pagination(self):
+        def check_pagination(student_id):
+            params = {'filter[studentId]': student_id}
+            total_results = sum(
+                1 for _ in self.iter_resources(self.get_response(params))
+            )
+            page_size = 2
+            params['page[size]'] = page_size
+            response = self.get_json_content(self.get_response(params))
+
+            meta = response['meta']
+            self.assertEqual(meta['totalResults'], total_results)
+            self.assertEqual(meta['currentPageNumber'], 1)
+            self.assertEqual(meta['currentPageSize'], page_size)
+            self.assertLessEqual(len(response['data']), page_size)
+            self.assertIsNone(response['links']['prev'])
+            if total_results > page_size:
+                self.assertIsNotNone(response['links']['next'])
             else:
-                logging.warning(f'No notes found for studentId {student_id}')
+                self.assertIsNone(response['links']['next'])
+
+        def check_invalid_page_params(page_params):
+            params = {
+                'filter[studentId]': self.test_cases['valid_student_ids'][0],
+                **page_params
+            }
+            self.get_response(params, 400, 'ErrorObject')
+
+        self.run_subtests(chain(
+            (
+                ('Test pagination', {'student_id': student_id},
+                 partial(check_pagination, student_id))
+                for student_id in self.test_cases['valid_student_ids']
+            ),
+            (
+                ('Test invalid page params', {'params': page_params},
+                 partial(check_invalid_page_params, page_params))
+                for page_params in [{'page[number]': 0}, {'page[size]': 0},
+                                    {'page[size]': 501},
+                                    {'page[number]': 'one'}]
+            )
+        ))
 
     # invalid tests returns 400
     def test_get_notes_invalid_student_ids(self, endpoint='/notes'):
         invalid_student_ids = self.test_cases['invalid_student_ids']
-        for student_id in invalid_student_ids:
-            self.get_response({'filter[studentId]': student_id}, 400, 'ErrorObject')
+        self.run_subtests(
+            ('Test invalid student IDs', {'student_id': student_id}, partial(
+                self.get_response,
+                {'filter[studentId]': student_id},
+                400,
+                'ErrorObject'
+            ))
+            for student_id in invalid_student_ids
+        )
+
+    def get_invalid_param_subtests(self, message, student_id, param,
+                                   invalid_values):
+        """Get subtests that check that invalid values of a query parameter
+        return 400
+
+        :param message: message of the subtests
+        :param student_id: student ID
+        :param param: name of the query parameter
+        :param invalid_values: invalid values of the query parameter
+        :returns: A list of (message, params, function) tuples for
+                  run_subtests
+        """
+
+        return [
+            (message, {'student_id': student_id, param: value}, partial(
+                self.get_response,
+                {'filter[studentId]': student_id, param: value},
+                400,
+                'ErrorObject'
+            ))
+            for value in invalid_values
+        ]
 
     def query_creator_id(self, student_id, creator_ids, endpoint='/notes'):
-        for creator_id in creator_ids:
+        """Get the subtests of filtering by creatorId. Each subtest sends one
+        request
+
+        :returns: A list of (message, params, function) tuples for
+                  run_subtests
+        """
+
+        def check_creator_id(creator_id):
             params = {
                 'filter[studentId]': student_id,
                 'filter[creatorId]': creator_id
             }
             response = self.get_response(params)
             # Validating the creatorId requested is the same creatorId received
-            for resource in response.json()['data']:
+            for resource in self.iter_resources(response):
                 actual_creator_id = resource['attributes']['creatorId']
                 self.assertEqual(actual_creator_id, creator_id)
 
+        subtests = [
+            ('filter by creatorId',
+             {'student_id': student_id, 'creator_id': creator_id},
+             partial(check_creator_id, creator_id))
+            for creator_id in creator_ids
+        ]
         # invalid tests returns 400
-        for invalid_creator_id in self.test_cases['invalid_student_ids']:
-            params = {
-                'filter[studentId]': student_id,
-                'filter[creatorId]': invalid_creator_id
-            }
-            self.get_response(params, 400, 'ErrorObject')
+        subtests.extend(self.get_invalid_param_subtests(
+            'filter by invalid creatorId',
+            student_id,
+            'filter[creatorId]',
+            self.test_cases['invalid_student_ids']
+        ))
+        return subtests
 
     def query_string_search(self, student_id, notes, endpoint='/notes'):
-        for note in notes:
-            start_idx = random.randint(0, len(note) - 1)
-            end_idx = random.randint(start_idx + 1, len(note))
-            q = note[start_idx:end_idx]
+        """Get the subtests of searching notes. Each subtest sends one
+        request
+
+        :returns: A list of (message, params, function) tuples for
+                  run_subtests
+        """
+
+        def check_string_search(note, q):
             params = {
                 'filter[studentId]': student_id,
                 'filter[note][fuzzy]': q
             }
             response = self.get_response(params)
             # Validating the search word requested exist in the notes received
-            self.assertGreater(len(response.json()['data']), 0)
+            self.assertGreater(len(self.get_json_content(response)['data']), 0)
             self.assertIn(
                 note,
                 list(map(
                     lambda x: x['attributes']['note'],
-                    response.json()['data']
+                    self.get_json_content(response)['data']
                 ))
             )
-            for resource in response.json()['data']:
+            for resource in self.iter_resources(response):
                 actual_note = resource['attributes']['note']
                 self.assertIn(q, actual_note)
 
+        subtests = []
+        for note in notes:
+            start_idx = random.randint(0, len(note) - 1)
+            end_idx = random.randint(start_idx + 1, len(note))
+            q = note[start_idx:end_idx]
+            subtests.append((
+                'filter by q',
+                {'student_id': student_id, 'q': q},
+                partial(check_string_search, note, q)
+            ))
+        return subtests
+
     def query_sort_fields(self, student_id, endpoint='/notes'):
+        """Get the subtests of sorting notes. Each subtest sends one request
+
+        :returns: A list of (message, params, function) tuples for
+                  run_subtests
+        """
+
         sort_fields = ['lastModified', 'source', 'permissions', 'contextType']
         # Add sort fields with '-' prefix to test descending sort
         sort_fields.extend(list(map(lambda x: f'-{x}', sort_fields)))
 
-        for sort_field in sort_fields:
+        def check_sort_field(sort_field):
             params = {'filter[studentId]': student_id, 'sort': sort_field}
-            data = self.get_response(params).json()['data']
+            data = self.get_json_content(self.get_response(params))['data']
             # Validating each sort_field
             if len(data) > 1:
                 test = (
@@ -209,14 +342,21 @@ class IntegrationTests(utils.UtilsTestCase):
                 elif sort_field == 'contextType':
                     self.check_context_type_sort(data, test)
 
+        subtests = [
+            ('test sort fields',
+             {'student_id': student_id, 'sort': sort_field},
+             partial(check_sort_field, sort_field))
+            for sort_field in sort_fields
+        ]
         # invalid sort field tests return 400
         invalid_sort_fields = [' ', 'lastmodified', 'random', 'contexttype']
-        for invalid_sort_field in invalid_sort_fields:
-            params = {
-                'filter[studentId]': student_id,
-                'sort': invalid_sort_field
-            }
-            self.get_response(params, 400, 'ErrorObject')
+        subtests.extend(self.get_invalid_param_subtests(
+            'test invalid sort fields',
+            student_id,
+            'sort',
+            invalid_sort_fields
+        ))
+        return subtests
 
     def check_time_sort(self, response, test):
         format = '%Y-%m-%dT%H:%M:%S.%f%z'
@@ -246,43 +386,61 @@ class IntegrationTests(utils.UtilsTestCase):
                 prev_element = current_element
 
     def query_source(self, student_id, sources):
-        for source in sources:
+        """Get the subtests of filtering by source. Each subtest sends one
+        request
+
+        :returns: A list of (message, params, function) tuples for
+                  run_subtests
+        """
+
+        def check_sources(expected_sources):
             params = {
                 'filter[studentId]': student_id,
-                'filter[source][oneOf]': source
+                'filter[source][oneOf]': ','.join(expected_sources)
             }
             response = self.get_response(params)
             # Validating the source requested is the same source
-            for resource in response.json()['data']:
+            for resource in self.iter_resources(response):
                 actual_source = resource['attributes']['source']
-                self.assertEqual(actual_source, source)
+                self.assertIn(actual_source, expected_sources)
+
+        subtests = [
+            ('filter by source',
+             {'student_id': student_id, 'source': source},
+             partial(check_sources, [source]))
+            for source in sources
+        ]
         # Check more than one source at a time
         if len(sources) > 1:
             num_sources = random.randint(2, len(sources))
             sources_sample = random.sample(sources, num_sources)
-            sources = ','.join(sources_sample)
-            params = {
-                'filter[studentId]': student_id,
-                'filter[source][oneOf]': sources
-            }
-            response = self.get_response(params)
-            for resource in response.json()['data']:
-                actual_source = resource['attributes']['source']
-                self.assertIn(actual_source, sources_sample)
+            subtests.append((
+                'filter by sources',
+                {'student_id': student_id, 'source': ','.join(sources_sample)},
+                partial(check_sources, sources_sample)
+            ))
+        return subtests
 
     def query_context_type(self, student_id, context_types, endpoint='/notes'):
-        for context_type in context_types:
+        """Get the subtests of filtering by contextType. Each subtest sends
+        one request
+
+        :returns: A list of (message, params, function) tuples for
+                  run_subtests
+        """
+
+        def check_context_types(expected_context_types):
             params = {
                 'filter[studentId]': student_id,
-                'filter[contextType][oneOf]': context_type
+                'filter[contextType][oneOf]': ','.join(expected_context_types)
             }
             response = self.get_response(params)
             # Validating the contextType requested is the same contextType
             # received
-            for resource in response.json()['data']:
+            for resource in self.iter_resources(response):
                 context = resource['attributes']['context']
                 actual_context_type = context['contextType']
-                self.assertEqual(actual_context_type, context_type)
+                self.assertIn(actual_context_type, expected_context_types)
 
         def powerset_list(iterable):
             """Get the powerset of an iterable as a list of lists.
@@ -298,22 +456,24 @@ class IntegrationTests(utils.UtilsTestCase):
             )
             return list(map(lambda x: list(x), tuples))
 
+        subtests = [
+            ('filter by contextType',
+             {'student_id': student_id, 'context_type': context_type},
+             partial(check_context_types, [context_type]))
+            for context_type in context_types
+        ]
         # Test subsets of context_types with length 2 or more
         subsets = list(x for x in powerset_list(context_types) if len(x) > 1)
         # Limit the number of subsets to 10
         if len(subsets) > 10:
             subsets = random.sample(subsets, 10)
-        for subset in subsets:
-            context_types = ','.join(subset)
-            params = {
-                'filter[studentId]': student_id,
-                'filter[contextType][oneOf]': context_types
-            }
-            response = self.get_response(params)
-            for resource in response.json()['data']:
-                context = resource['attributes']['context']
-                actual_context_type = context['contextType']
-                self.assertIn(actual_context_type, context_types)
+        subtests.extend(
+            ('filter by contextTypes',
+             {'student_id': student_id, 'context_type': ','.join(subset)},
+             partial(check_context_types, subset))
+            for subset in subsets
+        )
+        return subtests
 
 
 if __name__ == '__main__':
@@ -325,5 +485,16 @@ if __name__ == '__main__':
     else:
         logging.basicConfig(level=logging.INFO)
 
-    IntegrationTests.setup(arguments.config_path, arguments.openapi_path)
-    unittest.main(argv=argv)
+    if arguments.load:
+        sys.exit(load_test.main(arguments))
+    else:
+        IntegrationTests.setup(
+            arguments.config_path,
+            arguments.openapi_path,
+            arguments.workers,
+            arguments.openapi_cache_dir,
+            arguments.stream_json,
+            arguments.client,
+            arguments.http2
+        )
+        unittest.main(argv=argv)
@@ -0,0 +1,685 @@
+"""Load test mode of the integration test harness"""
+import asyncio
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import cycle
+import json
+import logging
+import math
+import random
+import threading
+import time
+
+import requests
+
+import clients
+import utils
+
+# A request that is replayed during a load test. The shape groups requests
+# that differ only in their parameter values, such as two student IDs
+LoadRequest = namedtuple(
+    'LoadRequest',
+    ['shape', 'endpoint', 'params', 'expected_status']
+)
+
+PERCENTILES = [50, 90, 95, 99]
+SORT_FIELDS = ['lastModified', 'source', 'permissions', 'contextType']
+# Errors that fail a single request of a load test instead of the whole run.
+# OAuth2Error is raised when no access token could be fetched, and OSError
+# covers connection errors that a client does not wrap in its own exceptions
+REQUEST_ERRORS = (clients.OAuth2Error, OSError)
+# Statuses of a comparison to a baseline that do not fail the load test
+PASSING_STATUSES = {'ok', 'too few samples', 'new', 'missing'}
+# Summary values that are saved in a baseline
+BASELINE_KEYS = (
+    ['requests', 'error_rate'] + [f'p{percent}' for percent in PERCENTILES]
+    + ['max']
+)
+
+
+def get_query_shape(endpoint_template, params, expected_status):
+    """Get the shape of a request, which names its endpoint, the names of
+    its query parameters and its expected status code
+
+    :param endpoint_template: endpoint with placeholders, such as /notes/{id}
+    :param params: query parameters
+    :param expected_status: expected HTTP status code
+    :returns: The shape, such as GET /notes?filter[studentId]&sort 200
+    """
+
+    query = '&'.join(sorted(params))
+    return (
+        f"GET {endpoint_template}{f'?{query}' if query else ''} "
+        f'{expected_status}'
+    )
+
+
+def build_requests(session, base_url, test_cases):
+    """Build the requests that are replayed from the configured test cases.
+    The notes of each valid student are fetched once, so that the filter
+    values that are requested exist.
+
+    :param session: session to fetch the notes of each student with
+    :param base_url: base URL of the API
+    :param test_cases: test cases from the configuration file
+    :returns: A list of LoadRequest
+    """
+
+    load_requests = []
+
+    def add_request(endpoint_template, endpoint, params, expected_status):
+        load_requests.append(LoadRequest(
+            get_query_shape(endpoint_template, params, expected_status),
+            endpoint,
+            params,
+            expected_status
+        ))
+
+    for note_id in test_cases['valid_note_ids']:
+        add_request('/notes/{id}', f'/notes/{note_id}', {}, 200)
+    for note_id in test_cases['invalid_note_ids']:
+        add_request('/notes/{id}', f'/notes/{note_id}', {}, 404)
+    for student_id in test_cases['invalid_student_ids']:
+        add_request(
+            '/notes',
+            '/notes',
+            {'filter[studentId]': student_id},
+            400
+        )
+
+    for student_id in test_cases['valid_student_ids']:
+        student_params = {'filter[studentId]': student_id}
+        add_request('/notes', '/notes', student_params, 200)
+        add_request(
+            '/notes',
+            '/notes',
+            {**student_params, 'page[size]': 2},
+            200
+        )
+        for sort_field in SORT_FIELDS + [f'-{x}' for x in SORT_FIELDS]:
+            add_request(
+                '/notes',
+                '/notes',
+                {**student_params, 'sort': sort_field},
+                200
+            )
+
+        response = session.get(f'{base_url}/notes', params=student_params)
+        if response.status_code != 200:
+            logging.warning(
+                f'Could not get notes of studentId {student_id}, '
+                f'received {response.status_code}'
+            )
+            continue
+
+        filters = set()
+        for resource in response.json()['data']:
+            attributes = resource['attributes']
+            filters.update([
+                ('filter[creatorId]', attributes['creatorId']),
+                ('filter[source][oneOf]', attributes['source'])
+            ])
+            note = attributes['note']
+            if note:
+                start_idx = random.randint(0, len(note) - 1)
+                filters.add(
+                    ('filter[note][fuzzy]', note[start_idx:start_idx + 8])
+                )
+            if attributes['context']:
+                filters.add((
+                    'filter[contextType][oneOf]',
+                    attributes['context']['contextType']
+                ))
+        for name, value in sorted(filters):
+            add_request(
+                '/notes',
+                '/notes',
+                {**student_params, name: value},
+                200
+            )
+
+    return load_requests
+
+
+def get_percentile(sorted_values, percent):
+    """Get a percentile of sorted values by the nearest-rank method
+
+    :param sorted_values: values in ascending order
+    :param percent: percentile to get, between 0 and 100
+    :returns: The percentile, or None if there are no values
+    """
+
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize_samples(samples, elapsed_seconds):
+    """Summarize the samples of a group of requests
+
+    :param samples: list of (latency in seconds, error) tuples. The latency
+                    is None for requests that received no response
+    :param elapsed_seconds: duration of the load test
+    :returns: A dictionary of the number of requests and errors, the error
+              rate, the throughput and latency percentiles in milliseconds
+    """
+
+    latencies = sorted(
+        latency * 1e3 for latency, _ in samples if latency is not None
+    )
+    errors = sum(1 for _, error in samples if error)
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0,
+        'throughput': len(samples) / elapsed_seconds,
+    }
+    for percent in PERCENTILES:
+        summary[f'p{percent}'] = get_percentile(latencies, percent)
+    summary['max'] = latencies[-1] if latencies else None
+    return summary
+
+
+def create_schedule(load_requests, duration, rate=None):
+    """Create the schedule of a load test, which hands out the requests to
+    send in turn with the time each is to be sent at
+
+    :param load_requests: list of LoadRequest to replay in turn
+    :param duration: seconds to send requests for
+    :param rate: requests per second to send, or None to send each request
+                 as soon as it is asked for (default: None)
+    :returns: A function that returns the next LoadRequest and the time to
+              send it at, and the time the load test ends at. Both times are
+              of time.perf_counter(). The function can be called from any
+              thread
+    """
+
+    lock = threading.Lock()
+    request_cycle = cycle(random.sample(load_requests, len(load_requests)))
+    start = time.perf_counter()
+    next_scheduled = start
+
+    def next_request():
+        nonlocal next_scheduled
+        with lock:
+            load_request = next(request_cycle)
+            if rate is None:
+                return load_request, time.perf_counter()
+            scheduled = next_scheduled
+            next_scheduled += 1 / rate
+            return load_request, scheduled
+
+    return next_request, start + duration
+
+
+def create_report(samples, elapsed_seconds, concurrency, rate):
+    """Create the report of a load test
+
+    :param samples: dictionary of request shapes and their samples
+    :param elapsed_seconds: duration of the load test
+    :param concurrency: number of requests that could be in flight at once
+    :param rate: requests per second that were sent, or None
+    :returns: A report with a summary of each request shape and of all
+              requests
+    """
+
+    return {
+        'duration_seconds': elapsed_seconds,
+        'concurrency': concurrency,
+        'rate': rate,
+        'shapes': {
+            shape: summarize_samples(samples[shape], elapsed_seconds)
+            for shape in sorted(samples)
+        },
+        'total': summarize_samples(
+            [sample for shape in samples for sample in samples[shape]],
+            elapsed_seconds
+        )
+    }
+
+
+def run_load_test(session, base_url, load_requests, duration, concurrency,
+                  rate=None):
+    """Replay requests for a duration from a pool of threads and measure
+    their latency
+
+    Without a rate, each worker sends its next request as soon as the
+    previous one completes. With a rate, requests are scheduled at fixed
+    intervals and their latency is measured from the time they were
+    scheduled, so that a slow server cannot hide its queueing delay by
+    holding back the workers.
+
+    :param session: session to send requests with
+    :param base_url: base URL of the API
+    :param load_requests: list of LoadRequest to replay in turn
+    :param duration: seconds to send requests for
+    :param concurrency: number of requests that may be in flight at once
+    :param rate: requests per second to send, or None to send as many as the
+                 workers can (default: None)
+    :returns: A report with a summary of each request shape and of all
+              requests
+    """
+
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    start = time.perf_counter()
+    next_request, deadline = create_schedule(load_requests, duration, rate)
+    request_errors = (requests.RequestException, *REQUEST_ERRORS)
+
+    def send_requests():
+        while True:
+            load_request, scheduled = next_request()
+            if scheduled >= deadline:
+                return
+            time.sleep(max(scheduled - time.perf_counter(), 0))
+            try:
+                response = session.get(
+                    f'{base_url}{load_request.endpoint}',
+                    params=load_request.params
+                )
+                latency = time.perf_counter() - scheduled
+                error = response.status_code != load_request.expected_status
+            except request_errors as error_object:
+                logging.debug(f'Request failed: {error_object}')
+                latency = None
+                error = True
+            with lock:
+                samples[load_request.shape].append((latency, error))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        workers = [executor.submit(send_requests) for _ in range(concurrency)]
+        for worker in workers:
+            worker.result()
+    elapsed_seconds = time.perf_counter() - start
+    return create_report(samples, elapsed_seconds, concurrency, rate)
+
+
+async def run_async_load_test(client, base_url, load_requests, duration,
+                              concurrency, rate=None):
+    """Replay requests for a duration from asyncio tasks and measure their
+    latency. Requests are scheduled as they are by run_load_test(), but
+    without a thread per request in flight.
+
+    :param client: httpx.AsyncClient to send requests with
+    :param base_url: base URL of the API
+    :param load_requests: list of LoadRequest to replay in turn
+    :param duration: seconds to send requests for
+    :param concurrency: number of requests that may be in flight at once
+    :param rate: requests per second to send, or None to send as many as the
+                 tasks can (default: None)
+    :returns: A report with a summary of each request shape and of all
+              requests
+    """
+
+    samples = defaultdict(list)
+    start = time.perf_counter()
+    next_request, deadline = create_schedule(load_requests, duration, rate)
+    request_errors = (clients.httpx.HTTPError, *REQUEST_ERRORS)
+
+    async def send_requests():
+        while True:
+            load_request, scheduled = next_request()
+            if scheduled >= deadline:
+                return
+            await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+            try:
+                response = await client.get(
+                    f'{base_url}{load_request.endpoint}',
+                    params=load_request.params
+                )
+                latency = time.perf_counter() - scheduled
+                error = response.status_code != load_request.expected_status
+            except request_errors as error_object:
+                logging.debug(f'Request failed: {error_object}')
+                latency = None
+                error = True
+            samples[load_request.shape].append((latency, error))
+
+    await asyncio.gather(*[send_requests() for _ in range(concurrency)])
+    elapsed_seconds = time.perf_counter() - start
+    return create_report(samples, elapsed_seconds, concurrency, rate)
+
+
+def format_milliseconds(value):
+    """Format milliseconds for a table
+
+    :param value: milliseconds, or None
+    :returns: The milliseconds with one decimal place, or '-' for None
+    """
+
+    return '-' if value is None else f'{value:.1f}'
+
+
+def format_error_rate(value):
+    """Format an error rate for a table
+
+    :param value: error rate between 0 and 1, or None
+    :returns: The error rate as a percentage, or '-' for None
+    """
+
+    return '-' if value is None else f'{value:.1%}'
+
+
+def format_table(rows):
+    """Format rows as a table with the first column aligned to the left and
+    the others to the right
+
+    :param rows: list of rows, the first of which is the header. Each row is
+                 a list of strings
+    :returns: The table as a string
+    """
+
+    widths = [
+        max(len(row[index]) for row in rows) for index in range(len(rows[0]))
+    ]
+    return '\n'.join(
+        '  '.join(
+            cell.ljust(width) if index == 0 else cell.rjust(width)
+            for index, (cell, width) in enumerate(zip(row, widths))
+        )
+        for row in rows
+    )
+
+
+def format_report(report):
+    """Format a load test report as a table
+
+    :param report: report returned by run_load_test()
+    :returns: The table as a string
+    """
+
+    header = (
+        ['shape', 'requests', 'req/s', 'error rate']
+        + [f'p{percent} ms' for percent in PERCENTILES]
+        + ['max ms']
+    )
+    rows = [header]
+    summaries = [*report['shapes'].items(), ('all', report['total'])]
+    for shape, summary in summaries:
+        rows.append(
+            [
+                shape,
+                str(summary['requests']),
+                f"{summary['throughput']:.1f}",
+                format_error_rate(summary['error_rate'])
+            ]
+            + [
+                format_milliseconds(summary[f'p{percent}'])
+                for percent in PERCENTILES
+            ]
+            + [format_milliseconds(summary['max'])]
+        )
+    return format_table(rows)
+
+
+def save_baseline(report, baseline_path):
+    """Save the latency distribution and error rate of each request shape
+    and of all requests of a load test as a baseline that later load tests
+    are compared against
+
+    :param report: report returned by run_load_test()
+    :param baseline_path: path to write the baseline to as JSON
+    """
+
+    def get_baseline_summary(summary):
+        return {key: summary[key] for key in BASELINE_KEYS}
+
+    baseline = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'concurrency': report['concurrency'],
+        'rate': report['rate'],
+        'shapes': {
+            shape: get_baseline_summary(summary)
+            for shape, summary in report['shapes'].items()
+        },
+        'total': get_baseline_summary(report['total'])
+    }
+    with open(baseline_path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=4)
+
+
+def compare_summary(expected, actual, percentile, tolerance,
+                    error_rate_tolerance, min_difference, min_samples):
+    """Compare the summary of a group of requests to its baseline. The
+    latency has regressed when its percentile exceeds the baseline by more
+    than the tolerance and by at least min_difference milliseconds, which
+    keeps fast shapes from failing on noise. There are more errors when the
+    error rate exceeds the baseline by more than error_rate_tolerance.
+
+    :param expected: summary saved in the baseline
+    :param actual: summary of the load test
+    :param percentile: percentile to compare, one of PERCENTILES
+    :param tolerance: allowed increase of the percentile as a fraction of the
+                      baseline, such as 0.2 for 20%
+    :param error_rate_tolerance: allowed increase of the error rate, such as
+                                 0.01 for 1 percentage point
+    :param min_difference: milliseconds an increase has to be for the
+                           latency to regress
+    :param min_samples: summaries with fewer samples in either run are not
+                        compared
+    :returns: The status, which is 'ok', 'too few samples', 'regressed',
+              'more errors' or 'regressed, more errors'
+    """
+
+    if min(expected['requests'], actual['requests']) < min_samples:
+        return 'too few samples'
+
+    key = f'p{percentile}'
+    problems = []
+    if (
+        expected[key] is not None
+        and actual[key] is not None
+        and actual[key] > expected[key] * (1 + tolerance)
+        and actual[key] - expected[key] >= min_difference
+    ):
+        problems.append('regressed')
+    # Baselines saved before error rates were compared may not have one
+    if (
+        actual['error_rate']
+        > expected.get('error_rate', 0) + error_rate_tolerance
+    ):
+        problems.append('more errors')
+    return ', '.join(problems) or 'ok'
+
+
+def compare_to_baseline(report, baseline, percentile, tolerance,
+                        error_rate_tolerance, min_difference, min_samples):
+    """Compare a percentile of the latency and the error rate of each request
+    shape and of all requests of a load test to a baseline
+
+    :param report: report returned by run_load_test()
+    :param baseline: baseline saved by save_baseline()
+    :param percentile: percentile to compare, one of PERCENTILES
+    :param tolerance: allowed increase of the percentile as a fraction of the
+                      baseline, such as 0.2 for 20%
+    :param error_rate_tolerance: allowed increase of the error rate, such as
+                                 0.01 for 1 percentage point
+    :param min_difference: milliseconds an increase has to be for the
+                           latency to regress
+    :param min_samples: shapes with fewer samples in either run are not
+                        compared
+    :returns: A list of (shape, baseline summary, summary, status) tuples,
+              where status is one returned by compare_summary(), 'new' or
+              'missing'. The summary of all requests is last, as 'all'
+    """
+
+    baseline_shapes = baseline['shapes']
+    shapes = report['shapes']
+    comparison = []
+    for shape in sorted(set(baseline_shapes) | set(shapes)):
+        if shape not in baseline_shapes:
+            comparison.append((shape, None, shapes[shape], 'new'))
+        elif shape not in shapes:
+            comparison.append(
+                (shape, baseline_shapes[shape], None, 'missing')
+            )
+        else:
+            comparison.append((
+                shape,
+                baseline_shapes[shape],
+                shapes[shape],
+                compare_summary(
+                    baseline_shapes[shape],
+                    shapes[shape],
+                    percentile,
+                    tolerance,
+                    error_rate_tolerance,
+                    min_difference,
+                    min_samples
+                )
+            ))
+
+    # Baselines saved before the total was saved do not have one
+    if 'total' in baseline:
+        comparison.append((
+            'all',
+            baseline['total'],
+            report['total'],
+            compare_summary(
+                baseline['total'],
+                report['total'],
+                percentile,
+                tolerance,
+                error_rate_tolerance,
+                min_difference,
+                min_samples
+            )
+        ))
+    return comparison
+
+
+def format_comparison(comparison, percentile):
+    """Format a comparison to a baseline as a table
+
+    :param comparison: comparison returned by compare_to_baseline()
+    :param percentile: percentile that was compared
+    :returns: The table as a string
+    """
+
+    key = f'p{percentile}'
+    rows = [[
+        'shape',
+        f'baseline {key} ms',
+        f'{key} ms',
+        'change',
+        'baseline error rate',
+        'error rate',
+        'status'
+    ]]
+    for shape, expected_summary, summary, status in comparison:
+        expected = expected_summary and expected_summary[key]
+        actual = summary and summary[key]
+        change = (
+            f'{actual / expected - 1:+.1%}' if expected and actual is not None
+            else '-'
+        )
+        expected_error_rate = (
+            expected_summary and expected_summary.get('error_rate')
+        )
+        error_rate = summary and summary['error_rate']
+        rows.append([
+            shape,
+            format_milliseconds(expected),
+            format_milliseconds(actual),
+            change,
+            format_error_rate(expected_error_rate),
+            format_error_rate(error_rate),
+            status
+        ])
+    return format_table(rows)
+
+
+def main(arguments):
+    """Run a load test from command-line arguments, print its report as a
+    table and optionally write it as JSON, save it as a baseline or compare
+    it to a baseline
+
+    :param arguments: parsed command-line arguments
+    :returns: 1 if the latency or error rate of a request shape regressed
+              compared to the baseline, otherwise 0
+    """
+
+    with open(arguments.config_path) as config_file:
+        config = json.load(config_file)
+    base_url = utils.setup_base_url(config)
+    session = utils.setup_session(
+        config,
+        arguments.workers,
+        arguments.client,
+        arguments.http2
+    )
+
+    try:
+        load_requests = build_requests(
+            session,
+            base_url,
+            config['test_cases']
+        )
+        logging.info(
+            f'Sending {len(load_requests)} requests in turn for '
+            f'{arguments.duration} second(s) from {arguments.workers} '
+            f'worker(s)'
+        )
+        load_test_arguments = (
+            base_url,
+            load_requests,
+            arguments.duration,
+            arguments.workers,
+            arguments.rate
+        )
+        if arguments.client == 'async':
+            report = session.run(
+                run_async_load_test(session.client, *load_test_arguments)
+            )
+        else:
+            report = run_load_test(session, *load_test_arguments)
+    finally:
+        session.close()
+
+    print(format_report(report))
+    if arguments.load_report_path:
+        with open(arguments.load_report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+    if arguments.save_baseline_path:
+        save_baseline(report, arguments.save_baseline_path)
+        logging.info(f'Saved baseline to {arguments.save_baseline_path}')
+    if not arguments.baseline_path:
+        return 0
+
+    with open(arguments.baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    if (
+        (baseline['concurrency'], baseline['rate'])
+        != (report['concurrency'], report['rate'])
+    ):
+        logging.warning(
+            f"The baseline was recorded with {baseline['concurrency']} "
+            f"worker(s) and a rate of {baseline['rate']}, latencies may not "
+            f'be comparable'
+        )
+    comparison = compare_to_baseline(
+        report,
+        baseline,
+        arguments.regression_percentile,
+        arguments.regression_tolerance,
+        arguments.regression_error_rate_tolerance,
+        arguments.regression_min_difference,
+        arguments.regression_min_samples
+    )
+    print()
+    print(format_comparison(comparison, arguments.regression_percentile))
+
+    regressed_shapes = [
+        shape for shape, _, _, status in comparison
+        if status not in PASSING_STATUSES
+    ]
+    if regressed_shapes:
+        logging.error(
+            f'The p{arguments.regression_percentile} latency or the error '
+            f'rate of {len(regressed_shapes)} request shape(s) regressed: '
+            f"{', '.join(regressed_shapes)}"
+        )
+        return 1
+    return 0
@@ -0,0 +1,231 @@
+"""Validators of OpenAPI schemas that are compiled once and reused for every
+response"""
+import logging
+import re
+
+import validators
+
+# Mapping of OpenAPI data types and python data types
+TYPES = {
+    'string': str,
+    'integer': int,
+    'int32': int,
+    'int64': int,
+    'float': (float, int),
+    'double': (float, int),
+    'number': (float, int),
+    'boolean': bool,
+    'array': list,
+    'object': dict
+}
+
+# Functions that validate attributes of a format that has no pattern
+FORMAT_CHECKS = {
+    'uri': validators.url,
+    'url': validators.url,
+    'email': validators.email
+}
+
+
+class FieldValidator:
+    """Expected type, pattern and format of a field, and the fields of its
+    items if it is an array of objects"""
+
+    __slots__ = ['expected_type', 'pattern', 'formatting', 'format_check',
+                 'items']
+
+    def __init__(self, expected_type, pattern, formatting, items):
+        self.expected_type = expected_type
+        self.pattern = None if pattern is None else re.compile(pattern)
+        self.formatting = formatting
+        # A pattern overrides any format validation
+        self.format_check = (
+            FORMAT_CHECKS.get(formatting) if pattern is None else None
+        )
+        self.items = items
+
+
+def get_reference_type(openapi, object_path):
+    """Get the OpenAPI data type of a referenced object, following nested
+    references
+
+    :param openapi: OpenAPI specification
+    :param object_path: reference, such as #/definitions/NoteId
+    :returns: The data type, or None if the object has none
+    """
+
+    visited_paths = set()
+    while object_path not in visited_paths:
+        visited_paths.add(object_path)
+        reference = openapi
+        for key in re.search('#/(.*)', object_path).group(1).split('/'):
+            reference = reference[key]
+
+        if 'format' in reference and reference['format'] in TYPES:
+            return reference['format']
+        if 'type' in reference:
+            return reference['type']
+        if '$ref' not in reference:
+            return None
+        object_path = reference['$ref']
+    return None
+
+
+def get_attribute_type(openapi, attribute):
+    """Map the OpenAPI data type of an attribute to a python data type
+
+    :param openapi: OpenAPI specification
+    :param attribute: attribute schema
+    :returns: The python data type. Attributes with no type can be of any
+              type
+    """
+
+    if 'properties' in attribute:
+        return dict
+    openapi_type = None
+    if 'format' in attribute and attribute['format'] in TYPES:
+        openapi_type = attribute['format']
+    elif 'type' in attribute:
+        openapi_type = attribute['type']
+    elif '$ref' in attribute:
+        openapi_type = get_reference_type(openapi, attribute['$ref'])
+
+    if not openapi_type:
+        logging.warning('OpenAPI property contains no type or properties')
+        return object
+    return TYPES[openapi_type]
+
+
+def compile_fields(openapi, properties):
+    """Compile the properties of a schema into field validators
+
+    :param openapi: OpenAPI specification
+    :param properties: properties of the schema
+    :returns: A dictionary of field names and FieldValidator
+    """
+
+    fields = {}
+    for field, attribute in properties.items():
+        expected_type = get_attribute_type(openapi, attribute)
+        items = None
+        if expected_type is list and 'properties' in attribute['items']:
+            items = compile_fields(openapi, attribute['items']['properties'])
+        fields[field] = FieldValidator(
+            expected_type,
+            attribute.get('pattern'),
+            attribute.get('format'),
+            items
+        )
+    return fields
+
+
+class SchemaValidator:
+    """Validator of the resources or errors of a response, compiled once from
+    an OpenAPI definition such as NoteResource or ErrorObject"""
+
+    def __init__(self, openapi, schema):
+        """
+        :param openapi: OpenAPI specification
+        :param schema: properties of the definition
+        """
+
+        # Resource definitions have a type and attributes. Error definitions
+        # are validated as they are
+        if 'attributes' in schema:
+            self.resource_type = schema['type']['enum'][0]
+            self.attribute_fields = compile_fields(
+                openapi,
+                schema['attributes']['properties']
+            )
+            self.error_fields = None
+        else:
+            self.resource_type = None
+            self.attribute_fields = None
+            self.error_fields = compile_fields(openapi, schema)
+
+    def validate_resources(self, test_case, resources, nullable_fields):
+        """Check that resources match the schema
+
+        :param test_case: test case to report failures to
+        :param resources: iterable of resources
+        :param nullable_fields: fields that may be null or empty
+        """
+
+        if self.attribute_fields is None:
+            test_case.fail('Schema is not a resource schema')
+        nullable_fields = frozenset(nullable_fields)
+        for resource in resources:
+            # Check resource type
+            test_case.assertEqual(resource['type'], self.resource_type)
+            self.check_fields(
+                test_case,
+                resource['attributes'],
+                self.attribute_fields,
+                nullable_fields
+            )
+
+    def validate_errors(self, test_case, errors, nullable_fields):
+        """Check that the errors of an error response match the schema
+
+        :param test_case: test case to report failures to
+        :param errors: errors of the response
+        :param nullable_fields: fields that may be null or empty
+        """
+
+        if self.error_fields is None:
+            test_case.fail('Schema is not an error schema')
+        test_case.assertIsInstance(errors, list)
+        nullable_fields = frozenset(nullable_fields)
+        for error in errors:
+            self.check_fields(
+                test_case,
+                error,
+                self.error_fields,
+                nullable_fields
+            )
+
+    def check_fields(self, test_case, actual_attributes, fields,
+                     nullable_fields):
+        """Check all attributes of an object against field validators
+
+        :param test_case: test case to report failures to
+        :param actual_attributes: attributes of the object
+        :param fields: dictionary of field names and FieldValidator
+        :param nullable_fields: fields that may be null or empty
+        """
+
+        for field, actual_value in actual_attributes.items():
+            field_validator = fields.get(field)
+            if field_validator is None:
+                test_case.fail(f"Unexpected field '{field}'")
+
+            # Check item schema if attribute is an array
+            if field_validator.items is not None:
+                for actual_item in actual_value:
+                    self.check_fields(
+                        test_case,
+                        actual_item,
+                        field_validator.items,
+                        nullable_fields
+                    )
+
+            if actual_value or field not in nullable_fields:
+                expected_type = field_validator.expected_type
+                if not isinstance(actual_value, expected_type):
+                    test_case.fail(
+                        f"Field '{field}': {actual_value!r} is not an "
+                        f'instance of {expected_type!r}'
+                    )
+
+                pattern = field_validator.pattern
+                if pattern is not None and not pattern.search(actual_value):
+                    test_case.fail(
+                        f"Field '{field}': regex didn't match: "
+                        f'{pattern.pattern!r} not found in {actual_value!r}'
+                    )
+                format_check = field_validator.format_check
+                if format_check is not None and not format_check(actual_value):
+                    test_case.fail(
+                        f"Field '{field}': {actual_value!r} is not a valid "
+                        f'{field_validator.formatting}'
+                    )
@@ -0,0 +1,159 @@
+"""Incremental parsing of JSON response bodies as they arrive, used with
+--stream-json"""
+import io
+
+# ijson is only needed to parse responses incrementally with --stream-json
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Bytes read from the connection at a time
+CHUNK_SIZE = 64 * 1024
+
+
+class ChunkReader(io.RawIOBase):
+    """Readable file object over an iterator of byte chunks, so that ijson
+    can read a body while it is being received"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = chunk
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+class StreamedDocument:
+    """JSON:API document that is parsed as its body arrives. The items of a
+    data list are parsed one at a time. Everything that has been parsed is
+    kept, so the body is read and parsed only once however many times the
+    document is read."""
+
+    def __init__(self, chunks):
+        """
+        :param chunks: iterator of the byte chunks of the body
+        """
+
+        self.events = ijson.parse(ChunkReader(chunks), use_float=True)
+        self.document = {}
+        self.resources = None
+        self.key = None
+
+    def parse_next_value(self):
+        """Parse the next item of a data list or the next top-level value,
+        whichever comes first
+
+        :returns: False if the end of the document was reached
+        :raises ValueError: if the body is not JSON
+        """
+
+        try:
+            return self.parse_events()
+        except ijson.JSONError as error:
+            raise ValueError(f'Response not in JSON format: {error}')
+
+    def parse_events(self):
+        """Parse events until the next item of a data list or the next
+        top-level value has been built
+
+        :returns: False if the end of the document was reached
+        """
+
+        builder = None
+        depth = 0
+        for prefix, event, value in self.events:
+            if builder is None:
+                if prefix == '':
+                    # Keys and the start and end of the document itself
+                    if event == 'map_key':
+                        self.key = value
+                    continue
+                if prefix == 'data' and event == 'start_array':
+                    self.resources = []
+                    self.document['data'] = self.resources
+                    continue
+                if prefix == 'data' and event == 'end_array':
+                    continue
+                builder = ijson.ObjectBuilder()
+
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+            if depth == 0:
+                if prefix == 'data.item':
+                    self.resources.append(builder.value)
+                else:
+                    self.document[self.key] = builder.value
+                return True
+        return False
+
+    def iter_resources(self):
+        """Iterate over the resources in the data of the document, parsing
+        them as they are needed
+
+        :returns: An iterator of resources
+        """
+
+        index = 0
+        while True:
+            if self.resources is not None:
+                while index < len(self.resources):
+                    yield self.resources[index]
+                    index += 1
+            elif 'data' in self.document:
+                # Data that is a single resource
+                yield self.document['data']
+                return
+            if not self.parse_next_value():
+                if self.resources is None and 'data' not in self.document:
+                    raise KeyError('data')
+                return
+
+    def get(self, key):
+        """Get a top-level value, parsing the document until it is found
+
+        :param key: top-level key
+        :returns: The value, or None if the document has no such key
+        """
+
+        while key not in self.document and self.parse_next_value():
+            pass
+        return self.document.get(key)
+
+    def get_document(self):
+        """Parse the rest of the document
+
+        :returns: The whole decoded document
+        """
+
+        while self.parse_next_value():
+            pass
+        return self.document
+
+
+def iter_chunks(session, response):
+    """Iterate over the body of a response that was requested with
+    stream=True, as it is received
+
+    :param session: session that sent the request
+    :param response: requests or httpx response
+    :returns: An iterator of byte chunks
+    """
+
+    if hasattr(session, 'iter_bytes'):
+        return session.iter_bytes(response)
+    return response.iter_content(chunk_size=CHUNK_SIZE)
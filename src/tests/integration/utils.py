@@ -1,15 +1,23 @@
 """Utility class and functions for integration testing"""
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
 import logging
+import os
 import re
 import sys
+import tempfile
 import textwrap
+import time
 import urllib
 import unittest
 
 import requests
-import validators
+
+import clients
+import schema
+import streaming
 
 
 def parse_arguments():
@@ -24,14 +32,131 @@ def parse_arguments():
     parser.add_argument(
         '--openapi',
         dest='openapi_path',
-        help='Path to yaml formatted OpenAPI specification',
-        required=True)
+        help='Path to yaml formatted OpenAPI specification. Not required '
+             'in load mode')
+    parser.add_argument(
+        '--openapi-cache',
+        dest='openapi_cache_dir',
+        help='Directory to cache the resolved OpenAPI specification in '
+             '(default: a directory in the temporary directory)',
+        default=os.path.join(
+            tempfile.gettempdir(),
+            'notes-api-integration-test'
+        ))
+    parser.add_argument(
+        '--no-openapi-cache',
+        dest='openapi_cache_dir',
+        help='Resolve the OpenAPI specification without caching it',
+        action='store_const',
+        const=None)
     parser.add_argument(
         '--debug',
         dest='debug',
         help='Enable debug logging mode',
         action='store_true')
+    parser.add_argument(
+        '--client',
+        dest='client',
+        help='HTTP client backend. async sends requests with an asyncio '
+             'httpx client and requires httpx (default: sync)',
+        choices=['sync', 'async'],
+        default='sync')
+    parser.add_argument(
+        '--http2',
+        dest='http2',
+        help='Negotiate HTTP/2 with the async client. Requires httpx[http2]',
+        action='store_true')
+    parser.add_argument(
+        '--stream-json',
+        dest='stream_json',
+        help='Parse response bodies as they are received and the '
+             'resources of list responses one at a time instead of '
+             'downloading and decoding whole responses. Requires ijson',
+        action='store_true')
+    parser.add_argument(
+        '--workers',
+        dest='workers',
+        help='Number of threads that independent requests are sent from',
+        type=int,
+        default=1)
+    parser.add_argument(
+        '--load',
+        dest='load',
+        help='Replay the test cases as a load test instead of running the '
+             'tests. Requests are sent from --workers threads',
+        action='store_true')
+    parser.add_argument(
+        '--duration',
+        dest='duration',
+        help='Seconds to send requests for in load mode (default: 60)',
+        type=float,
+        default=60)
+    parser.add_argument(
+        '--rate',
+        dest='rate',
+        help='Requests per second to send in load mode. By default, each '
+             'worker sends its next request as soon as the previous one '
+             'completes',
+        type=float)
+    parser.add_argument(
+        '--load-report',
+        dest='load_report_path',
+        help='Path to write the load test report to as JSON')
+    parser.add_argument(
+        '--save-baseline',
+        dest='save_baseline_path',
+        help='Path to save the latency of each request shape of the load '
+             'test to as a baseline')
+    parser.add_argument(
+        '--baseline',
+        dest='baseline_path',
+        help='Path to a baseline to compare the load test to. The run fails '
+             'if a request shape regressed')
+    parser.add_argument(
+        '--regression-percentile',
+        dest='regression_percentile',
+        help='Latency percentile that is compared to the baseline '
+             '(default: 95)',
+        type=int,
+        choices=[50, 90, 95, 99],
+        default=95)
+    parser.add_argument(
+        '--regression-tolerance',
+        dest='regression_tolerance',
+        help='Allowed increase of the percentile as a fraction of the '
+             'baseline (default: 0.2)',
+        type=float,
+        default=0.2)
+    parser.add_argument(
+        '--regression-error-rate-tolerance',
+        dest='regression_error_rate_tolerance',
+        help='Allowed increase of the error rate as a fraction of all '
+             'requests (default: 0.01)',
+        type=float,
+        default=0.01)
+    parser.add_argument(
+        '--regression-min-difference',
+        dest='regression_min_difference',
+        help='Milliseconds an increase has to be for a request shape to '
+             'regress (default: 10)',
+        type=float,
+        default=10)
+    parser.add_argument(
+        '--regression-min-samples',
+        dest='regression_min_samples',
+        help='Request shapes with fewer requests in the load test or the '
+             'baseline are not compared (default: 20)',
+        type=int,
+        default=20)
     arguments, unittest_args = parser.parse_known_args()
+    if not arguments.load and arguments.openapi_path is None:
+        parser.error('the following arguments are required: --openapi')
+    if arguments.stream_json and streaming.ijson is None:
+        parser.error('--stream-json requires ijson to be installed')
+    if arguments.client == 'async' and clients.httpx is None:
+        parser.error('--client async requires httpx to be installed')
+    if arguments.http2 and arguments.client != 'async':
+        parser.error('--http2 requires --client async')
     return arguments, sys.argv[:1] + unittest_args
 
 
@@ -42,29 +167,135 @@ def setup_base_url(config):
     return api['local_base_url'] if config['local_test'] else api['base_url']
 
 
-def setup_session(config):
-    """Setup request session from configuration file"""
-
-    session = requests.Session()
-
+def resolve_openapi(openapi_path):
+    """Parse, resolve and validate an OpenAPI specification
+
+    :param openapi_path: path to the yaml formatted specification
+    :returns: The resolved specification
+    """
+
+    # These imports are slow, so they are only made when the specification
+    # is not cached
+    import yaml
+    from prance import ResolvingParser
+
+    with open(openapi_path) as openapi_file:
+        openapi = yaml.load(openapi_file, Loader=yaml.SafeLoader)
+        if 'swagger' in openapi:
+            backend = 'flex'
+        elif 'openapi' in openapi:
+            backend = 'openapi-spec-validator'
+        else:
+            sys.exit('Error: could not determine openapi document version')
+
+    parser = ResolvingParser(openapi_path, backend=backend)
+    return parser.specification
+
+
+def load_openapi(openapi_path, cache_dir=None):
+    """Load the resolved OpenAPI specification from the cache, or resolve
+    it and cache it. Cached specifications are keyed by the SHA-256 hash of
+    the specification file, so a changed file is resolved again.
+
+    :param openapi_path: path to the yaml formatted specification
+    :param cache_dir: directory of the cache, or None to not use the cache
+                      (default: None)
+    :returns: The resolved specification
+    """
+
+    if cache_dir is None:
+        return resolve_openapi(openapi_path)
+
+    with open(openapi_path, 'rb') as openapi_file:
+        digest = hashlib.sha256(openapi_file.read()).hexdigest()
+    cache_path = os.path.join(cache_dir, f'{digest}.json')
+    try:
+        with open(cache_path) as cache_file:
+            openapi = json.load(cache_file)
+        logging.debug(
+            f'Loaded resolved OpenAPI specification from {cache_path}'
+        )
+        return openapi
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as error:
+        logging.warning(f'Ignoring unreadable OpenAPI cache file: {error}')
+
+    openapi = resolve_openapi(openapi_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first, so that concurrent runs never read
+        # a partially written cache file
+        fd, temporary_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as temporary_file:
+                json.dump(openapi, temporary_file, default=str)
+            os.replace(temporary_path, cache_path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+    except (OSError, TypeError, ValueError) as error:
+        logging.warning(f'Could not cache resolved OpenAPI specification: '
+                        f'{error}')
+    return openapi
+
+
+def setup_session(config, workers=1, client='sync', http2=False):
+    """Setup request session from configuration file
+
+    :param config: configuration
+    :param workers: number of threads that will share the session. The
+                    connection pool keeps one connection per thread
+                    (default: 1)
+    :param client: 'sync' for a requests session or 'async' for a session
+                   backed by an asyncio httpx client (default: 'sync')
+    :param http2: whether the async client negotiates HTTP/2 (default: False)
+    :returns: A session with authentication set up
+    """
+
+    auth = None
+    token_manager = None
+    verify = True
     if config['local_test']:
         basic_auth = config['auth']['basic_auth']
-        session.auth = (basic_auth['username'], basic_auth['password'])
-        session.verify = False
+        auth = (basic_auth['username'], basic_auth['password'])
+        verify = False
     else:
         oauth2 = config['auth']['oauth2']
-        data = {
-            'client_id': oauth2['client_id'],
-            'client_secret': oauth2['client_secret'],
-            'grant_type': 'client_credentials'
-        }
+        token_manager = clients.OAuth2TokenManager(
+            oauth2['token_api_url'],
+            oauth2['client_id'],
+            oauth2['client_secret']
+        )
+        # Fail early on invalid credentials
         try:
-            res = requests.post(url=oauth2['token_api_url'], data=data)
-            token = res.json()['access_token']
-        except KeyError:
+            token_manager.get_token()
+        except clients.OAuth2Error as error:
+            logging.debug(error)
             sys.exit('Error: invalid OAuth2 credentials')
-        session.headers = {'Authorization': f'Bearer {token}'}
 
+    max_connections = max(workers, requests.adapters.DEFAULT_POOLSIZE)
+    if client == 'async':
+        try:
+            return clients.AsyncSession(
+                auth=auth,
+                token_manager=token_manager,
+                verify=verify,
+                max_connections=max_connections,
+                http2=http2
+            )
+        except ImportError as error:
+            sys.exit(f'Error: {error}')
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=max_connections
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.auth = clients.OAuth2Auth(token_manager) if token_manager else auth
+    session.verify = verify
     return session
 
 
@@ -76,15 +307,145 @@ class UtilsTestCase(unittest.TestCase):
     session = None
     openapi = {}
     local_test = None
+    workers = 1
+    stream_json = False
+    # Compiled validators of resource schemas by resource name
+    schema_validators = {}
+
+    def run_subtests(self, subtests):
+        """Run independent subtests and report each failure as a subTest
+
+        When more than one worker is configured, the subtests run on a pool
+        of that many threads. Failures raised on worker threads are re-raised
+        on the main thread inside subTest, since unittest does not record
+        subTest outcomes from other threads safely.
+
+        :param subtests: iterable of (message, params, function) tuples. Each
+                         function takes no arguments and must not call
+                         subTest itself
+        :returns: A list with the return value of each function, or None for
+                  functions that failed
+        """
+
+        subtests = list(subtests)
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            if self.workers > 1:
+                runs = [
+                    executor.submit(function).result
+                    for _, _, function in subtests
+                ]
+            else:
+                runs = [function for _, _, function in subtests]
+
+            for (message, params, _), run in zip(subtests, runs):
+                result = None
+                with self.subTest(message, **params):
+                    result = run()
+                results.append(result)
+        return results
+
+    def get_streamed_document(self, response):
+        """Get the document of a response requested with --stream-json. It
+        is parsed as it is read, and only once per response"""
+
+        document = getattr(response, 'streamed_document', None)
+        if document is None:
+            document = streaming.StreamedDocument(
+                streaming.iter_chunks(self.session, response)
+            )
+            response.streamed_document = document
+        return document
+
+    def decode_json(self, response):
+        """Decode the JSON content of a response. The content is only
+        decoded once per response
+
+        :param response: response
+        :returns: The decoded content
+        :raises ValueError: if the content is not JSON
+        """
+
+        decoded_json = getattr(response, 'decoded_json', None)
+        if decoded_json is None:
+            if self.stream_json:
+                decoded_json = (
+                    self.get_streamed_document(response).get_document()
+                )
+            else:
+                decoded_json = response.json()
+            response.decoded_json = decoded_json
+        return decoded_json
 
     def get_json_content(self, response):
-        """Get response content in JSON format"""
+        """Get response content in JSON format. The content is only decoded
+        once per response"""
 
         try:
-            return response.json()
-        except json.decoder.JSONDecodeError:
+            return self.decode_json(response)
+        except ValueError:
             self.fail('Response not in JSON format')
 
+    def iter_resources(self, response):
+        """Iterate over the resources in the data of a response
+
+        With --stream-json, the body is parsed as it is received and the
+        resources of a list are parsed one at a time, so validation starts
+        before the whole body has arrived and the raw body is never held in
+        memory. Parsed resources are kept, so iterating again does not parse
+        the body again.
+
+        :param response: response whose data is a resource or list of
+                         resources
+        :returns: An iterator of resources
+        """
+
+        if self.stream_json:
+            document = self.get_streamed_document(response)
+            try:
+                yield from document.iter_resources()
+            except ValueError:
+                self.fail('Response not in JSON format')
+            return
+
+        resource_data = self.get_json_content(response)['data']
+        if isinstance(resource_data, list):
+            yield from resource_data
+        else:
+            yield resource_data
+
+    def get_self_link(self, response):
+        """Get the self link of a response. With --stream-json, the body is
+        only parsed up to the links
+
+        :param response: response
+        :returns: The self link, or None if the response has no links
+        """
+
+        if self.stream_json:
+            try:
+                links = self.get_streamed_document(response).get('links')
+            except ValueError:
+                self.fail('Response not in JSON format')
+            return (links or {}).get('self')
+        return self.get_json_content(response).get('links', {}).get('self')
+
+    def format_response_body(self, response):
+        """Pretty-print the body of a response for logs and failure messages
+
+        :param response: response
+        :returns: The indented JSON content, or the body as it is if it is not
+                  JSON
+        """
+
+        try:
+            return json.dumps(self.decode_json(response), indent=4)
+        except ValueError:
+            if self.stream_json:
+                # The part of a streamed body that was parsed is not kept
+                return '(streamed response body is not JSON)'
+            return response.text
+
     def get_resource_schema(self, resource):
         """Get resource schema from OpenAPI specification"""
 
@@ -105,179 +466,76 @@ class UtilsTestCase(unittest.TestCase):
         """
 
         requested_url = f'{self.base_url}{endpoint}'
-        response = self.session.get(requested_url, params=params)
+        requested_at = time.perf_counter()
+        response = self.session.get(
+            requested_url,
+            params=params,
+            stream=self.stream_json
+        )
+        # A streamed response is returned once its headers arrive, but httpx
+        # only sets elapsed once its body has been read
+        elapsed_seconds = (
+            time.perf_counter() - requested_at if self.stream_json
+            else response.elapsed.total_seconds()
+        )
         logging.debug(f'Sent request to {requested_url}, params = {params}')
         status_code = response.status_code
-        response_code_details = textwrap.dedent(f'''
-            Expected {expected_status_code}, recieved {status_code}
-            Response body:''')
-        response_body = json.dumps(response.json(), indent=4)
-        logging.debug(f'{response_code_details}\n{response_body})')
-        self.assertEqual(
-            status_code,
-            expected_status_code,
-            f'requested_url: {requested_url},\nresponse_body: {response_body}'
-        )
+        # Pretty-printing large bodies is slow, so it is only done when it is
+        # logged or the status code is unexpected
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            response_code_details = textwrap.dedent(f'''
+                Expected {expected_status_code}, recieved {status_code}
+                Response body:''')
+            logging.debug(
+                f'{response_code_details}\n'
+                f'{self.format_response_body(response)})'
+            )
+        if status_code != expected_status_code:
+            self.fail(
+                f'{status_code} != {expected_status_code} : '
+                f'requested_url: {requested_url},\n'
+                f'response_body: {self.format_response_body(response)}'
+            )
 
         # Response time should less then max_elapsed_seconds
-        elapsed_seconds = response.elapsed.total_seconds()
         logging.debug(f'Request took {elapsed_seconds} second(s)')
         self.assertLess(elapsed_seconds, max_elapsed_seconds)
 
         return response
 
-    def check_schema(self, response, schema, nullable_fields):
-        """Check the schema of response match OpenAPI specification"""
+    def get_schema_validator(self, resource):
+        """Get the validator of a resource schema, which is compiled from the
+        OpenAPI specification the first time it is needed"""
 
-        # Mapping of OpenAPI data types and python data types
-        types_dict = {
-            'string': str,
-            'integer': int,
-            'int32': int,
-            'int64': int,
-            'float': (float, int),
-            'double': (float, int),
-            'number': (float, int),
-            'boolean': bool,
-            'array': list,
-            'object': dict
-        }
-
-        # Helper function to get attributes of the schema
-        def __get_schema_attributes():
-            return schema['attributes']['properties']
-
-        # Validates returned attributes using pattern or format
-        def __validate_format(attribute, formatting, pattern):
-            # pattern validation overrides any format validaton
-            if pattern is not None:
-                self.assertRegex(attribute, pattern)
-            elif formatting in ['uri', 'url']:
-                self.assertTrue(validators.url(attribute))
-            elif formatting == 'email':
-                self.assertTrue(validators.email(attribute))
-
-        def __get_attribute_type(attribute):
-            """Helper function to map between OpenAPI data types and python
-            data types"""
-
-            if 'properties' in attribute:
-                return dict
-            if 'format' in attribute and attribute['format'] in types_dict:
-                openapi_type = attribute['format']
-            elif 'type' in attribute:
-                openapi_type = attribute['type']
-            elif '$ref' in attribute:
-                openapi_type = __get_reference_type(attribute['$ref'])
-
-            if not openapi_type:
-                logging.warning('OpenAPI property contains no type or'
-                                'properties')
-                return None
-            return types_dict[openapi_type]
-
-        def __get_reference_type(object_path, root_object_paths=None):
-            """Helper function to get type of referenced object"""
-
-            keys = re.split('/', re.search('#/(.*)', object_path).group(1))
-            reference = self.openapi
-            for key in keys:
-                reference = reference[key]
-
-            if 'format' in reference and reference['format'] in types_dict:
-                return reference['format']
-            if 'type' in reference:
-                return reference['type']
-            if '$ref' in reference:
-                nested_reference = reference['$ref']
-                # Avoid infinite recursion
-                if not root_object_paths:
-                    root_object_paths = [object_path]
-                if nested_reference not in root_object_paths:
-                    root_object_paths.append(nested_reference)
-                    return __get_reference_type(nested_reference,
-                                                root_object_paths)
-
-            return None
-
-        def __check_resource_schema(resource):
-            """Helper function to check resource object schema"""
-
-            # Check resource type
-            self.assertEqual(resource['type'], schema['type']['enum'][0])
-            # Check resource attributes
-            actual_attributes = resource['attributes']
-            expected_attributes = __get_schema_attributes()
-            __check_attributes_schema(actual_attributes, expected_attributes)
-
-        def __check_error_schema(error):
-            """Helper function to check error object schema"""
-
-            # Check error attributes
-            actual_attributes = error
-            expected_attributes = schema
-            __check_attributes_schema(actual_attributes, expected_attributes)
-
-        def __check_attributes_schema(actual_attributes, expected_attributes):
-            """Helper function to check through all attributes"""
-
-            for field, actual_value in actual_attributes.items():
-                self.assertIn(
-                    field,
-                    expected_attributes.keys(),
-                    f"Unexpected field '{field}'"
-                )
-                expected_attribute = expected_attributes[field]
-                expected_type = __get_attribute_type(expected_attribute)
-
-                # Check item schema if attribute is an array
-                if (
-                    expected_type is list
-                    and 'properties' in expected_attribute['items']
-                ):
-                    expected_item = (
-                        expected_attribute['items']['properties']
-                    )
-                    actual_items = actual_attributes[field]
-
-                    for actual_item in actual_items:
-                        __check_attributes_schema(actual_item, expected_item)
-
-                if (
-                    (actual_value and expected_type)
-                    or field not in nullable_fields
-                ):
-                    self.assertIsInstance(actual_value, expected_type)
-
-                    # Get attribute pattern and format, then validate
-                    pattern = (
-                        None if 'pattern' not in expected_attribute
-                        else expected_attribute['pattern']
-                    )
-                    formatting = (
-                        None if 'format' not in expected_attribute
-                        else expected_attribute['format']
-                    )
-                    if pattern is not None or formatting is not None:
-                        __validate_format(actual_value, formatting, pattern)
+        validator = self.schema_validators.get(resource)
+        if validator is None:
+            validator = schema.SchemaValidator(
+                self.openapi,
+                self.get_resource_schema(resource)
+            )
+            self.schema_validators[resource] = validator
+        return validator
 
+    def check_schema(self, response, resource, nullable_fields):
+        """Check the schema of response match OpenAPI specification"""
+
+        validator = self.get_schema_validator(resource)
         status_code = response.status_code
-        content = self.get_json_content(response)
 
         # Basic tests for successful/error response
         try:
             if status_code == 200:
-                resource_data = content['data']
-                if isinstance(resource_data, list):
-                    for resource in resource_data:
-                        __check_resource_schema(resource)
-                else:
-                    __check_resource_schema(resource_data)
+                validator.validate_resources(
+                    self,
+                    self.iter_resources(response),
+                    nullable_fields
+                )
             elif status_code >= 400:
-                errors_data = content['errors']
-                self.assertIsInstance(errors_data, list)
-                for error in errors_data:
-                    __check_error_schema(error)
+                validator.validate_errors(
+                    self,
+                    self.get_json_content(response)['errors'],
+                    nullable_fields
+                )
         except KeyError as error:
             self.fail(error)
 
@@ -325,13 +583,11 @@ class UtilsTestCase(unittest.TestCase):
         link"""
 
         nullable_fields = [] if nullable_fields is None else nullable_fields
-        schema = self.get_resource_schema(resource)
         response = self.make_request(endpoint, response_code,
                                      params=query_params)
 
-        self.check_schema(response, schema, nullable_fields)
-        response_json = response.json()
-        if 'links' in response_json:
-            self.check_url(response_json['links']['self'], endpoint,
-                           query_params)
+        self.check_schema(response, resource, nullable_fields)
+        self_link = self.get_self_link(response)
+        if self_link is not None:
+            self.check_url(self_link, endpoint, query_params)
         return response
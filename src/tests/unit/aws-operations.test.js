@@ -3,9 +3,13 @@ import chai from 'chai';
 import chaiExclude from 'chai-exclude';
 import chaiAsPromised from 'chai-as-promised';
 import config from 'config';
+import http from 'http';
+import https from 'https';
+import _ from 'lodash';
 import proxyquireModule from 'proxyquire';
 import sinon from 'sinon';
 import sinonChai from 'sinon-chai';
+import zlib from 'zlib';
 
 const proxyquire = proxyquireModule.noCallThru();
 
@@ -49,6 +53,35 @@ describe('Test aws-operations', () => {
     });
   };
 
+  describe('S3 client', () => {
+    it('Should keep connections alive and apply default timeouts and retries', () => {
+      createS3Stub({});
+      const [options] = AWS.S3.firstCall.args;
+      assert.instanceOf(options.httpOptions.agent, https.Agent);
+      assert.isTrue(options.httpOptions.agent.keepAlive);
+      assert.strictEqual(options.httpOptions.agent.maxSockets, 64);
+      assert.include(options.httpOptions, { connectTimeout: 1000, timeout: 10000 });
+      assert.strictEqual(options.maxRetries, 3);
+    });
+
+    it('Should apply configured connection pool, timeouts and retries', () => {
+      configGetStub.returns({
+        bucket: testBucket,
+        endpoint: 'http://localhost:9000',
+        connectionPool: { maxSockets: 8 },
+        httpOptions: { timeout: 2000 },
+        maxRetries: 1,
+      });
+      createS3Stub({});
+      const [options] = AWS.S3.firstCall.args;
+      assert.instanceOf(options.httpOptions.agent, http.Agent);
+      assert.notInstanceOf(options.httpOptions.agent, https.Agent);
+      assert.strictEqual(options.httpOptions.agent.maxSockets, 8);
+      assert.include(options.httpOptions, { connectTimeout: 1000, timeout: 2000 });
+      assert.strictEqual(options.maxRetries, 1);
+    });
+  });
+
   describe('bucketExists', () => {
     it('Should resolve as true if headBucket promise resolves', async () => {
       const promiseStub = sinon.stub().resolves({});
@@ -184,6 +217,92 @@ describe('Test aws-operations', () => {
     });
   });
 
+  describe('forEachPage', () => {
+    it('Should follow continuation tokens until the listing is not truncated', async () => {
+      const pages = [
+        { Contents: [{ Key: 'a' }], IsTruncated: true, NextContinuationToken: 'token-1' },
+        { Contents: [{ Key: 'b' }], IsTruncated: true, NextContinuationToken: 'token-2' },
+        { Contents: [{ Key: 'c' }], IsTruncated: false },
+      ];
+      const promiseStub = sinon.stub();
+      _.forEach(pages, (page, index) => promiseStub.onCall(index).resolves(page));
+      const listObjectsV2Stub = getS3MethodStub(promiseStub);
+      createS3Stub({ listObjectsV2: listObjectsV2Stub });
+      const onPageStub = sinon.stub().resolves();
+      await awsOperations.forEachPage({ Prefix: 'prefix/' }, onPageStub);
+
+      listObjectsV2Stub.should.have.been.calledThrice;
+      listObjectsV2Stub.secondCall.should.have.been.calledWithMatch({
+        Prefix: 'prefix/',
+        ContinuationToken: 'token-1',
+      });
+      listObjectsV2Stub.thirdCall.should.have.been.calledWithMatch({
+        ContinuationToken: 'token-2',
+      });
+      assert.deepEqual(_.map(onPageStub.args, ([page]) => page), pages);
+    });
+
+    it('Should reject when processing a page rejects', async () => {
+      const promiseStub = sinon.stub();
+      promiseStub.onFirstCall().resolves({ Contents: [], IsTruncated: true });
+      promiseStub.onSecondCall().resolves({ Contents: [], IsTruncated: false });
+      createS3Stub({ listObjectsV2: getS3MethodStub(promiseStub) });
+      const onPageStub = sinon.stub().rejects(new Error('page failed'));
+      const result = awsOperations.forEachPage({}, onPageStub);
+      await result.should.be.rejectedWith('page failed');
+    });
+  });
+
+  describe('forEachObject', () => {
+    it('Should call iteratee on every object with bounded concurrency', async () => {
+      const keys = _.map(_.range(10), (it) => `key-${it}`);
+      const promiseStub = sinon.stub();
+      promiseStub.onFirstCall().resolves({
+        Contents: _.map(keys.slice(0, 6), (Key) => ({ Key })),
+        IsTruncated: true,
+        NextContinuationToken: 'token',
+      });
+      promiseStub.onSecondCall().resolves({
+        Contents: _.map(keys.slice(6), (Key) => ({ Key })),
+        IsTruncated: false,
+      });
+      createS3Stub({ listObjectsV2: getS3MethodStub(promiseStub) });
+
+      const visitedKeys = [];
+      let running = 0;
+      let maxRunning = 0;
+      await awsOperations.forEachObject({}, async ({ Key }) => {
+        running += 1;
+        maxRunning = Math.max(maxRunning, running);
+        await new Promise((resolve) => setImmediate(resolve));
+        visitedKeys.push(Key);
+        running -= 1;
+      }, 2);
+      assert.sameMembers(visitedKeys, keys);
+      assert.isAtMost(maxRunning, 2);
+    });
+  });
+
+  describe('forEachListedObject', () => {
+    it('Should call iteratee on every listed object with bounded concurrency', async () => {
+      const objects = _.map(_.range(10), (it) => ({ Key: `key-${it}` }));
+      createS3Stub({});
+
+      const visitedKeys = [];
+      let running = 0;
+      let maxRunning = 0;
+      await awsOperations.forEachListedObject(objects, async ({ Key }) => {
+        running += 1;
+        maxRunning = Math.max(maxRunning, running);
+        await new Promise((resolve) => setImmediate(resolve));
+        visitedKeys.push(Key);
+        running -= 1;
+      }, 3);
+      assert.sameMembers(visitedKeys, _.map(objects, 'Key'));
+      assert.equal(maxRunning, 3);
+    });
+  });
+
   describe('getObject', () => {
     it('Should resolve when getObject promise resolves', async () => {
       const testKey = 'test-key';
@@ -207,6 +326,162 @@ describe('Test aws-operations', () => {
     });
   });
 
+  describe('getJsonObject', () => {
+    const testKey = 'test-key';
+    const testBody = { testBodyKey: 'testBodyValue' };
+
+    /**
+     * Get a get-object response for a JSON body
+     *
+     * @param {object} body The body of the object
+     * @param {string} eTag The ETag of the object
+     * @returns {object} The get-object response
+     */
+    const getObjectResponse = (body, eTag) => ({
+      Body: Buffer.from(JSON.stringify(body)),
+      ETag: eTag,
+    });
+
+    it('Should parse gzipped and pretty-printed objects', async () => {
+      const promiseStub = sinon.stub();
+      promiseStub.onFirstCall().resolves({
+        Body: zlib.gzipSync(JSON.stringify(testBody)),
+        ContentEncoding: 'gzip',
+        ETag: '"gzipped"',
+      });
+      promiseStub.onSecondCall().resolves({
+        Body: Buffer.from(JSON.stringify(testBody, null, 2)),
+        ETag: '"pretty"',
+      });
+      createS3Stub({ getObject: getS3MethodStub(promiseStub) });
+      assert.deepEqual((await awsOperations.getJsonObject('gzipped-key')).body, testBody);
+      assert.deepEqual((await awsOperations.getJsonObject('pretty-key')).body, testBody);
+    });
+
+    it('Should parse the object and serve it from the cache while it is fresh', async () => {
+      const promiseStub = sinon.stub().resolves(getObjectResponse(testBody, '"etag"'));
+      const getObjectStub = getS3MethodStub(promiseStub);
+      createS3Stub({ getObject: getObjectStub });
+
+      const firstResult = await awsOperations.getJsonObject(testKey);
+      assert.deepEqual(firstResult.body, testBody);
+      assert.equal(firstResult.eTag, '"etag"');
+      // Modifying a result must not modify the cached object
+      firstResult.body.testBodyKey = 'modified';
+
+      const secondResult = await awsOperations.getJsonObject(testKey);
+      assert.deepEqual(secondResult.body, testBody);
+      getObjectStub.should.have.been.calledOnce;
+      assert.include(awsOperations.getCacheStats(), { hits: 1, misses: 1, revalidations: 0 });
+    });
+
+    it('Should revalidate the cached object with its ETag', async () => {
+      const promiseStub = sinon.stub();
+      promiseStub.onFirstCall().resolves(getObjectResponse(testBody, '"etag"'));
+      promiseStub.onSecondCall().rejects({ code: 'NotModified' });
+      const getObjectStub = getS3MethodStub(promiseStub);
+      createS3Stub({ getObject: getObjectStub });
+
+      await awsOperations.getJsonObject(testKey);
+      const result = await awsOperations.getJsonObject(testKey, { revalidate: true });
+      assert.deepEqual(result.body, testBody);
+      getObjectStub.secondCall.should.have.been.calledWithMatch({
+        Key: testKey,
+        IfNoneMatch: '"etag"',
+      });
+      assert.include(awsOperations.getCacheStats(), { hits: 0, misses: 1, revalidations: 1 });
+    });
+
+    it('Should resolve undefined and drop the cached object when it was deleted', async () => {
+      const promiseStub = sinon.stub();
+      promiseStub.onFirstCall().resolves(getObjectResponse(testBody, '"etag"'));
+      promiseStub.onSecondCall().rejects({ code: 'NoSuchKey' });
+      createS3Stub({ getObject: getS3MethodStub(promiseStub) });
+
+      await awsOperations.getJsonObject(testKey);
+      const result = awsOperations.getJsonObject(testKey, { revalidate: true });
+      await result.should.eventually.be.fulfilled.and.equal(undefined);
+      assert.equal(awsOperations.getCacheStats().size, 0);
+    });
+
+    it('Should reject when getObject promise rejects with unexpected error', async () => {
+      const promiseStub = sinon.stub().rejects({ code: 'other' });
+      createS3Stub({ getObject: getS3MethodStub(promiseStub) });
+      const result = awsOperations.getJsonObject(testKey);
+      await result.should.be.rejected;
+    });
+
+    it('Should serve objects written by putObject from the cache', async () => {
+      const putObjectStub = getS3MethodStub(sinon.stub().resolves({ ETag: '"etag"' }));
+      const getObjectStub = getS3MethodStub(sinon.stub().resolves());
+      createS3Stub({ putObject: putObjectStub, getObject: getObjectStub });
+
+      await awsOperations.putObject(testBody, testKey);
+      const result = await awsOperations.getJsonObject(testKey);
+      assert.deepEqual(result.body, testBody);
+      assert.equal(result.eTag, '"etag"');
+      getObjectStub.should.not.have.been.called;
+    });
+
+    it('Should not serve objects removed by deleteObject from the cache', async () => {
+      const putObjectStub = getS3MethodStub(sinon.stub().resolves({ ETag: '"etag"' }));
+      const deleteObjectStub = getS3MethodStub(sinon.stub().resolves({}));
+      const getObjectStub = getS3MethodStub(sinon.stub().rejects({ code: 'NoSuchKey' }));
+      createS3Stub({
+        putObject: putObjectStub,
+        deleteObject: deleteObjectStub,
+        getObject: getObjectStub,
+      });
+
+      await awsOperations.putObject(testBody, testKey);
+      await awsOperations.deleteObject(testKey);
+      const result = awsOperations.getJsonObject(testKey);
+      await result.should.eventually.be.fulfilled.and.equal(undefined);
+      getObjectStub.should.have.been.calledOnce;
+    });
+  });
+
+  describe('getJsonObjectETag', () => {
+    const testKey = 'test-key';
+
+    it('Should resolve the ETag of a fresh cached object without a request', async () => {
+      const putObjectStub = getS3MethodStub(sinon.stub().resolves({ ETag: '"etag"' }));
+      const headObjectStub = getS3MethodStub(sinon.stub().resolves());
+      createS3Stub({ putObject: putObjectStub, headObject: headObjectStub });
+
+      await awsOperations.putObject({}, testKey);
+      const result = awsOperations.getJsonObjectETag(testKey);
+      await result.should.eventually.be.fulfilled.and.equal('"etag"');
+      headObjectStub.should.not.have.been.called;
+    });
+
+    it('Should request the ETag of a fresh cached object when revalidate is set', async () => {
+      const putObjectStub = getS3MethodStub(sinon.stub().resolves({ ETag: '"etag"' }));
+      const headObjectStub = getS3MethodStub(sinon.stub().resolves({ ETag: '"new-etag"' }));
+      createS3Stub({ putObject: putObjectStub, headObject: headObjectStub });
+
+      await awsOperations.putObject({}, testKey);
+      const result = awsOperations.getJsonObjectETag(testKey, { revalidate: true });
+      await result.should.eventually.be.fulfilled.and.equal('"new-etag"');
+      headObjectStub.should.have.been.calledOnce;
+    });
+
+    it('Should resolve the ETag from headObject when the object is not cached', async () => {
+      const headObjectStub = getS3MethodStub(sinon.stub().resolves({ ETag: '"etag"' }));
+      createS3Stub({ headObject: headObjectStub });
+
+      const result = awsOperations.getJsonObjectETag(testKey);
+      await result.should.eventually.be.fulfilled.and.equal('"etag"');
+      headObjectStub.should.have.been.calledWithMatch({ Key: testKey });
+    });
+
+    it('Should resolve undefined when headObject promise rejects with NotFound error', async () => {
+      createS3Stub({ headObject: getS3MethodStub(sinon.stub().rejects({ code: 'NotFound' })) });
+      const result = awsOperations.getJsonObjectETag(testKey);
+      await result.should.eventually.be.fulfilled.and.equal(undefined);
+    });
+  });
+
   describe('putDir', () => {
     it('Should resolve when putObject promise resolves', async () => {
       const testKey = 'dir/';
@@ -266,6 +541,17 @@ describe('Test aws-operations', () => {
       const result = awsOperations.putObject({}, 'test-key');
       result.should.be.rejected;
     });
+
+    it('Should store minified JSON compressed with gzip if gzipObjects is set', async () => {
+      configGetStub.returns({ bucket: testBucket, gzipObjects: true });
+      const testObject = { testObjectKey: 'testObjectValue' };
+      const putObjectStub = getS3MethodStub(sinon.stub().resolves({}));
+      createS3Stub({ putObject: putObjectStub });
+      await awsOperations.putObject(testObject, 'test-key');
+      const [{ Body: body, ContentEncoding: contentEncoding }] = putObjectStub.args[0];
+      assert.strictEqual(contentEncoding, 'gzip');
+      assert.strictEqual(zlib.gunzipSync(body).toString('utf8'), JSON.stringify(testObject));
+    });
   });
 
   describe('updateMetadata', () => {
@@ -0,0 +1,98 @@
+import { assert } from 'chai';
+import express from 'express';
+import http from 'http';
+import proxyquire from 'proxyquire';
+import sinon from 'sinon';
+import zlib from 'zlib';
+
+describe('Test compression', () => {
+  let server;
+  const largeBody = { data: 'x'.repeat(2048) };
+  const smallBody = { data: 'x' };
+
+  before((done) => {
+    const { compression } = proxyquire('middlewares/compression', {
+      config: { get: sinon.stub().withArgs('server').returns({ compressionThreshold: 1024 }) },
+    });
+    const app = express();
+    app.use(compression);
+    app.get('/large', (req, res) => res.set('ETag', '"large"').send(largeBody));
+    app.get('/small', (req, res) => res.send(smallBody));
+    app.get('/generated', (req, res) => res.send(largeBody));
+    server = app.listen(0, done);
+  });
+
+  after((done) => server.close(done));
+
+  /**
+   * Get a path from the test server
+   *
+   * @param {string} path Path to get
+   * @param {string} acceptEncoding Value of the Accept-Encoding header
+   * @param {object} otherHeaders Other request headers
+   * @returns {Promise} Promise object represents the response status, headers and raw body
+   */
+  const get = (path, acceptEncoding, otherHeaders = {}) => new Promise((resolve, reject) => {
+    const headers = acceptEncoding
+      ? { ...otherHeaders, 'Accept-Encoding': acceptEncoding }
+      : otherHeaders;
+    http.get({ port: server.address().port, path, headers }, (res) => {
+      const chunks = [];
+      res.on('data', (chunk) => chunks.push(chunk));
+      res.on('end', () => resolve({
+        status: res.statusCode,
+        headers: res.headers,
+        body: Buffer.concat(chunks),
+      }));
+    }).on('error', reject);
+  });
+
+  it('compresses large responses with gzip', async () => {
+    const { headers, body } = await get('/large', 'gzip, deflate');
+    assert.strictEqual(headers['content-encoding'], 'gzip');
+    assert.strictEqual(headers.vary, 'Accept-Encoding');
+    assert.strictEqual(headers.etag, '"large-gzip"');
+    assert.strictEqual(Number(headers['content-length']), body.length);
+    assert.deepEqual(JSON.parse(zlib.gunzipSync(body)), largeBody);
+  });
+
+  it('prefers brotli when it is supported', async function testBrotli() {
+    if (!zlib.brotliDecompressSync) {
+      this.skip();
+    }
+    const { headers, body } = await get('/large', 'gzip, br');
+    assert.strictEqual(headers['content-encoding'], 'br');
+    assert.strictEqual(headers.etag, '"large-br"');
+    assert.deepEqual(JSON.parse(zlib.brotliDecompressSync(body)), largeBody);
+  });
+
+  it('does not compress when no content coding is accepted', async () => {
+    const { headers, body } = await get('/large');
+    assert.isUndefined(headers['content-encoding']);
+    assert.strictEqual(headers.etag, '"large"');
+    assert.strictEqual(headers.vary, 'Accept-Encoding');
+    assert.deepEqual(JSON.parse(body), largeBody);
+  });
+
+  it('does not compress small responses', async () => {
+    const { headers, body } = await get('/small', 'gzip');
+    assert.isUndefined(headers['content-encoding']);
+    assert.deepEqual(JSON.parse(body), smallBody);
+  });
+
+  it('answers If-None-Match with the ETag of a compressed response with 304', async () => {
+    const { status, headers, body } = await get('/large', 'gzip', {
+      'If-None-Match': '"large-gzip"',
+    });
+    assert.strictEqual(status, 304);
+    assert.strictEqual(headers.etag, '"large-gzip"');
+    assert.lengthOf(body, 0);
+  });
+
+  it('answers 304 for ETags that express generates', async () => {
+    const { headers } = await get('/generated', 'gzip');
+    assert.match(headers.etag, /-gzip"$/);
+    const { status } = await get('/generated', 'gzip', { 'If-None-Match': headers.etag });
+    assert.strictEqual(status, 304);
+  });
+});
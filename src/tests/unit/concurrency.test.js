@@ -0,0 +1,77 @@
+import { assert } from 'chai';
+import _ from 'lodash';
+
+import { createKeyedQueue, createLimiter } from 'utils/concurrency';
+
+/**
+ * Create a promise that resolves after a delay
+ *
+ * @param {number} ms Delay in milliseconds
+ * @returns {Promise} Promise that resolves after the delay
+ */
+const delay = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+describe('Test concurrency', () => {
+  describe('createLimiter', () => {
+    it('never runs more tasks at once than the concurrency', async () => {
+      const limit = createLimiter(3);
+      let running = 0;
+      let maxRunning = 0;
+      await Promise.all(_.map(_.range(20), (it) => limit(async () => {
+        running += 1;
+        maxRunning = Math.max(maxRunning, running);
+        await delay(it % 4);
+        running -= 1;
+      })));
+      assert.equal(maxRunning, 3);
+    });
+
+    it('resolves with the result of each task', async () => {
+      const limit = createLimiter(2);
+      const results = await Promise.all(_.map(_.range(5), (it) => limit(async () => it * 2)));
+      assert.deepEqual(results, [0, 2, 4, 6, 8]);
+    });
+
+    it('rejects with the error of a failed task and keeps running the others', async () => {
+      const limit = createLimiter(1);
+      const failedTask = limit(async () => { throw new Error('task failed'); });
+      const nextTask = limit(async () => 'done');
+      await failedTask.then(() => assert.fail(), (err) => assert.equal(err.message, 'task failed'));
+      assert.equal(await nextTask, 'done');
+    });
+  });
+
+  describe('createKeyedQueue', () => {
+    it('runs tasks with the same key one at a time in order', async () => {
+      const enqueue = createKeyedQueue();
+      const events = [];
+      await Promise.all(_.map(_.range(3), (it) => enqueue('key', async () => {
+        events.push(`start ${it}`);
+        await delay(3 - it);
+        events.push(`end ${it}`);
+      })));
+      assert.deepEqual(events, ['start 0', 'end 0', 'start 1', 'end 1', 'start 2', 'end 2']);
+    });
+
+    it('runs tasks with different keys concurrently', async () => {
+      const enqueue = createKeyedQueue();
+      let running = 0;
+      let maxRunning = 0;
+      await Promise.all(_.map(['a', 'b', 'c'], (key) => enqueue(key, async () => {
+        running += 1;
+        maxRunning = Math.max(maxRunning, running);
+        await delay(1);
+        running -= 1;
+      })));
+      assert.equal(maxRunning, 3);
+    });
+
+    it('keeps running queued tasks after a task fails', async () => {
+      const enqueue = createKeyedQueue();
+      const failedTask = enqueue('key', async () => { throw new Error('task failed'); });
+      const nextTask = enqueue('key', async () => 'done');
+      await failedTask.then(() => assert.fail(), (err) => assert.equal(err.message, 'task failed'));
+      assert.equal(await nextTask, 'done');
+    });
+  });
+});
@@ -0,0 +1,81 @@
+import { assert } from 'chai';
+
+import {
+  addContentCoding,
+  isFresh,
+  matchesIfMatch,
+  matchesIfNoneMatch,
+} from 'utils/conditional-requests';
+
+describe('Test conditional-requests', () => {
+  describe('matchesIfMatch', () => {
+    it('matches the current ETag in a list of entity tags', () => {
+      assert.isTrue(matchesIfMatch('"abc"', '"abc"'));
+      assert.isTrue(matchesIfMatch('"xyz", "abc"', '"abc"'));
+      assert.isFalse(matchesIfMatch('"xyz"', '"abc"'));
+    });
+
+    it('matches any ETag with a wildcard', () => {
+      assert.isTrue(matchesIfMatch('*', '"abc"'));
+    });
+
+    it('never matches a weak entity tag', () => {
+      assert.isFalse(matchesIfMatch('W/"abc"', '"abc"'));
+      assert.isFalse(matchesIfMatch('W/"abc-gzip"', '"abc"'));
+    });
+
+    it('matches the ETag of a compressed representation', () => {
+      assert.isTrue(matchesIfMatch('"abc-gzip"', '"abc"'));
+      assert.isTrue(matchesIfMatch('"xyz", "abc-br"', '"abc"'));
+      assert.isFalse(matchesIfMatch('"abc-deflate"', '"abc"'));
+    });
+  });
+
+  describe('matchesIfNoneMatch', () => {
+    it('compares entity tags weakly', () => {
+      assert.isTrue(matchesIfNoneMatch('"abc"', '"abc"'));
+      assert.isTrue(matchesIfNoneMatch('W/"abc"', '"abc"'));
+      assert.isTrue(matchesIfNoneMatch('"abc"', 'W/"abc"'));
+      assert.isFalse(matchesIfNoneMatch('"xyz"', '"abc"'));
+    });
+
+    it('matches the ETag of a compressed representation', () => {
+      assert.isTrue(matchesIfNoneMatch('"abc-gzip"', '"abc"'));
+      assert.isTrue(matchesIfNoneMatch('"xyz", W/"abc-br"', '"abc"'));
+    });
+
+    it('matches any ETag with a wildcard', () => {
+      assert.isTrue(matchesIfNoneMatch('*', '"abc"'));
+    });
+  });
+
+  describe('isFresh', () => {
+    /**
+     * Create a request with the given headers
+     *
+     * @param {object} headers Request headers keyed by lower case name
+     * @returns {object} Object that stands in for the request
+     */
+    const createRequest = (headers) => ({ get: (name) => headers[name.toLowerCase()] });
+
+    it('is fresh if If-None-Match matches', () => {
+      assert.isTrue(isFresh(createRequest({ 'if-none-match': '"abc-gzip"' }), '"abc"'));
+      assert.isFalse(isFresh(createRequest({ 'if-none-match': '"xyz"' }), '"abc"'));
+    });
+
+    it('is not fresh without If-None-Match or with Cache-Control: no-cache', () => {
+      assert.isFalse(isFresh(createRequest({}), '"abc"'));
+      assert.isFalse(isFresh(
+        createRequest({ 'if-none-match': '"abc"', 'cache-control': 'no-cache' }),
+        '"abc"',
+      ));
+    });
+  });
+
+  describe('addContentCoding', () => {
+    it('appends the content coding to strong and weak ETags', () => {
+      assert.strictEqual(addContentCoding('"abc"', 'gzip'), '"abc-gzip"');
+      assert.strictEqual(addContentCoding('W/"abc"', 'br'), 'W/"abc-br"');
+    });
+  });
+});
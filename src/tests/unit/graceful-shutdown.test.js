@@ -0,0 +1,62 @@
+import { assert } from 'chai';
+import proxyquire from 'proxyquire';
+import sinon from 'sinon';
+
+describe('Test graceful-shutdown', () => {
+  let gracefulShutdown;
+  let signalHandlers;
+  let exitStub;
+
+  beforeEach(() => {
+    gracefulShutdown = proxyquire('utils/graceful-shutdown', {
+      './logger': { logger: { info: sinon.stub(), error: sinon.stub() } },
+    });
+    signalHandlers = {};
+    sinon.stub(process, 'on').callsFake((signal, handler) => { signalHandlers[signal] = handler; });
+    exitStub = sinon.stub(process, 'exit');
+  });
+
+  afterEach(() => sinon.restore());
+
+  /**
+   * Create a server stub whose close() calls back once finishClose() is called
+   *
+   * @returns {object} Server stub
+   */
+  const createServerStub = () => {
+    const server = { close: (callback) => { server.finishClose = () => callback(); } };
+    return server;
+  };
+
+  it('exits once every server has closed', async () => {
+    const servers = [createServerStub(), createServerStub()];
+    gracefulShutdown.shutDownGracefully(servers, 1000);
+    assert.hasAllKeys(signalHandlers, ['SIGTERM', 'SIGINT']);
+
+    const shutdown = signalHandlers.SIGTERM('SIGTERM');
+    servers[0].finishClose();
+    await new Promise((resolve) => setImmediate(resolve));
+    sinon.assert.notCalled(exitStub);
+
+    servers[1].finishClose();
+    await shutdown;
+    sinon.assert.calledOnceWithExactly(exitStub, 0);
+  });
+
+  it('asks clients to close their connection while shutting down', async () => {
+    const res = { set: sinon.spy() };
+    const next = sinon.spy();
+    gracefulShutdown.closeConnectionsOnShutdown({}, res, next);
+    sinon.assert.notCalled(res.set);
+
+    const server = createServerStub();
+    gracefulShutdown.shutDownGracefully([server], 1000);
+    const shutdown = signalHandlers.SIGINT('SIGINT');
+    gracefulShutdown.closeConnectionsOnShutdown({}, res, next);
+    sinon.assert.calledWith(res.set, 'Connection', 'close');
+    sinon.assert.calledTwice(next);
+
+    server.finishClose();
+    await shutdown;
+  });
+});
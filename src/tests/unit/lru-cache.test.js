@@ -0,0 +1,45 @@
+import { assert } from 'chai';
+import sinon from 'sinon';
+
+import { createLruCache } from 'utils/lru-cache';
+
+describe('Test lru-cache', () => {
+  afterEach(() => sinon.restore());
+
+  it('evicts the least recently used entry when full', () => {
+    const cache = createLruCache({ maxEntries: 2, maxAge: 1000 });
+    cache.set('a', 1);
+    cache.set('b', 2);
+    // Reading 'a' makes 'b' the least recently used entry
+    cache.get('a');
+    cache.set('c', 3);
+    assert.equal(cache.get('a').value, 1);
+    assert.isUndefined(cache.get('b'));
+    assert.equal(cache.get('c').value, 3);
+    assert.deepEqual(cache.getStats(), { size: 2, maxEntries: 2, evictions: 1 });
+  });
+
+  it('entries are fresh until maxAge has passed', () => {
+    const clock = sinon.useFakeTimers();
+    const cache = createLruCache({ maxEntries: 2, maxAge: 1000 });
+    cache.set('a', 1);
+    clock.tick(999);
+    assert.isTrue(cache.isFresh(cache.get('a')));
+    clock.tick(1);
+    assert.isFalse(cache.isFresh(cache.get('a')));
+  });
+
+  it('removes entries', () => {
+    const cache = createLruCache({ maxEntries: 2, maxAge: 1000 });
+    cache.set('a', 1);
+    cache.remove('a');
+    assert.isUndefined(cache.get('a'));
+  });
+
+  it('does not store entries when maxEntries is 0', () => {
+    const cache = createLruCache({ maxEntries: 0, maxAge: 1000 });
+    cache.set('a', 1);
+    assert.isUndefined(cache.get('a'));
+    assert.equal(cache.getStats().evictions, 0);
+  });
+});
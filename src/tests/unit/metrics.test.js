@@ -0,0 +1,60 @@
+import { assert } from 'chai';
+import proxyquire from 'proxyquire';
+
+describe('Test metrics', () => {
+  let metrics;
+
+  // Load a fresh copy of the module so that metrics of other tests are not exposed
+  beforeEach(() => { metrics = proxyquire('utils/metrics', {}); });
+
+  it('exposes counters per label values', () => {
+    const counter = metrics.createCounter({
+      name: 'test_total',
+      help: 'Test counter',
+      labelNames: ['outcome'],
+    });
+    counter.inc({ outcome: 'success' });
+    counter.inc({ outcome: 'success' }, 2);
+    counter.inc({ outcome: 'say "hi"\n' });
+    assert.strictEqual(metrics.getMetricsText(), [
+      '# HELP test_total Test counter',
+      '# TYPE test_total counter',
+      'test_total{outcome="success"} 3',
+      'test_total{outcome="say \\"hi\\"\\n"} 1',
+      '',
+    ].join('\n'));
+  });
+
+  it('exposes histograms with cumulative buckets', () => {
+    const histogram = metrics.createHistogram({
+      name: 'test_size',
+      help: 'Test histogram',
+      buckets: [10, 1],
+    });
+    histogram.observe({}, 0.5);
+    histogram.observe({}, 5);
+    histogram.observe({}, 50);
+    assert.strictEqual(metrics.getMetricsText(), [
+      '# HELP test_size Test histogram',
+      '# TYPE test_size histogram',
+      'test_size_bucket{le="1"} 1',
+      'test_size_bucket{le="10"} 2',
+      'test_size_bucket{le="+Inf"} 3',
+      'test_size_sum 55.5',
+      'test_size_count 3',
+      '',
+    ].join('\n'));
+  });
+
+  it('rejects labels that the metric does not have', () => {
+    const counter = metrics.createCounter({ name: 'test_total', help: 'Test counter' });
+    assert.throws(() => counter.inc({ unknown: 'label' }), /has no labels: unknown/);
+  });
+
+  it('returns the registered metric when a metric is created again', () => {
+    const options = { name: 'test_total', help: 'Test counter' };
+    const counter = metrics.createCounter(options);
+    assert.strictEqual(metrics.createCounter(options), counter);
+    assert.throws(() => metrics.createHistogram(options), /already registered as a counter/);
+  });
+});
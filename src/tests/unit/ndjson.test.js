@@ -0,0 +1,45 @@
+import { assert } from 'chai';
+import _ from 'lodash';
+import { Writable } from 'stream';
+
+import { createNdjsonWriter } from 'utils/ndjson';
+
+/**
+ * Create a writable stream that takes a millisecond to accept each chunk
+ *
+ * @param {string[]} chunks Array that the written chunks are appended to
+ * @returns {Stream} Writable stream
+ */
+const createSlowStream = (chunks) => new Writable({
+  highWaterMark: 1,
+  write: (chunk, encoding, callback) => {
+    chunks.push(chunk.toString());
+    setTimeout(callback, 1);
+  },
+});
+
+describe('Test ndjson', () => {
+  describe('createNdjsonWriter', () => {
+    it('writes one JSON object per line and waits while the stream is full', async () => {
+      const chunks = [];
+      const stream = createSlowStream(chunks);
+      const write = createNdjsonWriter(stream);
+
+      await _.reduce(_.range(3), async (previousWrite, it) => {
+        await previousWrite;
+        await write({ it });
+        // each write waits until the slow stream has taken the previous chunk
+        assert.lengthOf(chunks, it + 1);
+      }, Promise.resolve());
+      assert.deepEqual(chunks, ['{"it":0}\n', '{"it":1}\n', '{"it":2}\n']);
+    });
+
+    it('rejects once the stream has been closed', async () => {
+      const stream = createSlowStream([]);
+      const write = createNdjsonWriter(stream);
+      stream.destroy();
+      await new Promise((resolve) => setImmediate(resolve));
+      await write({}).then(() => assert.fail(), (err) => assert.match(err.message, /closed/));
+    });
+  });
+});
@@ -0,0 +1,51 @@
+import { assert } from 'chai';
+import _ from 'lodash';
+
+import { buildNgramIndex, searchNgramIndex } from 'utils/ngram-index';
+
+import testData from './test-data';
+
+describe('Test ngram-index', () => {
+  const texts = {
+    1: 'Discussed course plan',
+    2: 'Course registration hold',
+    3: 'Plan to graduate',
+    4: '',
+  };
+  const index = buildNgramIndex(texts);
+
+  it('candidates include every text that contains the query', () => {
+    const queries = ['plan', 'ourse', 'Course', 'hold', 'Discussed course plan', 'zzz'];
+    _.forEach(queries, (query) => {
+      const candidates = searchNgramIndex(index, query);
+      _.forEach(texts, (text, id) => {
+        if (_.includes(text, query)) {
+          assert.include(candidates, id, `'${query}' should match text ${id}`);
+        }
+      });
+    });
+  });
+
+  it('candidates only include texts that contain every n-gram of the query', () => {
+    assert.sameMembers(searchNgramIndex(index, 'Plan'), ['3']);
+    assert.sameMembers(searchNgramIndex(index, 'plan'), ['1']);
+    assert.isEmpty(searchNgramIndex(index, 'zzz'));
+  });
+
+  it('queries shorter than an n-gram cannot be searched', () => {
+    assert.isUndefined(searchNgramIndex(index, 'pl'));
+  });
+
+  it('matches a linear search on test notes', () => {
+    const notes = _.mapValues(_.keyBy(testData.validNotes, 'id'), 'note');
+    const notesIndex = buildNgramIndex(notes);
+    _.forEach(testData.validQueryParams.q, (query) => {
+      const expected = _.keys(_.pickBy(notes, (note) => _.includes(note, query)));
+      const candidates = searchNgramIndex(notesIndex, query);
+      if (candidates !== undefined) {
+        const matches = _.filter(candidates, (id) => _.includes(notes[id], query));
+        assert.sameMembers(matches, expected);
+      }
+    });
+  });
+});
@@ -1,7 +1,9 @@
 import chai from 'chai';
 import chaiExclude from 'chai-exclude';
 import config from 'config';
+import fs from 'fs';
 import _ from 'lodash';
+import os from 'os';
 import proxyquire from 'proxyquire';
 import sinon from 'sinon';
 
@@ -93,16 +95,11 @@ describe('Test notes-dao', () => {
 
   describe('Test getNotes', () => {
     it('no optional parameters', async () => {
-      const existsSyncStub = sinon.stub().returns(true);
-      const readdirSyncStub = sinon.stub().returns(['test.json']);
-      const readJsonFileStub = sinon.stub().returns(testData.validNotes[0]);
       const stubs = {
-        fs: {
-          existsSync: existsSyncStub,
-          readdirSync: readdirSyncStub,
-        },
         './fs-operations': {
-          readJsonFile: readJsonFileStub,
+          getModifiedTime: sinon.stub().resolves(1),
+          listFiles: sinon.stub().resolves(['test.json']),
+          readJsonFile: sinon.stub().resolves(testData.validNotes[0]),
         },
       };
       stubNotesDao(stubs);
@@ -111,6 +108,69 @@ describe('Test notes-dao', () => {
       validateLink(result.links.self, '?studentId=111111111');
       assert.deepEqualExcluding(result.data[0].attributes, testData.validNotes[0], ['id']);
     });
+
+    it('notes are read again only when the directory is modified', async () => {
+      const getModifiedTimeStub = sinon.stub().resolves(1);
+      const listFilesStub = sinon.stub().resolves(['test.json']);
+      const stubs = {
+        './fs-operations': {
+          getModifiedTime: getModifiedTimeStub,
+          listFiles: listFilesStub,
+          readJsonFile: sinon.stub().resolves(testData.validNotes[0]),
+        },
+      };
+      stubNotesDao(stubs);
+      const query = { studentId: '111111111' };
+      await notesDAO.getNotes(query);
+      await notesDAO.getNotes(query);
+      sinon.assert.calledOnce(listFilesStub);
+
+      getModifiedTimeStub.resolves(2);
+      await notesDAO.getNotes(query);
+      sinon.assert.calledTwice(listFilesStub);
+    });
+
+    it('paginated', async () => {
+      const noteFiles = _.map(testData.validNotes, ({ id }) => `${id}.json`);
+      const readJsonFileStub = sinon.stub();
+      _.forEach(testData.validNotes, (note, index) => (
+        readJsonFileStub.onCall(index).resolves({ ...note })
+      ));
+      const stubs = {
+        './fs-operations': {
+          getModifiedTime: sinon.stub().resolves(1),
+          listFiles: sinon.stub().resolves(noteFiles),
+          readJsonFile: readJsonFileStub,
+        },
+      };
+      stubNotesDao(stubs);
+      const query = { studentId: '111111111', 'page[number]': 1, 'page[size]': 2 };
+      const result = await notesDAO.getNotes(query);
+      assert.hasAllKeys(result, ['data', 'links', 'meta']);
+      assert.lengthOf(result.data, 2);
+      assert.deepEqual(result.meta, {
+        totalResults: 3,
+        totalPages: 2,
+        currentPageNumber: 1,
+        currentPageSize: 2,
+      });
+      validateLink(result.links.next, '?page%5Bnumber%5D=2&page%5Bsize%5D=2&studentId=111111111');
+      assert.isNull(result.links.prev);
+    });
+  });
+
+  describe('Test getNotes by IDs', () => {
+    it('notes that do not exist are left out', async () => {
+      const readJsonFileStub = sinon.stub().resolves(undefined);
+      readJsonFileStub.withArgs(sinon.match(/\/111111111-1\.json$/))
+        .resolves(testData.validNotes[0]);
+      stubNotesDao({ './fs-operations': { readJsonFile: readJsonFileStub } });
+
+      const result = await notesDAO.getNotes({ ids: ['111111111-1', '111111111-9'] });
+      assert.lengthOf(result.data, 1);
+      assert.strictEqual(result.data[0].id, '111111111-1');
+      sinon.assert.calledTwice(readJsonFileStub);
+    });
   });
 
   describe('Test getNoteById', () => {
@@ -122,8 +182,9 @@ describe('Test notes-dao', () => {
         },
       };
       stubNotesDao(stubs);
-      const result = await notesDAO.getNoteById('000000000');
-      assert.deepEqualExcluding(result.data.attributes, testData.validNotes[0], ['id']);
+      const { eTag, serializedNote } = await notesDAO.getNoteById('000000000');
+      assert.match(eTag, /^"[0-9a-f]{40}"$/);
+      assert.deepEqualExcluding(serializedNote.data.attributes, testData.validNotes[0], ['id']);
     });
   });
 
@@ -132,18 +193,133 @@ describe('Test notes-dao', () => {
     it('valid object', async () => {
       const stubs = {
         './fs-operations': {
-          writeJsonFile: sinon.stub().returns(null),
-          initStudentDir: sinon.stub().returns(null),
-          incrementCounter: sinon.stub().returns(null),
-          getCounter: sinon.stub().returns('0'),
-          readJsonFile: sinon.stub().returns({ id: '000000000', ...testAttributes }),
+          createJsonFile: sinon.stub().resolves(true),
+          initStudentDir: sinon.stub().resolves(),
+          setCounter: sinon.stub().resolves(),
+          getCounter: sinon.stub().resolves('1'),
         },
       };
       stubNotesDao(stubs);
-      const result = await notesDAO.postNote(testData.validPostBody);
-      assert.deepEqualExcluding(result.data.attributes, testAttributes, ['source']);
-      validateLink(result.links.self, '/000000000');
-      validateLink(result.data.links.self, '/000000000');
+      const { eTag, serializedNote } = await notesDAO.postNote(testData.validPostBody);
+      assert.match(eTag, /^"[0-9a-f]{40}"$/);
+      _.forEach(['note', 'studentId', 'creatorId'], (it) => {
+        assert.strictEqual(serializedNote.data.attributes[it], testAttributes[it]);
+      });
+      validateLink(serializedNote.links.self, '/000000000-1');
+      validateLink(serializedNote.data.links.self, '/000000000-1');
+    });
+
+    describe('concurrent posts', () => {
+      const { studentId } = testAttributes;
+      let dbPath;
+
+      beforeEach(() => {
+        dbPath = fs.mkdtempSync(`${os.tmpdir()}/notes-api-`);
+        configGetStub.withArgs('dataSources.json').returns({ dbPath });
+      });
+
+      afterEach(() => {
+        const studentDirPath = `${dbPath}/${studentId}`;
+        if (fs.existsSync(studentDirPath)) {
+          _.forEach(fs.readdirSync(studentDirPath), (file) => (
+            fs.unlinkSync(`${studentDirPath}/${file}`)
+          ));
+          fs.rmdirSync(studentDirPath);
+        }
+        fs.rmdirSync(dbPath);
+      });
+
+      /**
+       * Post notes at once through each DAO
+       *
+       * @param {object[]} daos DAOs that each stand in for a separate process
+       * @param {number} count Number of notes posted through each DAO
+       * @returns {Promise<string[]>} IDs of the posted notes
+       */
+      const postConcurrently = async (daos, count) => {
+        const results = await Promise.all(_.flatMap(daos, (dao) => (
+          _.times(count, () => dao.postNote(testData.validPostBody))
+        )));
+        return _.map(results, 'serializedNote.data.id');
+      };
+
+      /**
+       * Get the files in the student directory
+       *
+       * @returns {object} The note IDs and the names of the other files in the directory
+       */
+      const listStudentDir = () => {
+        const [noteFiles, otherFiles] = _.partition(
+          fs.readdirSync(`${dbPath}/${studentId}`),
+          (file) => file.endsWith('.json'),
+        );
+        return { noteIds: _.map(noteFiles, (file) => file.slice(0, -'.json'.length)), otherFiles };
+      };
+
+      it('notes from one process are given contiguous IDs', async () => {
+        stubNotesDao({});
+        const noteIds = await postConcurrently([notesDAO], 200);
+
+        const expectedIds = _.times(200, (index) => `${studentId}-${index + 1}`);
+        assert.sameMembers(noteIds, expectedIds);
+        const { noteIds: storedIds, otherFiles } = listStudentDir();
+        assert.sameMembers(storedIds, expectedIds);
+        assert.deepEqual(otherFiles, ['counter.txt']);
+        assert.strictEqual(fs.readFileSync(`${dbPath}/${studentId}/counter.txt`, 'utf8'), '201\n');
+      });
+
+      it('IDs of notes deleted after another process created them are not reused', async () => {
+        const daos = _.times(2, () => {
+          stubNotesDao({});
+          return notesDAO;
+        });
+        await postConcurrently([daos[0]], 1);
+        await postConcurrently([daos[1]], 3);
+        fs.unlinkSync(`${dbPath}/${studentId}/${studentId}-3.json`);
+
+        assert.deepEqual(await postConcurrently([daos[0]], 1), [`${studentId}-5`]);
+      });
+
+      it('notes from several processes are given unique IDs', async () => {
+        const daos = _.times(4, () => {
+          stubNotesDao({});
+          return notesDAO;
+        });
+        const noteIds = await postConcurrently(daos, 50);
+
+        assert.lengthOf(_.uniq(noteIds), 200);
+        const { noteIds: storedIds, otherFiles } = listStudentDir();
+        assert.sameMembers(storedIds, noteIds);
+        assert.deepEqual(otherFiles, ['counter.txt']);
+        _.forEach(storedIds, (noteId) => {
+          const storedNote = JSON.parse(fs.readFileSync(`${dbPath}/${studentId}/${noteId}.json`));
+          assert.strictEqual(storedNote.id, noteId);
+        });
+      });
+    });
+  });
+
+  describe('Test postNotes', () => {
+    it('a note that fails does not stop the others', async () => {
+      const testAttributes = testData.validPostBody.data.attributes;
+      const initStudentDirStub = sinon.stub().resolves();
+      initStudentDirStub.onSecondCall().rejects(new Error('disk full'));
+      const stubs = {
+        './fs-operations': {
+          createJsonFile: sinon.stub().resolves(true),
+          initStudentDir: initStudentDirStub,
+          setCounter: sinon.stub().resolves(),
+          getCounter: sinon.stub().resolves('1'),
+        },
+      };
+      stubNotesDao(stubs);
+      const results = await notesDAO.postNotes(_.times(3, () => testData.validPostBody));
+      assert.lengthOf(results, 3);
+      assert.strictEqual(results[1].error.message, 'disk full');
+      _.forEach([results[0], results[2]], ({ eTag, serializedNote }) => {
+        assert.isString(eTag);
+        assert.strictEqual(serializedNote.data.attributes.note, testAttributes.note);
+      });
     });
   });
 
@@ -157,11 +333,44 @@ describe('Test notes-dao', () => {
         },
       };
       stubNotesDao(stubs);
-      const result = await notesDAO.patchNoteById('000000000', testAttributes);
+      const { eTag, serializedNote } = await notesDAO.patchNoteById('000000000', testAttributes);
+      assert.isString(eTag);
       _.forEach(['note', 'permissions'], (it) => {
-        assert.equal(result.data.attributes[it], testAttributes[it]);
+        assert.equal(serializedNote.data.attributes[it], testAttributes[it]);
       });
     });
+    it('If-Match that does not match', async () => {
+      const writeJsonFileStub = sinon.stub().resolves();
+      const stubs = {
+        './fs-operations': {
+          writeJsonFile: writeJsonFileStub,
+          readJsonFile: sinon.stub().resolves({ id: '000000000', ...testAttributes }),
+        },
+      };
+      stubNotesDao(stubs);
+      const result = await notesDAO.patchNoteById('000000000', testAttributes, '"other"');
+      assert.isFalse(result);
+      assert.isTrue(writeJsonFileStub.notCalled);
+    });
+    it('only one of two concurrent patches with the same If-Match succeeds', async () => {
+      let storedNote = { id: '000000000', ...testAttributes };
+      const stubs = {
+        './fs-operations': {
+          writeJsonFile: sinon.stub().callsFake(async (filePath, data) => {
+            storedNote = _.cloneDeep(data);
+          }),
+          readJsonFile: sinon.stub().callsFake(async () => _.cloneDeep(storedNote)),
+        },
+      };
+      stubNotesDao(stubs);
+      const eTag = await notesDAO.getNoteETag('000000000');
+      const results = await Promise.all(_.times(2, (index) => (
+        notesDAO.patchNoteById('000000000', { note: `Update ${index}` }, eTag)
+      )));
+      assert.isObject(results[0]);
+      assert.isFalse(results[1]);
+      assert.strictEqual(storedNote.note, 'Update 0');
+    });
   });
 
   describe('Test deleteNoteById', () => {
@@ -176,4 +385,45 @@ describe('Test notes-dao', () => {
       assert.equal(result, true);
     });
   });
+
+  describe('Test exportNotes', () => {
+    const dbPath = '/db';
+
+    beforeEach(() => {
+      configGetStub.withArgs('dataSources.json').returns({ dbPath });
+      const listFilesStub = sinon.stub().resolves([]);
+      listFilesStub.withArgs(dbPath).resolves(['111111111', 'not-a-student']);
+      listFilesStub.withArgs(`${dbPath}/111111111`).resolves(
+        ['old.json', 'new.json', 'counter.txt'],
+      );
+      const getModifiedTimeStub = sinon.stub();
+      getModifiedTimeStub.withArgs(`${dbPath}/111111111/old.json`).resolves(1000);
+      getModifiedTimeStub.withArgs(`${dbPath}/111111111/new.json`).resolves(3000);
+      const readJsonFileStub = sinon.stub();
+      readJsonFileStub.withArgs(`${dbPath}/111111111/old.json`).resolves({ id: 'old' });
+      readJsonFileStub.withArgs(`${dbPath}/111111111/new.json`).resolves({ id: 'new' });
+      stubNotesDao({
+        './fs-operations': {
+          listFiles: listFilesStub,
+          getModifiedTime: getModifiedTimeStub,
+          readJsonFile: readJsonFileStub,
+        },
+      });
+    });
+
+    it('passes every note to onNote', async () => {
+      const exportedNotes = [];
+      await notesDAO.exportNotes(async (note) => { exportedNotes.push(note); });
+      assert.sameDeepMembers(exportedNotes, [
+        { id: 'old', source: 'advisorPortal' },
+        { id: 'new', source: 'advisorPortal' },
+      ]);
+    });
+
+    it('leaves out notes modified before modifiedSince', async () => {
+      const exportedNotes = [];
+      await notesDAO.exportNotes(async (note) => { exportedNotes.push(note); }, new Date(2000));
+      assert.deepEqual(exportedNotes, [{ id: 'new', source: 'advisorPortal' }]);
+    });
+  });
 });
@@ -0,0 +1,159 @@
+import { assert } from 'chai';
+import express from 'express';
+import http from 'http';
+import proxyquire from 'proxyquire';
+import sinon from 'sinon';
+
+describe('Test notes paths', () => {
+  const noteId = '111111111-1';
+  const eTag = '"abc"';
+  const serializedNote = {
+    data: { id: noteId, links: { self: `https://localhost/v1/notes/${noteId}` } },
+  };
+  let notesDAO;
+  let server;
+
+  beforeEach((done) => {
+    notesDAO = {
+      '@noCallThru': true,
+      getNoteETag: sinon.stub().resolves(eTag),
+      getNoteById: sinon.stub().resolves({ eTag, serializedNote }),
+      patchNoteById: sinon.stub().resolves({ eTag, serializedNote }),
+      postNote: sinon.stub().resolves({ eTag, serializedNote }),
+    };
+    const notePaths = proxyquire('api/v1/paths/notes/{id}', {
+      '../../db/awsS3/notes-dao': notesDAO,
+    });
+    const notesPaths = proxyquire('api/v1/paths/notes', {
+      '../db/awsS3/notes-dao': notesDAO,
+    });
+    const app = express();
+    app.use(express.json());
+    app.get('/notes/:id', notePaths.get);
+    app.patch('/notes/:id', notePaths.patch);
+    app.post('/notes', notesPaths.post);
+    server = app.listen(0, done);
+  });
+
+  afterEach((done) => server.close(done));
+
+  /**
+   * Send a request to the test server
+   *
+   * @param {string} method Request method
+   * @param {string} path Path to request
+   * @param {object} headers Request headers
+   * @param {object} body Request body, sent as JSON
+   * @returns {Promise} Promise object represents the response status, headers and parsed body
+   */
+  const request = (method, path, headers = {}, body) => new Promise((resolve, reject) => {
+    const options = {
+      method,
+      path,
+      port: server.address().port,
+      headers: body ? { ...headers, 'Content-Type': 'application/json' } : headers,
+    };
+    const req = http.request(options, (res) => {
+      const chunks = [];
+      res.on('data', (chunk) => chunks.push(chunk));
+      res.on('end', () => {
+        const text = Buffer.concat(chunks).toString();
+        resolve({ status: res.statusCode, headers: res.headers, body: text && JSON.parse(text) });
+      });
+    }).on('error', reject);
+    req.end(body && JSON.stringify(body));
+  });
+
+  describe('Test GET /notes/{noteId}', () => {
+    it('returns the note with its ETag', async () => {
+      const { status, headers, body } = await request('GET', `/notes/${noteId}`);
+      assert.strictEqual(status, 200);
+      assert.strictEqual(headers.etag, eTag);
+      assert.deepEqual(body, serializedNote);
+      assert.isTrue(notesDAO.getNoteETag.notCalled);
+    });
+
+    it('answers a matching If-None-Match with 304 without fetching the note', async () => {
+      const { status, headers } = await request('GET', `/notes/${noteId}`, {
+        'If-None-Match': eTag,
+      });
+      assert.strictEqual(status, 304);
+      assert.strictEqual(headers.etag, eTag);
+      assert.isTrue(notesDAO.getNoteETag.calledOnceWith(noteId));
+      assert.isTrue(notesDAO.getNoteById.notCalled);
+    });
+
+    it('answers If-None-Match with the ETag of a compressed response with 304', async () => {
+      const { status } = await request('GET', `/notes/${noteId}`, {
+        'If-None-Match': '"abc-gzip"',
+      });
+      assert.strictEqual(status, 304);
+    });
+
+    it('answers a matching If-None-Match on HEAD with 304', async () => {
+      const { status } = await request('HEAD', `/notes/${noteId}`, { 'If-None-Match': eTag });
+      assert.strictEqual(status, 304);
+      assert.isTrue(notesDAO.getNoteById.notCalled);
+    });
+
+    it('returns the note if If-None-Match does not match', async () => {
+      const { status, headers, body } = await request('GET', `/notes/${noteId}`, {
+        'If-None-Match': '"other"',
+      });
+      assert.strictEqual(status, 200);
+      assert.strictEqual(headers.etag, eTag);
+      assert.deepEqual(body, serializedNote);
+    });
+
+    it('returns 404 if the note of a revalidation does not exist', async () => {
+      notesDAO.getNoteETag.resolves(undefined);
+      const { status } = await request('GET', `/notes/${noteId}`, { 'If-None-Match': eTag });
+      assert.strictEqual(status, 404);
+      assert.isTrue(notesDAO.getNoteById.notCalled);
+    });
+  });
+
+  describe('Test PATCH /notes/{noteId}', () => {
+    const patchBody = { note: 'updatedTestNote' };
+
+    it('returns the patched note with its new ETag', async () => {
+      const { status, headers, body } = await request('PATCH', `/notes/${noteId}`, {
+        'If-Match': eTag,
+      }, patchBody);
+      assert.strictEqual(status, 200);
+      assert.strictEqual(headers.etag, eTag);
+      assert.deepEqual(body, serializedNote);
+      assert.isTrue(notesDAO.patchNoteById.calledOnceWith(noteId, patchBody, eTag));
+    });
+
+    it('passes no precondition if If-Match is not given', async () => {
+      await request('PATCH', `/notes/${noteId}`, {}, patchBody);
+      assert.isTrue(notesDAO.patchNoteById.calledOnceWith(noteId, patchBody, undefined));
+    });
+
+    it('returns 412 if If-Match does not match', async () => {
+      notesDAO.patchNoteById.resolves(false);
+      const { status, body } = await request('PATCH', `/notes/${noteId}`, {
+        'If-Match': '"other"',
+      }, patchBody);
+      assert.strictEqual(status, 412);
+      assert.strictEqual(body.errors[0].status, '412');
+    });
+
+    it('returns 404 if the note does not exist', async () => {
+      notesDAO.patchNoteById.resolves(undefined);
+      const { status } = await request('PATCH', `/notes/${noteId}`, { 'If-Match': '*' }, patchBody);
+      assert.strictEqual(status, 404);
+    });
+  });
+
+  describe('Test POST /notes', () => {
+    it('returns the new note with its ETag and location', async () => {
+      const { status, headers, body } = await request('POST', '/notes', {}, { data: {} });
+      assert.strictEqual(status, 201);
+      assert.strictEqual(headers.etag, eTag);
+      assert.strictEqual(headers.location, serializedNote.data.links.self);
+      assert.deepEqual(body, serializedNote);
+    });
+  });
+});
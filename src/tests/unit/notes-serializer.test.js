@@ -0,0 +1,99 @@
+import { assert } from 'chai';
+import config from 'config';
+import { Serializer as JsonApiSerializer } from 'jsonapi-serializer';
+import _ from 'lodash';
+import proxyquire from 'proxyquire';
+import sinon from 'sinon';
+
+import { openapi } from 'utils/load-openapi';
+
+import testData from './test-data';
+
+describe('Test notes-serializer', () => {
+  let notesSerializer;
+  let serializerOptions;
+  const noteResourceKeys = _.keys(
+    openapi.definitions.NoteResource.properties.attributes.properties,
+  );
+
+  before(() => {
+    const { server } = testData.mockConfig;
+    sinon.stub(config, 'get').withArgs('server').returns(server);
+    notesSerializer = proxyquire('api/v1/serializers/notes-serializer', {});
+    ({ serializerOptions } = proxyquire('utils/jsonapi', {}));
+  });
+
+  after(() => sinon.restore());
+
+  /**
+   * Serialize notes with jsonapi-serializer using the options that notes-serializer is equivalent
+   * to
+   *
+   * @param {object|object[]} data Raw notes
+   * @param {object} args Additional serializer args
+   * @returns {object} Serialized document
+   */
+  const serializeWithJsonApiSerializer = (data, args) => new JsonApiSerializer(
+    'note',
+    serializerOptions({
+      identifierField: 'id',
+      resourceKeys: noteResourceKeys,
+      resourcePath: 'notes',
+      keyForAttribute: _.identity,
+      enableDataLinks: true,
+      ...args,
+    }),
+  ).serialize(data);
+
+  const rawNotes = [
+    ..._.map(testData.validNotes, (note) => ({ ...note, source: 'advisorPortal' })),
+    // a note with missing attributes, a null context and an attribute that is not a resource key
+    { id: '111111111-4', note: 'Partial note', context: null, unknownAttribute: true },
+    // a note without any attributes
+    { id: '111111111-5' },
+  ];
+
+  it('serializes a list of notes like jsonapi-serializer', () => {
+    const query = { 'filter[studentId]': '111111111' };
+    const result = notesSerializer.serializeNotes(_.cloneDeep(rawNotes), query);
+    const expected = serializeWithJsonApiSerializer(_.cloneDeep(rawNotes), {
+      topLevelSelfLink: result.links.self,
+    });
+    assert.strictEqual(JSON.stringify(result), JSON.stringify(expected));
+  });
+
+  it('serializes a page of notes like jsonapi-serializer', () => {
+    const query = { 'filter[studentId]': '111111111', 'page[number]': 2, 'page[size]': 2 };
+    const result = notesSerializer.serializeNotes(_.cloneDeep(rawNotes), query);
+    const expected = serializeWithJsonApiSerializer(_.slice(_.cloneDeep(rawNotes), 2, 4), {
+      topLevelSelfLink: result.links.self,
+      pagination: {
+        pageNumber: 2,
+        totalPages: 3,
+        nextPage: 3,
+        prevPage: 1,
+        pageSize: 2,
+        totalResults: rawNotes.length,
+      },
+      query,
+    });
+    assert.strictEqual(JSON.stringify(result), JSON.stringify(expected));
+  });
+
+  it('serializes a single note like jsonapi-serializer', () => {
+    _.forEach(rawNotes, (rawNote) => {
+      const result = notesSerializer.serializeNote(_.cloneDeep(rawNote));
+      const expected = serializeWithJsonApiSerializer(_.cloneDeep(rawNote), {
+        topLevelSelfLink: result.links.self,
+      });
+      assert.strictEqual(JSON.stringify(result), JSON.stringify(expected));
+    });
+  });
+
+  it('does not share objects with the raw note', () => {
+    const rawNote = _.cloneDeep(testData.validNotes[0]);
+    const result = notesSerializer.serializeNote(rawNote);
+    result.data.attributes.context.contextId = 'changed';
+    assert.strictEqual(rawNote.context.contextId, testData.validNotes[0].context.contextId);
+  });
+});
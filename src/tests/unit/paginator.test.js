@@ -1,5 +1,5 @@
 import { assert } from 'chai';
-import { paginate } from 'utils/paginator';
+import { getPageQuery, paginate } from 'utils/paginator';
 import _ from 'lodash';
 import { pets as rows } from 'db/mock-data-example.json';
 
@@ -85,4 +85,11 @@ describe('Test paginator', () => {
     repeatForAllPages(assertValidPageNumber);
     done();
   });
+
+  it('pagination is only requested when a page parameter is given', (done) => {
+    assert.isUndefined(getPageQuery({ 'filter[studentId]': '111111111' }));
+    assert.deepEqual(getPageQuery({ 'page[size]': 10 }), { number: 1, size: 10 });
+    assert.deepEqual(getPageQuery({ 'page[number]': 3 }), { number: 3, size: 25 });
+    done();
+  });
 });
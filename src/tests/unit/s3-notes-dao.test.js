@@ -0,0 +1,392 @@
+import { assert } from 'chai';
+import config from 'config';
+import _ from 'lodash';
+import proxyquire from 'proxyquire';
+import sinon from 'sinon';
+
+import testData from './test-data';
+
+const studentId = '111111111';
+const manifestKey = `manifests/${studentId}.json`;
+
+/**
+ * Create an in-memory stand-in for the aws-operations module. Every write gives the object a new
+ * ETag, as S3 does.
+ *
+ * @returns {object} The stored objects keyed by key, a function that stores an object and returns
+ *                   its ETag, a function that holds back the next read of a key, and the stand-in
+ *                   module
+ */
+const createFakeBucket = () => {
+  const objects = new Map();
+  const heldReads = new Map();
+  let version = 0;
+
+  const store = (key, body) => {
+    version += 1;
+    const eTag = `"${version}"`;
+    objects.set(key, { body: _.cloneDeep(body), eTag });
+    return eTag;
+  };
+
+  const list = (prefix = '') => _.map(
+    _.filter([...objects.keys()], (key) => _.startsWith(key, prefix)).sort(),
+    (key) => ({ Key: key, ETag: objects.get(key).eTag, LastModified: new Date() }),
+  );
+
+  // The next read of the key returns the object as it is now, but only once it is released
+  const holdNextRead = (key) => {
+    let release;
+    heldReads.set(key, new Promise((resolve) => { release = resolve; }));
+    return release;
+  };
+
+  const awsOps = {
+    '@noCallThru': true,
+    getJsonObject: sinon.stub().callsFake(async (key) => {
+      const object = objects.get(key);
+      const result = object && { body: _.cloneDeep(object.body), eTag: object.eTag };
+      if (heldReads.has(key)) {
+        const heldRead = heldReads.get(key);
+        heldReads.delete(key);
+        await heldRead;
+      }
+      return result;
+    }),
+    getJsonObjectETag: sinon.stub().callsFake(async (key) => (
+      objects.has(key) ? objects.get(key).eTag : undefined
+    )),
+    putObject: sinon.stub().callsFake(async (body, key) => ({ ETag: store(key, body) })),
+    putDir: async (key) => { objects.set(key, { body: null, eTag: '"dir"' }); },
+    objectExists: async (key) => objects.has(key),
+    deleteObject: async (key) => objects.delete(key),
+    forEachPage: async ({ Prefix: prefix }, onPage) => onPage({ Contents: list(prefix) }),
+    forEachListedObject: async (listedObjects, iteratee) => {
+      await Promise.all(_.map(listedObjects, iteratee));
+    },
+    forEachObject: async ({ Prefix: prefix }, iteratee) => {
+      await Promise.all(_.map(list(prefix), iteratee));
+    },
+  };
+  return {
+    objects,
+    store,
+    holdNextRead,
+    awsOps,
+  };
+};
+
+/**
+ * Wait until a condition holds, giving background work such as manifest updates a chance to run
+ *
+ * @param {Function} condition Function that returns whether the condition holds
+ * @returns {Promise} Promise that resolves when the condition holds
+ */
+const waitFor = async (condition) => {
+  for (let tick = 0; tick < 100; tick += 1) {
+    if (condition()) {
+      return;
+    }
+    // eslint-disable-next-line no-await-in-loop
+    await new Promise((resolve) => setImmediate(resolve));
+  }
+  assert.fail('Condition did not hold');
+};
+
+afterEach(() => sinon.restore());
+
+describe('Test S3 notes-dao', () => {
+  let bucket;
+  let notesDAO;
+
+  beforeEach(() => {
+    sinon.stub(config, 'get').callsFake((name) => _.get(testData.mockConfig, name));
+    bucket = createFakeBucket();
+    notesDAO = proxyquire('api/v1/db/awsS3/notes-dao', {
+      './aws-operations': bucket.awsOps,
+    });
+  });
+
+  /**
+   * Store a note in the fake bucket
+   *
+   * @param {string} noteId Note ID
+   * @param {object} attributes Attributes that override those of the first valid test note
+   * @returns {string} ETag of the note object
+   */
+  const storeNote = (noteId, attributes = {}) => bucket.store(`${studentId}/${noteId}.json`, {
+    ...testData.validNotes[0],
+    id: noteId,
+    studentId,
+    ...attributes,
+  });
+
+  describe('Test getNotes', () => {
+    const query = { 'filter[studentId]': studentId, sort: 'dateCreated' };
+
+    it('concurrent calls get the notes of the listing of their ETag', async () => {
+      storeNote(`${studentId}-1`);
+      const oldVersion = await notesDAO.getNotesVersion(query);
+      storeNote(`${studentId}-2`);
+      const newVersion = await notesDAO.getNotesVersion(query);
+      assert.notStrictEqual(oldVersion.eTag, newVersion.eTag);
+
+      const [oldNotes, newNotes] = await Promise.all([
+        notesDAO.getNotes(query, oldVersion.noteObjects),
+        notesDAO.getNotes(query, newVersion.noteObjects),
+      ]);
+      assert.sameMembers(_.map(oldNotes.data, 'id'), [`${studentId}-1`]);
+      assert.sameMembers(_.map(newNotes.data, 'id'), [`${studentId}-1`, `${studentId}-2`]);
+    });
+
+    it('filters notes by a substring of their note attribute', async () => {
+      storeNote(`${studentId}-1`, { note: 'Discussed the study plan' });
+      storeNote(`${studentId}-2`, { note: 'Missed the appointment' });
+      storeNote(`${studentId}-3`, { note: 'Plan' });
+
+      const result = await notesDAO.getNotes({ ...query, 'filter[note][fuzzy]': 'plan' });
+      assert.sameMembers(_.map(result.data, 'id'), [`${studentId}-1`]);
+    });
+
+    it('concurrent calls with the same listing share a single fetch', async () => {
+      storeNote(`${studentId}-1`);
+      const { noteObjects } = await notesDAO.getNotesVersion(query);
+      // Let the first call write the manifest so that no background update reads it again
+      await notesDAO.getNotes(query, noteObjects);
+      await waitFor(() => bucket.objects.has(manifestKey));
+      bucket.awsOps.getJsonObject.resetHistory();
+
+      await Promise.all(_.times(3, () => notesDAO.getNotes(query, noteObjects)));
+      assert.isTrue(bucket.awsOps.getJsonObject.calledOnceWith(manifestKey));
+    });
+  });
+
+  describe('Test manifest read-repair', () => {
+    const query = { 'filter[studentId]': studentId, sort: 'dateCreated' };
+
+    /**
+     * Get the number of times the manifest has been written
+     *
+     * @returns {number} Number of manifest writes
+     */
+    const countManifestWrites = () => _.filter(bucket.awsOps.putObject.args, [1, manifestKey])
+      .length;
+
+    /**
+     * Check that the manifest holds exactly the note objects in the bucket
+     */
+    const assertManifestMatchesNotes = () => {
+      const noteKeys = _.filter([...bucket.objects.keys()], (key) => (
+        _.startsWith(key, `${studentId}/`) && _.endsWith(key, '.json')
+      ));
+      const manifest = bucket.objects.get(manifestKey).body;
+      assert.hasAllKeys(manifest, ['studentId', 'notes']);
+      const { notes } = manifest;
+      assert.sameMembers(_.keys(notes), _.map(noteKeys, (key) => bucket.objects.get(key).body.id));
+      _.forEach(noteKeys, (key) => {
+        const { body, eTag } = bucket.objects.get(key);
+        assert.deepEqual(notes[body.id], { eTag, body });
+      });
+    };
+
+    it('a missing manifest is built', async () => {
+      storeNote(`${studentId}-1`);
+      storeNote(`${studentId}-2`);
+      const result = await notesDAO.getNotes(query);
+      assert.lengthOf(result.data, 2);
+
+      await waitFor(() => countManifestWrites() === 1);
+      assertManifestMatchesNotes();
+    });
+
+    it('a stale manifest is repaired', async () => {
+      const upToDateETag = storeNote(`${studentId}-1`);
+      storeNote(`${studentId}-2`, { note: 'Modified note' });
+      storeNote(`${studentId}-3`);
+      const staleEntry = (noteId) => ({
+        eTag: '"stale"',
+        body: { ...testData.validNotes[0], id: noteId },
+      });
+      bucket.store(manifestKey, {
+        studentId,
+        notes: {
+          [`${studentId}-1`]: { ...staleEntry(`${studentId}-1`), eTag: upToDateETag },
+          [`${studentId}-2`]: staleEntry(`${studentId}-2`),
+          [`${studentId}-4`]: staleEntry(`${studentId}-4`),
+        },
+      });
+
+      const result = await notesDAO.getNotes(query);
+      assert.sameMembers(
+        _.map(result.data, 'id'),
+        [`${studentId}-1`, `${studentId}-2`, `${studentId}-3`],
+      );
+      assert.include(_.map(result.data, 'attributes.note'), 'Modified note');
+
+      await waitFor(() => countManifestWrites() === 1);
+      assertManifestMatchesNotes();
+    });
+
+    it('the n-gram index of an older manifest is dropped when it is repaired', async () => {
+      storeNote(`${studentId}-1`);
+      bucket.store(manifestKey, { studentId, notes: {}, index: { abc: [`${studentId}-1`] } });
+
+      await notesDAO.getNotes(query);
+      await waitFor(() => countManifestWrites() === 1);
+      assertManifestMatchesNotes();
+    });
+
+    it('a repair does not overwrite a write made while it was in progress', async () => {
+      const noteId = `${studentId}-1`;
+      storeNote(noteId);
+      // Hold back the read made by the repair, so that it returns the note before the patch
+      const release = bucket.holdNextRead(`${studentId}/${noteId}.json`);
+      const notesPromise = notesDAO.getNotes(query);
+      await waitFor(() => bucket.awsOps.getJsonObject.calledWith(`${studentId}/${noteId}.json`));
+
+      const testAttributes = testData.validPatchBody.data.attributes;
+      await notesDAO.patchNoteById(noteId, testAttributes);
+      await waitFor(() => countManifestWrites() === 1);
+
+      release();
+      await notesPromise;
+      await waitFor(() => countManifestWrites() === 2);
+      assertManifestMatchesNotes();
+      assert.strictEqual(
+        bucket.objects.get(manifestKey).body.notes[noteId].body.note,
+        testAttributes.note,
+      );
+    });
+  });
+
+  describe('Test getNoteById', () => {
+    it('returns the serialized note with the ETag of its object', async () => {
+      const eTag = storeNote(`${studentId}-1`);
+      const result = await notesDAO.getNoteById(`${studentId}-1`);
+      assert.strictEqual(result.eTag, eTag);
+      assert.strictEqual(result.serializedNote.data.id, `${studentId}-1`);
+      assert.strictEqual(result.serializedNote.data.attributes.source, 'advisorPortal');
+    });
+
+    it('returns undefined for a note that does not exist', async () => {
+      assert.isUndefined(await notesDAO.getNoteById(`${studentId}-1`));
+    });
+
+    it('revalidates the cached note object', async () => {
+      storeNote(`${studentId}-1`);
+      await notesDAO.getNoteById(`${studentId}-1`);
+      assert.isTrue(bucket.awsOps.getJsonObject.calledOnceWith(
+        `${studentId}/${studentId}-1.json`,
+        sinon.match({ revalidate: true }),
+      ));
+    });
+  });
+
+  describe('Test postNote', () => {
+    const testAttributes = testData.validPostBody.data.attributes;
+
+    it('returns the serialized new note with the ETag of its object', async () => {
+      const { eTag, serializedNote } = await notesDAO.postNote(testData.validPostBody);
+      const noteId = serializedNote.data.id;
+      const stored = bucket.objects.get(`${testAttributes.studentId}/${noteId}.json`);
+      assert.strictEqual(eTag, stored.eTag);
+      assert.strictEqual(serializedNote.data.attributes.note, testAttributes.note);
+      assert.strictEqual(stored.body.note, testAttributes.note);
+    });
+
+    it('adds the note to the manifest of its student', async () => {
+      const { eTag, serializedNote } = await notesDAO.postNote(testData.validPostBody);
+      const key = `manifests/${testAttributes.studentId}.json`;
+      await waitFor(() => bucket.objects.has(key));
+      assert.deepEqual(bucket.objects.get(key).body.notes[serializedNote.data.id].eTag, eTag);
+    });
+  });
+
+  describe('Test postNotes', () => {
+    it('a note that fails does not stop the others', async () => {
+      bucket.awsOps.putObject.onSecondCall().rejects(new Error('slow down'));
+
+      const results = await notesDAO.postNotes(_.times(3, () => testData.validPostBody));
+      assert.lengthOf(results, 3);
+      assert.strictEqual(results[1].error.message, 'slow down');
+      _.forEach([results[0], results[2]], ({ eTag, serializedNote }) => {
+        assert.isString(eTag);
+        assert.strictEqual(
+          serializedNote.data.attributes.note,
+          testData.validPostBody.data.attributes.note,
+        );
+      });
+    });
+  });
+
+  describe('Test patchNoteById', () => {
+    const testAttributes = testData.validPatchBody.data.attributes;
+
+    it('returns the serialized patched note with the new ETag of its object', async () => {
+      const noteId = `${studentId}-1`;
+      const oldETag = storeNote(noteId);
+      const { eTag, serializedNote } = await notesDAO.patchNoteById(noteId, testAttributes);
+      assert.notStrictEqual(eTag, oldETag);
+      assert.strictEqual(eTag, bucket.objects.get(`${studentId}/${noteId}.json`).eTag);
+      assert.strictEqual(serializedNote.data.attributes.note, testAttributes.note);
+    });
+
+    it('returns undefined for a note that does not exist', async () => {
+      assert.isUndefined(await notesDAO.patchNoteById(`${studentId}-1`, testAttributes));
+    });
+
+    describe('with If-Match', () => {
+      const noteId = `${studentId}-1`;
+      const noteKey = `${studentId}/${noteId}.json`;
+
+      it('patches the note if the ETag matches', async () => {
+        const oldETag = storeNote(noteId);
+        const result = await notesDAO.patchNoteById(noteId, testAttributes, `"other", ${oldETag}`);
+        assert.strictEqual(result.eTag, bucket.objects.get(noteKey).eTag);
+        assert.strictEqual(bucket.objects.get(noteKey).body.note, testAttributes.note);
+      });
+
+      it('patches the note if the ETag is *', async () => {
+        storeNote(noteId);
+        const result = await notesDAO.patchNoteById(noteId, testAttributes, '*');
+        assert.strictEqual(result.eTag, bucket.objects.get(noteKey).eTag);
+        assert.strictEqual(bucket.objects.get(noteKey).body.note, testAttributes.note);
+      });
+
+      it('returns false and leaves the note as is if the ETag does not match', async () => {
+        const oldETag = storeNote(noteId);
+        assert.isFalse(await notesDAO.patchNoteById(noteId, testAttributes, '"other"'));
+        assert.strictEqual(bucket.objects.get(noteKey).eTag, oldETag);
+        assert.strictEqual(bucket.objects.get(noteKey).body.note, testData.validNotes[0].note);
+      });
+
+      it('returns undefined for a note that does not exist', async () => {
+        assert.isUndefined(await notesDAO.patchNoteById(noteId, testAttributes, '*'));
+      });
+
+      it('a patch made with an ETag that has since been patched fails', async () => {
+        const oldETag = storeNote(noteId);
+        const results = await Promise.all(_.times(2, () => (
+          notesDAO.patchNoteById(noteId, testAttributes, oldETag)
+        )));
+        assert.isObject(results[0]);
+        assert.isFalse(results[1]);
+      });
+    });
+  });
+
+  describe('Test getNoteETag', () => {
+    it('returns the revalidated ETag of the note object', async () => {
+      const eTag = storeNote(`${studentId}-1`);
+      assert.strictEqual(await notesDAO.getNoteETag(`${studentId}-1`), eTag);
+      assert.isTrue(bucket.awsOps.getJsonObjectETag.calledOnceWith(
+        `${studentId}/${studentId}-1.json`,
+        sinon.match({ revalidate: true }),
+      ));
+    });
+
+    it('returns undefined for a note that does not exist', async () => {
+      assert.isUndefined(await notesDAO.getNoteETag(`${studentId}-1`));
+    });
+  });
+});
@@ -0,0 +1,53 @@
+import { assert } from 'chai';
+import proxyquire from 'proxyquire';
+import sinon from 'sinon';
+
+describe('Test server-timing', () => {
+  /**
+   * Load server-timing with Server-Timing enabled or disabled by config
+   *
+   * @param {boolean} serverTiming Whether Server-Timing is enabled
+   * @returns {object} The server-timing module
+   */
+  const loadServerTiming = (serverTiming) => proxyquire('utils/server-timing', {
+    config: { get: sinon.stub().withArgs('server').returns({ serverTiming }) },
+  });
+
+  afterEach(() => sinon.restore());
+
+  it('adds up the time spent in each phase', async () => {
+    sinon.stub(process, 'hrtime')
+      .onCall(0).returns([0, 0])
+      .onCall(1).returns([0, 1500000])
+      .onCall(2).returns([0, 0])
+      .onCall(3).returns([0, 500000])
+      .onCall(4).returns([0, 0])
+      .onCall(5).returns([1, 0]);
+    const { createServerTiming } = loadServerTiming(true);
+    const serverTiming = createServerTiming();
+
+    assert.strictEqual(serverTiming.time('parse', () => 'parsed'), 'parsed');
+    assert.strictEqual(serverTiming.time('parse', () => 'parsed again'), 'parsed again');
+    assert.strictEqual(await serverTiming.time('fetch', async () => 'fetched'), 'fetched');
+    assert.strictEqual(serverTiming.getHeader(), 'parse;dur=2.00, fetch;dur=1000.00');
+  });
+
+  it('only sets the header when phases were recorded', () => {
+    const { createServerTiming, setServerTimingHeader } = loadServerTiming(true);
+    const res = { set: sinon.spy() };
+    const serverTiming = createServerTiming();
+    setServerTimingHeader(res, serverTiming);
+    sinon.assert.notCalled(res.set);
+
+    serverTiming.add('list', 3);
+    setServerTimingHeader(res, serverTiming);
+    sinon.assert.calledWith(res.set, 'Server-Timing', 'list;dur=3.00');
+  });
+
+  it('only runs the timed functions when disabled', async () => {
+    const { createServerTiming } = loadServerTiming(false);
+    const serverTiming = createServerTiming();
+    assert.strictEqual(await serverTiming.time('fetch', async () => 'fetched'), 'fetched');
+    assert.isUndefined(serverTiming.getHeader());
+  });
+});
@@ -0,0 +1,46 @@
+import chai from 'chai';
+import chaiAsPromised from 'chai-as-promised';
+import sinon from 'sinon';
+
+import { singleFlight } from 'utils/single-flight';
+
+chai.use(chaiAsPromised);
+const { assert } = chai;
+
+describe('Test single-flight', () => {
+  it('concurrent calls with the same key share one call', async () => {
+    const fnStub = sinon.stub().resolves('result');
+    const fetch = singleFlight(fnStub);
+    const results = await Promise.all([fetch('a'), fetch('a'), fetch('a')]);
+    assert.deepEqual(results, ['result', 'result', 'result']);
+    assert.isTrue(fnStub.calledOnce);
+  });
+
+  it('calls with different keys do not share a call', async () => {
+    const fnStub = sinon.stub().resolves();
+    const fetch = singleFlight(fnStub);
+    await Promise.all([fetch('a'), fetch('b')]);
+    assert.isTrue(fnStub.calledTwice);
+  });
+
+  it('calls made after a call settles start a new call', async () => {
+    const fnStub = sinon.stub().resolves();
+    const fetch = singleFlight(fnStub);
+    await fetch('a');
+    await fetch('a');
+    assert.isTrue(fnStub.calledTwice);
+  });
+
+  it('concurrent callers share a rejection and later calls retry', async () => {
+    const fnStub = sinon.stub();
+    fnStub.onFirstCall().rejects(new Error('failed'));
+    fnStub.onSecondCall().resolves('result');
+    const fetch = singleFlight(fnStub);
+    await Promise.all([
+      assert.isRejected(fetch('a'), 'failed'),
+      assert.isRejected(fetch('a'), 'failed'),
+    ]);
+    assert.equal(await fetch('a'), 'result');
+    assert.isTrue(fnStub.calledTwice);
+  });
+});
@@ -0,0 +1,62 @@
+/**
+ * Create a limiter that runs asynchronous tasks with at most `concurrency` of them running at once.
+ * Tasks that are added while the limit is reached wait in a queue and run in the order they were
+ * added.
+ *
+ * @param {number} concurrency Maximum number of tasks running at once
+ * @returns {Function} Function that accepts a task returning a promise and returns a promise of the
+ *                     result of the task
+ */
+const createLimiter = (concurrency) => {
+  const queue = [];
+  let running = 0;
+
+  /** Start the next queued task if the limit allows it */
+  const runNext = () => {
+    if (running >= concurrency || queue.length === 0) {
+      return;
+    }
+    running += 1;
+    const { task, resolve, reject } = queue.shift();
+    Promise.resolve()
+      .then(task)
+      .then(resolve, reject)
+      .then(() => {
+        running -= 1;
+        runNext();
+      });
+  };
+
+  return (task) => new Promise((resolve, reject) => {
+    queue.push({ task, resolve, reject });
+    runNext();
+  });
+};
+
+/**
+ * Create a queue that runs tasks with the same key one at a time, in the order they were added.
+ * Tasks with different keys run concurrently. A failed task does not stop the tasks queued after
+ * it.
+ *
+ * @returns {Function} Function that accepts a key and a task returning a promise and returns a
+ *                     promise of the result of the task
+ */
+const createKeyedQueue = () => {
+  const lastTasks = new Map();
+
+  return (key, task) => {
+    const previousTask = lastTasks.get(key) || Promise.resolve();
+    const run = previousTask.catch(() => {}).then(task);
+    lastTasks.set(key, run);
+
+    const cleanUp = () => {
+      if (lastTasks.get(key) === run) {
+        lastTasks.delete(key);
+      }
+    };
+    run.then(cleanUp, cleanUp);
+    return run;
+  };
+};
+
+export { createLimiter, createKeyedQueue };
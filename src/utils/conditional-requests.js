@@ -0,0 +1,76 @@
+import _ from 'lodash';
+
+// Suffix that the compression middleware appends to the ETags of compressed responses
+const contentCodingSuffix = /-(br|gzip)"$/;
+
+/**
+ * Get the ETag of a representation compressed with a content coding. Compressed representations
+ * differ from the uncompressed one, so they must not share its strong ETag.
+ *
+ * @param {string} eTag ETag of the uncompressed representation, including its quotes
+ * @param {string} contentCoding Content coding, such as gzip
+ * @returns {string} ETag of the compressed representation
+ */
+const addContentCoding = (eTag, contentCoding) => eTag.replace(/"$/, `-${contentCoding}"`);
+
+/**
+ * Split the value of an If-Match or If-None-Match header into entity tags. Entity tags of
+ * compressed representations are mapped to the ETag of the uncompressed representation.
+ *
+ * @param {string} header Value of the header
+ * @returns {string[]} Entity tags
+ */
+const parseEntityTags = (header) => _.map(header.split(','), (entityTag) => (
+  _.trim(entityTag).replace(contentCodingSuffix, '"')
+));
+
+/**
+ * Check if an If-Match header is satisfied by the current ETag of a resource. Entity tags are
+ * compared strongly, so weak entity tags never match.
+ *
+ * @param {string} ifMatch Value of the If-Match header
+ * @param {string} eTag Current ETag of the resource, including its quotes
+ * @returns {boolean} Whether the request may modify the resource
+ */
+const matchesIfMatch = (ifMatch, eTag) => {
+  const entityTags = parseEntityTags(ifMatch);
+  return _.includes(entityTags, '*') || _.includes(entityTags, eTag);
+};
+
+/**
+ * Check if an If-None-Match header matches the current ETag of a resource. Entity tags are
+ * compared weakly.
+ *
+ * @param {string} ifNoneMatch Value of the If-None-Match header
+ * @param {string} eTag Current ETag of the resource, including its quotes
+ * @returns {boolean} Whether the client already has the current representation
+ */
+const matchesIfNoneMatch = (ifNoneMatch, eTag) => {
+  const entityTags = _.map(parseEntityTags(ifNoneMatch), (entityTag) => (
+    entityTag.replace(/^W\//, '')
+  ));
+  return _.includes(entityTags, '*') || _.includes(entityTags, eTag.replace(/^W\//, ''));
+};
+
+/**
+ * Check if the representation that a GET or HEAD request has cached is still current, like
+ * req.fresh does for the ETag of the response. Unlike req.fresh, ETags of compressed
+ * representations are recognized.
+ *
+ * @param {Request} req Request
+ * @param {string} eTag Current ETag of the resource, including its quotes
+ * @returns {boolean} Whether the request can be answered with 304 Not Modified
+ */
+const isFresh = (req, eTag) => {
+  const ifNoneMatch = req.get('If-None-Match');
+  return ifNoneMatch !== undefined
+    && !/\bno-cache\b/.test(req.get('Cache-Control'))
+    && matchesIfNoneMatch(ifNoneMatch, eTag);
+};
+
+export {
+  addContentCoding,
+  matchesIfMatch,
+  matchesIfNoneMatch,
+  isFresh,
+};
@@ -0,0 +1,63 @@
+import _ from 'lodash';
+
+import { logger } from 'utils/logger';
+
+let isShuttingDown = false;
+
+/**
+ * Stop servers from accepting new connections
+ *
+ * @param {Server[]} servers Servers to be closed
+ * @returns {Promise} Promise that resolves when every server has finished its open connections
+ */
+const closeServers = (servers) => Promise.all(_.map(servers, (server) => (
+  new Promise((resolve, reject) => server.close((err) => (err ? reject(err) : resolve())))
+)));
+
+/**
+ * Middleware that asks clients to close their connection once the process is shutting down, so
+ * that idle keep-alive connections do not hold the servers open
+ *
+ * @type {RequestHandler}
+ */
+const closeConnectionsOnShutdown = (req, res, next) => {
+  if (isShuttingDown) {
+    res.set('Connection', 'close');
+  }
+  next();
+};
+
+/**
+ * Shut down gracefully on SIGTERM or SIGINT. The servers stop accepting connections and the process
+ * exits once their in-flight requests have finished, or after a timeout if they do not finish.
+ *
+ * @param {Server[]} servers Servers to be closed
+ * @param {number} timeout Milliseconds to wait for in-flight requests before exiting anyway
+ */
+const shutDownGracefully = (servers, timeout) => {
+  const onSignal = async (signal) => {
+    if (isShuttingDown) {
+      return;
+    }
+    isShuttingDown = true;
+    logger.info(`Received ${signal}. Waiting for in-flight requests to finish`);
+    const forceExitTimer = setTimeout(() => {
+      logger.error(`In-flight requests did not finish within ${timeout} ms. Exiting anyway`);
+      process.exit(1);
+    }, timeout);
+
+    try {
+      await closeServers(servers);
+      process.exit(0);
+    } catch (err) {
+      logger.error(`Failed to close servers: ${err.stack}`);
+      process.exit(1);
+    } finally {
+      clearTimeout(forceExitTimer);
+    }
+  };
+  process.on('SIGTERM', onSignal);
+  process.on('SIGINT', onSignal);
+};
+
+export { closeConnectionsOnShutdown, shutDownGracefully };
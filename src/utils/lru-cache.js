@@ -0,0 +1,83 @@
+/**
+ * Create a cache that holds at most `maxEntries` entries. When the cache is full, the least
+ * recently used entry is evicted. Each entry records when it was stored so that callers can decide
+ * whether it is still fresh.
+ *
+ * @param {object} options Cache options
+ * @param {number} options.maxEntries Maximum number of entries. A value of 0 disables the cache
+ * @param {number} options.maxAge Number of milliseconds an entry stays fresh after being stored
+ * @returns {object} The cache
+ */
+const createLruCache = ({ maxEntries, maxAge }) => {
+  // Map iterates in insertion order, so the first key is always the least recently used
+  const entries = new Map();
+  let evictions = 0;
+
+  /**
+   * Get an entry and mark it as the most recently used
+   *
+   * @param {string} key Key of the entry
+   * @returns {object} The entry, containing the value and the time it was stored. undefined if the
+   *                   key is not cached
+   */
+  const get = (key) => {
+    const entry = entries.get(key);
+    if (entry !== undefined) {
+      entries.delete(key);
+      entries.set(key, entry);
+    }
+    return entry;
+  };
+
+  /**
+   * Store a value, evicting the least recently used entries if the cache is full
+   *
+   * @param {string} key Key of the entry
+   * @param {*} value Value to be stored
+   */
+  const set = (key, value) => {
+    if (maxEntries <= 0) {
+      return;
+    }
+    entries.delete(key);
+    entries.set(key, { value, storedAt: Date.now() });
+    while (entries.size > maxEntries) {
+      entries.delete(entries.keys().next().value);
+      evictions += 1;
+    }
+  };
+
+  /**
+   * Remove an entry
+   *
+   * @param {string} key Key of the entry
+   */
+  const remove = (key) => {
+    entries.delete(key);
+  };
+
+  /**
+   * Check if an entry is still fresh
+   *
+   * @param {object} entry An entry returned by get()
+   * @returns {boolean} Whether the entry was stored less than maxAge milliseconds ago
+   */
+  const isFresh = (entry) => Date.now() - entry.storedAt < maxAge;
+
+  /**
+   * Get the size and number of evictions of the cache
+   *
+   * @returns {object} Cache statistics
+   */
+  const getStats = () => ({ size: entries.size, maxEntries, evictions });
+
+  return {
+    get,
+    set,
+    remove,
+    isFresh,
+    getStats,
+  };
+};
+
+export { createLruCache };
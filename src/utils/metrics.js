@@ -0,0 +1,206 @@
+import _ from 'lodash';
+
+// Upper bounds in seconds of the default latency histogram buckets
+const defaultLatencyBuckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10];
+
+// Every metric created by this process, in the order they were created
+const metrics = [];
+
+/**
+ * Escape a label value for the Prometheus text format
+ *
+ * @param {*} value Label value
+ * @returns {string} Escaped label value
+ */
+const escapeLabelValue = (value) => String(value)
+  .replace(/\\/g, '\\\\')
+  .replace(/"/g, '\\"')
+  .replace(/\n/g, '\\n');
+
+/**
+ * Format labels for the Prometheus text format
+ *
+ * @param {object} labels Label names mapped to values
+ * @returns {string} Formatted labels, or an empty string if there are no labels
+ */
+const formatLabels = (labels) => {
+  const pairs = _.map(labels, (value, name) => `${name}="${escapeLabelValue(value)}"`);
+  return _.isEmpty(pairs) ? '' : `{${pairs.join(',')}}`;
+};
+
+/**
+ * Create the series store of a metric. Each series is identified by the values of its labels.
+ *
+ * @param {string} name Name of the metric
+ * @param {string[]} labelNames Names of the labels that every series of the metric has
+ * @param {Function} createValue Function that returns the initial value of a new series
+ * @returns {object} Map of the series and a function that accepts labels and returns the series
+ *                   with those labels
+ */
+const createSeriesStore = (name, labelNames, createValue) => {
+  const series = new Map();
+  const getSeries = (labels = {}) => {
+    const unknownLabelNames = _.difference(_.keys(labels), labelNames);
+    if (!_.isEmpty(unknownLabelNames)) {
+      throw new Error(`Metric: ${name} has no labels: ${unknownLabelNames.join(', ')}`);
+    }
+    const labelValues = _.map(labelNames, (labelName) => _.get(labels, labelName, ''));
+    const seriesKey = JSON.stringify(labelValues);
+    if (!series.has(seriesKey)) {
+      series.set(seriesKey, {
+        labels: _.zipObject(labelNames, labelValues),
+        value: createValue(),
+      });
+    }
+    return series.get(seriesKey);
+  };
+  return { series, getSeries };
+};
+
+/**
+ * Register a metric so that it is included in the exposition. A module that is loaded more than
+ * once, as happens in tests, gets the metric that was registered first under the same name.
+ *
+ * @param {object} metric Metric with a name, help text, type and render function
+ * @returns {object} The registered metric
+ */
+const registerMetric = (metric) => {
+  const registeredMetric = _.find(metrics, { name: metric.name });
+  if (registeredMetric) {
+    if (registeredMetric.type !== metric.type) {
+      throw new Error(`Metric: ${metric.name} is already registered as a ${registeredMetric.type}`);
+    }
+    return registeredMetric;
+  }
+  metrics.push(metric);
+  return metric;
+};
+
+/**
+ * Create a counter. A counter only goes up, such as the number of requests that were made.
+ *
+ * @param {object} options Counter options
+ * @param {string} options.name Name of the counter
+ * @param {string} options.help Description of the counter
+ * @param {string[]} options.labelNames Names of the labels of the counter
+ * @returns {object} The counter
+ */
+const createCounter = ({ name, help, labelNames = [] }) => {
+  const { series, getSeries } = createSeriesStore(name, labelNames, () => 0);
+
+  /**
+   * Increment the counter
+   *
+   * @param {object} labels Labels of the series to increment
+   * @param {number} value Amount to increment by
+   */
+  const inc = (labels, value = 1) => {
+    getSeries(labels).value += value;
+  };
+
+  const render = () => _.map([...series.values()], ({ labels, value }) => (
+    `${name}${formatLabels(labels)} ${value}`
+  ));
+
+  return registerMetric({
+    name,
+    help,
+    type: 'counter',
+    render,
+    inc,
+  });
+};
+
+/**
+ * Create a histogram. A histogram counts observations, such as request durations, in cumulative
+ * buckets and also keeps their count and sum.
+ *
+ * @param {object} options Histogram options
+ * @param {string} options.name Name of the histogram
+ * @param {string} options.help Description of the histogram
+ * @param {string[]} options.labelNames Names of the labels of the histogram
+ * @param {number[]} options.buckets Upper bounds of the buckets. Defaults to latency buckets in
+ *                                   seconds
+ * @returns {object} The histogram
+ */
+const createHistogram = ({
+  name,
+  help,
+  labelNames = [],
+  buckets = defaultLatencyBuckets,
+}) => {
+  const upperBounds = _.sortBy(buckets);
+  const { series, getSeries } = createSeriesStore(name, labelNames, () => ({
+    bucketCounts: _.map(upperBounds, () => 0),
+    count: 0,
+    sum: 0,
+  }));
+
+  /**
+   * Record an observation
+   *
+   * @param {object} labels Labels of the series to record the observation in
+   * @param {number} value Observed value
+   */
+  const observe = (labels, value) => {
+    const seriesValue = getSeries(labels).value;
+    _.forEach(upperBounds, (upperBound, index) => {
+      if (value <= upperBound) {
+        seriesValue.bucketCounts[index] += 1;
+      }
+    });
+    seriesValue.count += 1;
+    seriesValue.sum += value;
+  };
+
+  /**
+   * Start timing something that will be observed in seconds
+   *
+   * @param {object} labels Labels known when the timer starts
+   * @returns {Function} Function that observes the elapsed time. Accepts labels that are only
+   *                     known when the timer ends, such as a status code
+   */
+  const startTimer = (labels = {}) => {
+    const start = process.hrtime();
+    return (endLabels = {}) => {
+      const [seconds, nanoseconds] = process.hrtime(start);
+      observe({ ...labels, ...endLabels }, seconds + nanoseconds / 1e9);
+    };
+  };
+
+  const render = () => _.flatMap([...series.values()], ({ labels, value }) => [
+    ..._.map(upperBounds, (upperBound, index) => (
+      `${name}_bucket${formatLabels({ ...labels, le: upperBound })} ${value.bucketCounts[index]}`
+    )),
+    `${name}_bucket${formatLabels({ ...labels, le: '+Inf' })} ${value.count}`,
+    `${name}_sum${formatLabels(labels)} ${value.sum}`,
+    `${name}_count${formatLabels(labels)} ${value.count}`,
+  ]);
+
+  return registerMetric({
+    name,
+    help,
+    type: 'histogram',
+    render,
+    observe,
+    startTimer,
+  });
+};
+
+/**
+ * Get every metric in the Prometheus text exposition format
+ *
+ * @returns {string} The metrics
+ */
+const getMetricsText = () => _.flatMap(metrics, ({
+  name,
+  help,
+  type,
+  render,
+}) => [
+  `# HELP ${name} ${help}`,
+  `# TYPE ${name} ${type}`,
+  ...render(),
+]).map((line) => `${line}\n`).join('');
+
+export { createCounter, createHistogram, getMetricsText };
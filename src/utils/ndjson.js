@@ -0,0 +1,40 @@
+/**
+ * Wait until a stream can take more data or has been closed
+ *
+ * @param {Stream} stream Writable stream
+ * @returns {Promise} Promise that resolves when the stream drains or closes
+ */
+const waitForDrain = (stream) => new Promise((resolve) => {
+  const onEvent = () => {
+    stream.removeListener('drain', onEvent);
+    stream.removeListener('close', onEvent);
+    resolve();
+  };
+  stream.on('drain', onEvent);
+  stream.on('close', onEvent);
+});
+
+/**
+ * Create a writer that writes objects to a stream as newline-delimited JSON. A write waits while
+ * the buffer of the stream is full, so a producer that waits for each write is held back by a slow
+ * consumer instead of buffering in memory.
+ *
+ * @param {Stream} stream Writable stream, such as a response
+ * @returns {Function} Function that accepts an object and returns a promise that resolves once the
+ *                     stream can take more data. The promise rejects if the stream has been closed
+ */
+const createNdjsonWriter = (stream) => {
+  let isClosed = false;
+  stream.on('close', () => { isClosed = true; });
+
+  return async (object) => {
+    if (isClosed) {
+      throw new Error('Stream was closed before all objects were written');
+    }
+    if (!stream.write(`${JSON.stringify(object)}\n`)) {
+      await waitForDrain(stream);
+    }
+  };
+};
+
+export { createNdjsonWriter };
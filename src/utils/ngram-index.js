@@ -0,0 +1,56 @@
+import _ from 'lodash';
+
+// Length of the substrings that are indexed
+const ngramSize = 3;
+
+/**
+ * Get the unique n-grams of a text
+ *
+ * @param {string} text The text
+ * @returns {string[]} The unique substrings of the text that are ngramSize characters long
+ */
+const getNgrams = (text) => _.uniq(_.times(
+  Math.max(text.length - ngramSize + 1, 0),
+  (start) => text.substring(start, start + ngramSize),
+));
+
+/**
+ * Build an inverted n-gram index of texts
+ *
+ * @param {object} texts Mapping of IDs to the texts to be indexed
+ * @returns {object} Mapping of each n-gram to the IDs of the texts that contain it
+ */
+const buildNgramIndex = (texts) => {
+  const index = {};
+  _.forEach(texts, (text, id) => {
+    _.forEach(getNgrams(text || ''), (ngram) => {
+      if (!Object.prototype.hasOwnProperty.call(index, ngram)) {
+        index[ngram] = [];
+      }
+      index[ngram].push(id);
+    });
+  });
+  return index;
+};
+
+/**
+ * Find the IDs of the texts that may contain a query. Every text that contains the query is
+ * returned, but a returned text may not contain it since only its n-grams are known to match.
+ *
+ * @param {object} index Index built by buildNgramIndex
+ * @param {string} query The substring to search for
+ * @returns {string[]} IDs of the candidate texts. undefined if the query is too short to be
+ *                     searched through the index
+ */
+const searchNgramIndex = (index, query) => {
+  if (query.length < ngramSize) {
+    return undefined;
+  }
+  const postings = _.map(getNgrams(query), (ngram) => (
+    Object.prototype.hasOwnProperty.call(index, ngram) ? index[ngram] : []
+  ));
+  // Intersecting the shortest postings first keeps the intermediate results small
+  return _.intersection(..._.sortBy(postings, 'length'));
+};
+
+export { buildNgramIndex, searchNgramIndex };
@@ -1,5 +1,22 @@
 import _ from 'lodash';
 
+// Page size used when only page[number] is given
+const defaultPageSize = 25;
+
+/**
+ * Get the pagination query from query parameters
+ *
+ * @param {object} query Query parameters
+ * @returns {object} Pagination query or undefined if the query does not request pagination
+ */
+const getPageQuery = (query) => {
+  const { 'page[number]': number, 'page[size]': size } = query;
+  if (number === undefined && size === undefined) {
+    return undefined;
+  }
+  return { number: number || 1, size: size || defaultPageSize };
+};
+
 /**
  * Paginate data rows
  *
@@ -26,4 +43,4 @@ const paginate = (rows, pageQuery) => {
   };
 };
 
-export { paginate };
+export { getPageQuery, paginate };
@@ -0,0 +1,89 @@
+import config from 'config';
+import _ from 'lodash';
+
+const { serverTiming: isServerTimingEnabled = false } = config.get('server');
+
+/**
+ * Get the number of milliseconds that have passed since a time returned by process.hrtime()
+ *
+ * @param {number[]} start Start time
+ * @returns {number} Elapsed milliseconds
+ */
+const getElapsedMilliseconds = (start) => {
+  const [seconds, nanoseconds] = process.hrtime(start);
+  return seconds * 1e3 + nanoseconds / 1e6;
+};
+
+/**
+ * Create a recorder of the time spent in each phase of handling a request, such as fetching or
+ * serializing notes. Time spent in the same phase more than once, such as parsing several objects,
+ * is added up. Unless Server-Timing is enabled by config, the recorder only runs the timed
+ * functions.
+ *
+ * @returns {object} The recorder
+ */
+const createServerTiming = () => {
+  // Milliseconds spent in each phase, in the order the phases were first recorded
+  const durations = new Map();
+
+  /**
+   * Add time spent in a phase
+   *
+   * @param {string} name Name of the phase
+   * @param {number} duration Milliseconds spent in the phase
+   */
+  const add = (name, duration) => {
+    durations.set(name, (durations.get(name) || 0) + duration);
+  };
+
+  /**
+   * Run a function and record the time it takes as a phase. If the function returns a promise, the
+   * time until the promise settles is recorded.
+   *
+   * @param {string} name Name of the phase
+   * @param {Function} fn Function to be timed
+   * @returns {*} The result of the function
+   */
+  const time = (name, fn) => {
+    if (!isServerTimingEnabled) {
+      return fn();
+    }
+    const start = process.hrtime();
+    const result = fn();
+    if (result && _.isFunction(result.then)) {
+      return result.finally(() => add(name, getElapsedMilliseconds(start)));
+    }
+    add(name, getElapsedMilliseconds(start));
+    return result;
+  };
+
+  /**
+   * Get the recorded phases as the value of a Server-Timing header
+   *
+   * @returns {string} Header value, or undefined if no phase was recorded
+   */
+  const getHeader = () => {
+    if (durations.size === 0) {
+      return undefined;
+    }
+    return _.map([...durations], ([name, duration]) => `${name};dur=${duration.toFixed(2)}`)
+      .join(', ');
+  };
+
+  return { add, time, getHeader };
+};
+
+/**
+ * Set the Server-Timing header of a response to the phases recorded so far
+ *
+ * @param {Response} res Response
+ * @param {object} serverTiming Recorder returned by createServerTiming()
+ */
+const setServerTimingHeader = (res, serverTiming) => {
+  const header = serverTiming.getHeader();
+  if (header !== undefined) {
+    res.set('Server-Timing', header);
+  }
+};
+
+export { createServerTiming, setServerTimingHeader };
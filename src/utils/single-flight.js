@@ -0,0 +1,33 @@
+/**
+ * Wrap an asynchronous function so that concurrent calls with the same key share a single call.
+ * Callers that arrive while a call is in flight receive its result instead of starting another
+ * one. Once the call settles, the next caller starts a new call, so results are never reused
+ * beyond the in-flight window.
+ *
+ * @param {Function} fn Asynchronous function to be wrapped
+ * @param {Function} getKey Function that maps the arguments of a call to its key. Defaults to the
+ *                          first argument
+ * @returns {Function} The wrapped function
+ */
+const singleFlight = (fn, getKey = (key) => key) => {
+  const inFlightCalls = new Map();
+
+  return (...args) => {
+    const key = getKey(...args);
+    if (inFlightCalls.has(key)) {
+      return inFlightCalls.get(key);
+    }
+
+    const call = Promise.resolve().then(() => fn(...args));
+    inFlightCalls.set(key, call);
+    const cleanUp = () => {
+      if (inFlightCalls.get(key) === call) {
+        inFlightCalls.delete(key);
+      }
+    };
+    call.then(cleanUp, cleanUp);
+    return call;
+  };
+};
+
+export { singleFlight };